@@ -1,23 +1,19 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, scrolledtext
-import openpyxl
-from openpyxl.styles import Font, Alignment
-from openpyxl.utils import get_column_letter
-from openpyxl.chart import BarChart, LineChart, Reference
-from openpyxl.chart.label import DataLabelList
 from datetime import datetime
-import re
-import os
-import calendar
-import warnings
 import traceback
-from copy import copy
+import threading
+import queue
+import multiprocessing
 
-# Suppress warnings
-warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+from ie_engine import IEAutomationEngine, RunCancelled, PreviewOutdated
+from ie_history import default_history_path
 
-class GarmentsAutomationApp:
+LOG_FLUSH_MS = 150  # how often queued log lines are rendered into the log panel
+
+class GarmentsAutomationApp(IEAutomationEngine):
     def __init__(self, root):
+        IEAutomationEngine.__init__(self)
         self.root = root
         self.root.title("IE Automation System (V44 - Perfected Engine)")
         self.root.geometry("1000x750")
@@ -25,9 +21,18 @@ class GarmentsAutomationApp:
         # Variables
         self.supervisor_path = tk.StringVar()
         self.master_path = tk.StringVar()
+        self.incremental = tk.BooleanVar(value=True)
+        self.profile = tk.BooleanVar(value=False)
+        self.values_export = tk.BooleanVar(value=False)
+        self.dry_run = tk.BooleanVar(value=False)
+        self.partial_save = tk.BooleanVar(value=False)
+        self.keep_history = tk.BooleanVar(value=bool(self.history_path))  # on when $IE_HISTORY_DB is set
+        self.ui_queue = queue.Queue()  # worker thread -> Tk thread (log lines, progress, result)
+        self.worker = None
         
         self.create_menu()
         self.create_widgets()
+        self.root.after(LOG_FLUSH_MS, self.flush_ui_queue)
 
     def create_menu(self):
         menubar = tk.Menu(self.root)
@@ -102,15 +107,28 @@ class GarmentsAutomationApp:
         main_frame = tk.Frame(self.root, padx=20)
         main_frame.pack(fill="both", expand=True)
 
-        tk.Label(main_frame, text="1. Supervisor File (Daily Report):", font=("Arial", 10, "bold")).pack(anchor="w")
+        tk.Label(main_frame, text="1. Supervisor File(s) (Daily Report - select one or many, separated by ';'):", font=("Arial", 10, "bold")).pack(anchor="w")
         tk.Entry(main_frame, textvariable=self.supervisor_path, width=80).pack(anchor="w", pady=5)
-        tk.Button(main_frame, text="Browse Supervisor File", command=self.browse_sup, bg="#3498db", fg="white").pack(anchor="w", pady=(0, 15))
+        tk.Button(main_frame, text="Browse Supervisor File(s)", command=self.browse_sup, bg="#3498db", fg="white").pack(anchor="w", pady=(0, 15))
 
         tk.Label(main_frame, text="2. Master File (Linking Graph):", font=("Arial", 10, "bold")).pack(anchor="w")
         tk.Entry(main_frame, textvariable=self.master_path, width=80).pack(anchor="w", pady=5)
         tk.Button(main_frame, text="Browse Master File", command=self.browse_mas, bg="#3498db", fg="white").pack(anchor="w", pady=(0, 15))
 
-        tk.Button(self.root, text="START AUTOMATION", command=self.run_process, font=("Arial", 12, "bold"), bg="#2c3e50", fg="white", height=2, width=30).pack(pady=10)
+        tk.Checkbutton(self.root, text="Incremental update (skip rows already applied to this master)", variable=self.incremental).pack()
+        tk.Checkbutton(self.root, text="Also write a values-only copy (formulas computed, for dashboards)", variable=self.values_export).pack()
+        tk.Checkbutton(self.root, text="Preview only (dry run: list what would change, save nothing, then ask to apply)", variable=self.dry_run).pack()
+        tk.Checkbutton(self.root, text="Fast save (rewrite only the changed rows of the master when possible)", variable=self.partial_save).pack()
+        tk.Checkbutton(self.root, text=f"Keep supervisor history ({default_history_path()})", variable=self.keep_history).pack()
+        tk.Checkbutton(self.root, text="Profile run (timing table in the log + JSON trace next to the master)", variable=self.profile).pack()
+        btn_frame = tk.Frame(self.root)
+        btn_frame.pack(pady=10)
+        self.start_btn = tk.Button(btn_frame, text="START AUTOMATION", command=self.run_process, font=("Arial", 12, "bold"), bg="#2c3e50", fg="white", height=2, width=30)
+        self.start_btn.pack(side="left", padx=5)
+        self.cancel_btn = tk.Button(btn_frame, text="CANCEL", command=self.cancel_process, font=("Arial", 12, "bold"), bg="#c0392b", fg="white", height=2, width=12, state="disabled")
+        self.cancel_btn.pack(side="left", padx=5)
+        self.rollover_btn = tk.Button(btn_frame, text="ARCHIVE CLOSED MONTHS", command=self.rollover_process, font=("Arial", 10, "bold"), bg="#7f8c8d", fg="white", height=2, width=22)
+        self.rollover_btn.pack(side="left", padx=5)
 
         self.progress = ttk.Progressbar(self.root, orient="horizontal", length=900, mode="determinate")
         self.progress.pack(pady=10)
@@ -121,762 +139,142 @@ class GarmentsAutomationApp:
         tk.Label(self.root, text="© Sonia & Sweaters Limited | Internal Systems", font=("Arial", 8), fg="#95a5a6").pack(side="bottom", pady=5)
 
     def browse_sup(self):
-        f = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx *.xlsm")])
-        if f: self.supervisor_path.set(f)
+        files = filedialog.askopenfilenames(filetypes=[("Excel Files", "*.xlsx *.xlsm")])
+        if files: self.supervisor_path.set("; ".join(files))
+
+    def get_supervisor_paths(self):
+        return [p.strip() for p in self.supervisor_path.get().split(";") if p.strip()]
 
     def browse_mas(self):
         f = filedialog.askopenfilename(filetypes=[("Excel Files", "*.xlsx *.xlsm")])
         if f: self.master_path.set(f)
 
+    # --- Called from the worker thread: never touch Tk here, only queue ---
     def log(self, msg):
         timestamp = datetime.now().strftime('%H:%M:%S')
-        self.log_text.insert(tk.END, f"{timestamp} - {msg}\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        self.ui_queue.put(("log", f"{timestamp} - {msg}\n"))
 
-    def clean_text_strict(self, text):
-        if not text: return ""
-        return str(text).replace("\n", "").replace(".", "").replace(" ", "").strip().lower()
+    def set_progress(self, value):
+        self.ui_queue.put(("progress", value))
 
-    def clean_header_loose(self, text):
-        if not text: return ""
-        return str(text).replace("\n", " ").strip().lower()
-
-    def set_cell_value(self, cell, value):
-        # V44: Merged Cell Safe Write + Return Target
-        ws = cell.parent
-        target = cell
-        
-        # Check if cell is part of a merge
-        for merged_range in ws.merged_cells.ranges:
-            if cell.coordinate in merged_range:
-                # Redirect to the top-left cell of the merge
-                target = ws.cell(merged_range.min_row, merged_range.min_col)
-                break
-        
-        # Write value to the SAFE target
-        target.value = value
-        
-        # Apply font
-        if target.font:
-            new_font = Font(name=target.font.name, size=target.font.size, 
-                            bold=target.font.bold, italic=target.font.italic,
-                            color="000000") 
-            target.font = new_font
-            
-        return target 
+    # --- Tk thread: render everything queued since the last tick in one go ---
+    def flush_ui_queue(self):
+        lines = []
+        try:
+            while True:
+                kind, payload = self.ui_queue.get_nowait()
+                if kind == "log": lines.append(payload)
+                elif kind == "progress": self.progress['value'] = payload
+                elif kind == "done":
+                    self.flush_log_lines(lines); lines = []
+                    self.on_run_finished(*payload)
+        except queue.Empty:
+            pass
+        self.flush_log_lines(lines)
+        self.root.after(LOG_FLUSH_MS, self.flush_ui_queue)
+
+    def flush_log_lines(self, lines):
+        if not lines: return
+        self.log_text.insert(tk.END, "".join(lines))
+        self.log_text.see(tk.END)
 
     def run_process(self):
-        sup_file = self.supervisor_path.get()
+        if self.worker and self.worker.is_alive(): return
+        sup_files = self.get_supervisor_paths()
         mas_file = self.master_path.get()
 
-        if not sup_file or not mas_file:
+        if not sup_files or not mas_file:
             messagebox.showerror("Error", "Please select both files.")
             return
 
-        try:
-            self.log("--- STARTED ---")
-            self.progress['value'] = 5
-            
-            self.log(f"Step 1: Reading Supervisor File...")
-            extracted_data = self.read_supervisor_file(sup_file)
-            
-            if not extracted_data:
-                self.log("CRITICAL: No valid production data found.")
-                messagebox.showwarning("No Data", "No data found where 'Today' > 0.")
-                return
-            
-            # --- V44 BUG FIX: Extract Valid Dates (Unique Set) ---
-            valid_dates = set()
-            for entry in extracted_data:
-                if isinstance(entry['date'], datetime):
-                    valid_dates.add(entry['date'].date())
-            
-            self.log(f"Collected {len(extracted_data)} valid data entries.")
-            self.log(f"Valid Production Dates Found: {len(valid_dates)}")
-            self.progress['value'] = 30
-            
-            self.log(f"Step 2: Updating Master File Sheets...")
-            updated_count = self.update_master_file(mas_file, extracted_data)
-            
-            self.progress['value'] = 60
-
-            # --- V44 FEATURE: Populate TOTAL SUMMARY Bottom Table ---
-            self.log(f"Step 3: Populating TOTAL SUMMARY Bottom Table...")
-            self.populate_bottom_summary_table(mas_file, extracted_data)
-
-            self.progress['value'] = 80
-            
-            # --- V35: Update Date Wise Summary (With Ghost Date Fix) ---
-            self.log(f"Step 4: Generating Date Wise Summary (Strict Date Filtering)...")
-            self.update_date_wise_summary(mas_file, valid_dates)
-            
-            self.progress['value'] = 100
-            self.log(f"--- COMPLETED: Updated {updated_count} Sheets & Summaries ---")
-            messagebox.showinfo("Success", f"Done! Updated {updated_count} sheets and All Summaries.")
+        self.start_btn.config(state="disabled")
+        self.cancel_btn.config(state="normal")
+        incremental = self.incremental.get()
+        profile = self.profile.get()
+        values_export = self.values_export.get()
+        dry_run = self.dry_run.get()
+        partial_save = self.partial_save.get()
+        self.history_path = default_history_path() if self.keep_history.get() else ""
+        self.worker = threading.Thread(target=self.run_worker, args=(sup_files, mas_file, incremental, profile, values_export, dry_run, partial_save),
+                                       daemon=True)
+        self.worker.start()
+
+    def rollover_process(self):
+        if self.worker and self.worker.is_alive(): return
+        mas_file = self.master_path.get()
+        if not mas_file:
+            messagebox.showerror("Error", "Please select the master file.")
+            return
+        if not messagebox.askyesno("Archive Closed Months", "Move style sheets of closed months into per-month archive workbooks next to the master?"):
+            return
+        self.start_btn.config(state="disabled"); self.rollover_btn.config(state="disabled")
+        self.worker = threading.Thread(target=self.rollover_worker, args=(mas_file,), daemon=True)
+        self.worker.start()
 
+    def rollover_worker(self, mas_file):
+        try:
+            self.ui_queue.put(("done", (self.rollover(mas_file), None)))
         except Exception as e:
-            self.log(f"CRITICAL ERROR: {str(e)}")
             traceback.print_exc()
-            messagebox.showerror("Error", str(e))
-
-    # ==========================================
-    # LOGIC: READ SUPERVISOR
-    # ==========================================
-    def find_date_in_row(self, row):
-        date_pattern = re.compile(r'(\d{1,2})[-./](\d{1,2})[-./](\d{2,4})')
-        for cell in row:
-            if not cell: continue
-            if isinstance(cell, datetime): return cell
-            s_val = str(cell).strip()
-            match = date_pattern.search(s_val)
-            if match:
-                try:
-                    d_str = f"{match.group(1)}/{match.group(2)}/{match.group(3)}"
-                    for fmt in ["%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y"]:
-                        try: return datetime.strptime(d_str, fmt)
-                        except: continue
-                except: pass
-        return None
-
-    def read_supervisor_file(self, filepath):
-        wb = openpyxl.load_workbook(filepath, data_only=True)
-        all_data = []
-        for sheet in wb.worksheets:
-            rows = list(sheet.iter_rows(values_only=True))
-            row_date_map = {}
-            for r_idx, row in enumerate(rows):
-                found_date = self.find_date_in_row(row)
-                if found_date: row_date_map[r_idx] = found_date
-            
-            for r_idx, row in enumerate(rows):
-                if not row: continue
-                row_strict = [self.clean_text_strict(c) for c in row]
-                row_loose = [self.clean_header_loose(c) for c in row]
-                if "styleno" in row_strict and "today" in row_strict:
-                    closest_date = None
-                    for search_back in range(r_idx, max(-1, r_idx-50), -1):
-                        if search_back in row_date_map:
-                            closest_date = row_date_map[search_back]
-                            break
-                    if not closest_date: closest_date = self.find_date_in_row(row)
-                    if not closest_date: continue
-
-                    col = {}
-                    for idx, val in enumerate(row_loose):
-                        v_strict = row_strict[idx]
-                        if "style no" in val: col['style'] = idx
-                        elif "today" in val: col['today'] = idx 
-                        elif "buyer" in val: col['buyer'] = idx
-                        elif "gg" == v_strict: col['gg'] = idx
-                        elif "order" in val and "qty" in val: col['order_qty'] = idx
-                        elif "con" in val and "qty" in val: col['con_qty'] = idx
-                        elif val == "m/c" or val == "mc": col['mc'] = idx
-                        elif "working" in val and "min" in val: col['min'] = idx
-                        elif "smv" in val: col['smv'] = idx
-                        elif "aver" in val and "min" in val: col['aver_min'] = idx
-
-                    j = r_idx + 1
-                    while j < len(rows):
-                        d_row = rows[j]
-                        j += 1
-                        if not any(d_row): break
-                        if d_row[0] and "total" in str(d_row[0]).lower(): break
-                        if j-1 in row_date_map and j-1 > r_idx + 1: break 
-                        try:
-                            s_name = d_row[col['style']]
-                            prod = d_row[col['today']]
-                            valid = False
-                            if prod is not None:
-                                try:
-                                    if float(prod) > 0: valid = True
-                                except: pass
-                            
-                            if valid and s_name:
-                                mc_val = d_row[col['mc']] if 'mc' in col else 0
-                                smv_val = d_row[col['smv']] if 'smv' in col else 0
-                                aver_min = 0
-                                if 'aver_min' in col: aver_min = d_row[col['aver_min']]
-                                elif 'min' in col: aver_min = d_row[col['min']]
-                                
-                                try: mc = float(mc_val); out = float(prod); smv = float(smv_val); a_min = float(aver_min)
-                                except: mc=0; out=0; smv=0; a_min=0
-
-                                entry = {
-                                    "date": closest_date,
-                                    "style": str(s_name).strip(),
-                                    "output": out,
-                                    "buyer": d_row[col.get('buyer')] if 'buyer' in col else "",
-                                    "gg": d_row[col.get('gg')] if 'gg' in col else "",
-                                    "order_qty": d_row[col.get('order_qty')] if 'order_qty' in col else "",
-                                    "con_qty": d_row[col.get('con_qty')] if 'con_qty' in col else "",
-                                    "mc": mc, 
-                                    "aver_min": a_min, 
-                                    "smv": smv
-                                }
-                                all_data.append(entry)
-                        except: continue
-        return all_data
-
-    # ==========================================
-    # STEP 2: WRITE MASTER (V42: DYNAMIC ROWS & BUG FIX)
-    # ==========================================
-    def update_master_file(self, filepath, data):
-        wb = openpyxl.load_workbook(filepath)
-        if "FORMATE" not in wb.sheetnames:
-            self.log("ERROR: 'FORMATE' sheet missing!")
-            return 0
-
-        fmt = wb["FORMATE"]
-        updated_counter = 0
-        data.sort(key=lambda x: x['date'])
-
-        for entry in data:
-            ws = None # Initialized
-            try:
-                raw_style = str(entry['style']).strip()
-                clean_style = re.sub(r'[\s\-_]*REQ$', '', raw_style, flags=re.IGNORECASE).strip()
-                entry['style'] = clean_style
-                safe_style = re.sub(r'[\\/*?:\[\]]', '_', clean_style)[:31]
-                
-                if safe_style in wb.sheetnames: 
-                    ws = wb[safe_style]
-                else:
-                    ws = wb.copy_worksheet(fmt)
-                    ws.title = safe_style
-                    self.force_fill_headers(ws, entry)
-
-                self.force_fill_headers(ws, entry)
-                if entry['smv']: self.set_cell_value(ws['K11'], entry['smv'])
-
-                header_row_idx = self.find_table_header(ws)
-                if not header_row_idx: 
-                    continue
-
-                col_map = self.map_table_columns(ws, header_row_idx)
-                
-                target_row = None
-                r = header_row_idx + 1
-                
-                # --- Dynamic Row Logic ---
-                while r < 1000:
-                    c_date = ws.cell(r, col_map['Date']).value
-                    
-                    is_match = False
-                    if isinstance(c_date, datetime) and c_date.date() == entry['date'].date(): is_match = True
-                    elif isinstance(c_date, str) and entry['date'].strftime("%d-%b") in str(c_date): is_match = True
-                    
-                    if is_match:
-                        target_row = r; break
-                    
-                    cell_val = str(ws.cell(r, 1).value).lower()
-                    if "total" in cell_val:
-                        self.log(f"Expanding rows for {safe_style}")
-                        ws.insert_rows(r)
-                        target_row = r; break
-                        
-                    if c_date is None:
-                        target_row = r; break
-                    r += 1
-                
-                if target_row:
-                    if ws.cell(target_row, col_map['Date']).value is None:
-                        last_day_val = 0
-                        prev_day = ws.cell(target_row-1, col_map['Day']).value
-                        if isinstance(prev_day, int): last_day_val = prev_day
-                        self.set_cell_value(ws.cell(target_row, col_map['Day']), last_day_val + 1)
-                        self.set_cell_value(ws.cell(target_row, col_map['Date']), entry['date'].strftime("%d-%b"))
-                    
-                    self.set_cell_value(ws.cell(target_row, col_map['Output']), entry['output'])
-                    if 'MC' in col_map: self.set_cell_value(ws.cell(target_row, col_map['MC']), entry['mc'])
-
-                    c_op = get_column_letter(col_map['MC']) if 'MC' in col_map else 'C'
-                    c_out = get_column_letter(col_map['Output'])
-                    c_min = get_column_letter(col_map['Min']) if 'Min' in col_map else 'F'
-                    row = target_row
-                    aver_min = entry['aver_min']
-
-                    if 'AvgProd' in col_map: self.set_cell_value(ws.cell(row, col_map['AvgProd']), f"={c_out}{row}/{c_op}{row}")
-                    if 'Min' in col_map: self.set_cell_value(ws.cell(row, col_map['Min']), f"={c_op}{row}*{aver_min}")
-                    if 'Eff' in col_map:
-                        f_eff = f"={c_out}{row}*$K$11/{c_min}{row}"
-                        target = self.set_cell_value(ws.cell(row, col_map['Eff']), f_eff)
-                        target.number_format = '0%'
-                    if 'Time' in col_map: self.set_cell_value(ws.cell(row, col_map['Time']), f"=({c_min}{row}/{c_op}{row})/60")
-                    
-                    updated_counter += 1
-                    self.update_footer_formulas(ws, header_row_idx, col_map)
-                    if 'Eff' in col_map and 'Day' in col_map: self.add_efficiency_chart(ws, header_row_idx, col_map)
-                
-                # Update top summary (Existing feature)
-                self.update_total_summary(wb, ws, safe_style, header_row_idx, col_map)
-
-            except Exception as inner_e:
-                self.log(f"Error processing style {entry['style']}: {str(inner_e)}")
-                # traceback.print_exc()
-                continue
-
-        wb.save(filepath)
-        return updated_counter
-
-    # ==========================================
-    # V44 FEATURE: POPULATE BOTTOM TABLE (DYNAMIC)
-    # ==========================================
-    def populate_bottom_summary_table(self, filepath, data):
-        # 1. Aggregate Data by Style
-        style_map = {}
-        for entry in data:
-            raw_style = str(entry['style']).strip()
-            clean_style = re.sub(r'[\s\-_]*REQ$', '', raw_style, flags=re.IGNORECASE).strip()
-            
-            s_name = clean_style
-            if s_name not in style_map:
-                style_map[s_name] = {
-                    'buyer': entry['buyer'],
-                    'style': s_name,
-                    'gg': entry['gg'],
-                    'order_qty': entry['order_qty'],
-                    'con_qty': entry['con_qty'],
-                    'smv': entry['smv'],
-                    'total_output': 0,
-                    'total_wmin': 0,
-                    'dates': set()
-                }
-            
-            w_min_entry = entry['mc'] * entry['aver_min']
-            style_map[s_name]['total_output'] += entry['output']
-            style_map[s_name]['total_wmin'] += w_min_entry
-            style_map[s_name]['dates'].add(entry['date'].date())
-
-        wb = openpyxl.load_workbook(filepath)
-        if "TOTAL SUMMARY" not in wb.sheetnames:
-            self.log("WARNING: 'TOTAL SUMMARY' sheet not found. Skipping bottom table.")
-            return
+            self.ui_queue.put(("done", (None, e)))
 
-        ws = wb["TOTAL SUMMARY"]
-        start_row = 35  
-        end_template_row = 49
-        
-        sorted_styles = sorted(style_map.keys())
-        num_styles = len(sorted_styles)
-        existing_capacity = end_template_row - start_row + 1
-        
-        # --- Dynamic Expansion Logic ---
-        if num_styles > existing_capacity:
-            rows_to_add = num_styles - existing_capacity
-            self.log(f"Expanding TOTAL SUMMARY table by {rows_to_add} rows...")
-            # Insert rows at the end of the template block
-            ws.insert_rows(end_template_row, amount=rows_to_add)
-            
-            # Copy Styles for new rows from the last valid template row
-            source_row_idx = end_template_row - 1
-            for i in range(rows_to_add):
-                target_row_idx = end_template_row + i
-                for col in range(1, 15): # Columns A to N
-                    source_cell = ws.cell(source_row_idx, col)
-                    target_cell = ws.cell(target_row_idx, col)
-                    # Safe copy of styles
-                    if source_cell.has_style:
-                        target_cell.font = copy(source_cell.font)
-                        target_cell.border = copy(source_cell.border)
-                        target_cell.fill = copy(source_cell.fill)
-                        target_cell.number_format = source_cell.number_format
-                        target_cell.alignment = copy(source_cell.alignment)
-
-        # 4. Write Aggregated Data
-        current_row = start_row
-        sl_counter = 1
-
-        for s_name in sorted_styles:
-            d = style_map[s_name]
-            
-            # Col A: SL
-            self.set_cell_value(ws.cell(current_row, 1), sl_counter)
-            # Col B: Buyer
-            self.set_cell_value(ws.cell(current_row, 2), d['buyer'])
-            # Col C: Style
-            self.set_cell_value(ws.cell(current_row, 3), d['style'])
-            # Col D: GG
-            self.set_cell_value(ws.cell(current_row, 4), d['gg'])
-            # Col E: Order Qty
-            self.set_cell_value(ws.cell(current_row, 5), d['order_qty'])
-            # Col F: Linking Qty
-            self.set_cell_value(ws.cell(current_row, 6), d['con_qty'])
-            
-            # Col G: Balance = E - F
-            self.set_cell_value(ws.cell(current_row, 7), f"=E{current_row}-F{current_row}")
-            
-            # Col H: SMV
-            self.set_cell_value(ws.cell(current_row, 8), d['smv'])
-            
-            # Col I: Output
-            self.set_cell_value(ws.cell(current_row, 9), d['total_output'])
-            
-            # Col J: W.min
-            self.set_cell_value(ws.cell(current_row, 10), d['total_wmin'])
-            
-            # Col K: P.min = Output * SMV (Formula for consistency)
-            self.set_cell_value(ws.cell(current_row, 11), f"=I{current_row}*H{current_row}")
-            
-            # Col L: Working Day
-            self.set_cell_value(ws.cell(current_row, 12), len(d['dates']))
-            
-            # Col M: Eff% = P.min / W.min
-            eff_formula = f"=IFERROR(K{current_row}/J{current_row}, 0)"
-            target = self.set_cell_value(ws.cell(current_row, 13), eff_formula)
-            target.number_format = '0%'
-            
-            current_row += 1
-            sl_counter += 1
-
-        wb.save(filepath)
-        self.log(f"Success: Populated TOTAL SUMMARY bottom table (Rows {start_row}-{current_row-1})")
-
-    # ==========================================
-    # V35: DATE WISE SUMMARY ENGINE (V44 FIX)
-    # ==========================================
-    def update_date_wise_summary(self, filepath, valid_dates=None):
-        if valid_dates is None: valid_dates = set()
-        
-        # Create a set of valid DAYS (integers 1-31) to handle month mismatches
-        # This ensures that if the sheet is named "DEC-2025" but data is "JAN-2026",
-        # we still populate the rows corresponding to the DAYS (1st, 2nd, etc.) present in data.
-        valid_days = {d.day for d in valid_dates}
+    def run_worker(self, sup_files, mas_file, incremental, profile=False, values_export=False, dry_run=False, partial_save=False):
+        try:
+            result = self.run(sup_files, mas_file, incremental=incremental, profile=profile, values_export=values_export, dry_run=dry_run,
+                              partial_save=partial_save)
+            self.ui_queue.put(("done", (result, None)))
+        except Exception as e:
+            if not isinstance(e, RunCancelled): traceback.print_exc()
+            self.ui_queue.put(("done", (None, e)))
 
-        wb = openpyxl.load_workbook(filepath)
-        
-        summary_sheet = None
-        sheet_name = ""
-        for s in wb.sheetnames:
-            if s.lower().startswith("date wise summary"):
-                summary_sheet = wb[s]
-                sheet_name = s
-                break
-        
-        if not summary_sheet: return
+    def apply_preview_process(self, mas_file):
+        self.start_btn.config(state="disabled"); self.rollover_btn.config(state="disabled")
+        self.cancel_btn.config(state="normal")
+        self.worker = threading.Thread(target=self.apply_preview_worker, args=(mas_file, self.profile.get(), self.values_export.get(),
+                                                                                  self.partial_save.get()), daemon=True)
+        self.worker.start()
 
+    def apply_preview_worker(self, mas_file, profile=False, values_export=False, partial_save=False):
         try:
-            parts = sheet_name.split(' ')
-            date_part = parts[-1] 
-            dt_obj = datetime.strptime(date_part, "%b-%Y")
-            # We use the sheet's month for iterating days, usually 30 or 31
-            month = dt_obj.month
-            year = dt_obj.year
-            days_in_month = calendar.monthrange(year, month)[1]
-        except:
-            now = datetime.now()
-            month = now.month
-            year = now.year
-            days_in_month = 31
-
-        exclude = ["FORMATE", "SUMMARY GRAPH", "TOTAL SUMMARY", "OVERALL SUMMARY", "SIDE +OTHERS SUMMARY", "BODY SUMMARY", "linking.Plan"]
-        styles = [s for s in wb.sheetnames if s not in exclude and not s.lower().startswith("date wise")]
-
-        col_idx = 2
-        start_data_row = 7
-        end_data_row = start_data_row + days_in_month - 1
-        
-        for style in styles:
-            ws_style = wb[style]
-            gauge_cell = ws_style['H11'].value 
-            try: gauge = float(gauge_cell)
-            except: gauge = 0
-            
-            category = "Fine" if gauge > 10 else "Coarse"
-            
-            self.set_cell_value(summary_sheet.cell(4, col_idx), style)
-            self.set_cell_value(summary_sheet.cell(5, col_idx), category)
-            self.set_cell_value(summary_sheet.cell(5, col_idx+1), category)
-            self.set_cell_value(summary_sheet.cell(5, col_idx+2), category)
-            
-            self.set_cell_value(summary_sheet.cell(6, col_idx), "Acv")
-            self.set_cell_value(summary_sheet.cell(6, col_idx+1), "W.Min")
-            self.set_cell_value(summary_sheet.cell(6, col_idx+2), "Prod.Min")
-            
-            # --- V44 FIX: Check Valid Days (Not Strict Dates) ---
-            quoted_style = f"'{style}'"
-            style_row_offset = 16 
-            
-            for day in range(1, days_in_month + 1):
-                r_sum = start_data_row + day - 1
-                r_style = style_row_offset + day
-                
-                # Set Label if missing
-                if summary_sheet.cell(r_sum, 1).value is None:
-                     d_str = f"{day:02d}-{dt_obj.strftime('%b')}"
-                     self.set_cell_value(summary_sheet.cell(r_sum, 1), d_str)
-
-                # FLEXIBLE CHECK: If day number exists in supervisor data, we populate.
-                # This fixes "Not Populating" issue if months differ.
-                if day in valid_days:
-                    f_acv = f"={quoted_style}!D{r_style}"
-                    self.set_cell_value(summary_sheet.cell(r_sum, col_idx), f_acv)
-                    
-                    f_wmin = f"={quoted_style}!F{r_style}"
-                    self.set_cell_value(summary_sheet.cell(r_sum, col_idx+1), f_wmin)
-                    
-                    acv_col = get_column_letter(col_idx)
-                    f_pmin = f"={acv_col}{r_sum}*{quoted_style}!K$11"
-                    self.set_cell_value(summary_sheet.cell(r_sum, col_idx+2), f_pmin)
-                else:
-                    # GHOST DATE FIX: If day is NOT in supervisor data, force 0
-                    self.set_cell_value(summary_sheet.cell(r_sum, col_idx), 0)
-                    self.set_cell_value(summary_sheet.cell(r_sum, col_idx+1), 0)
-                    self.set_cell_value(summary_sheet.cell(r_sum, col_idx+2), 0)
-
-            total_r = end_data_row + 1
-            col_let = get_column_letter(col_idx)
-            self.set_cell_value(summary_sheet.cell(total_r, col_idx), f"=SUM({col_let}{start_data_row}:{col_let}{end_data_row})")
-            col_let = get_column_letter(col_idx+1)
-            self.set_cell_value(summary_sheet.cell(total_r, col_idx+1), f"=SUM({col_let}{start_data_row}:{col_let}{end_data_row})")
-            col_let = get_column_letter(col_idx+2)
-            self.set_cell_value(summary_sheet.cell(total_r, col_idx+2), f"=SUM({col_let}{start_data_row}:{col_let}{end_data_row})")
-            
-            pct_r = total_r + 1
-            c_prod = get_column_letter(col_idx+2)
-            c_wmin = get_column_letter(col_idx+1)
-            target = self.set_cell_value(summary_sheet.cell(pct_r, col_idx), f"={c_prod}{total_r}/{c_wmin}{total_r}")
-            target.number_format = '0%'
-
-        # ... Rest of the function remains identical ...
-            col_idx += 3
-
-        last_style_col_idx = col_idx - 1
-        last_col_let = get_column_letter(last_style_col_idx)
-        
-        sum_start_col = col_idx + 1
-        range_cat = f"$B$5:${last_col_let}$5"
-        range_metric = f"$B$6:${last_col_let}$6"
-        
-        def write_summary_block(start_col, title, gauge_filter):
-            self.set_cell_value(summary_sheet.cell(4, start_col), title)
-            cols = ["Total Production", "W.Min", "Prod.Min", "Eff%"]
-            for i, h in enumerate(cols): 
-                self.set_cell_value(summary_sheet.cell(6, start_col + i), h)
-            
-            for day in range(1, days_in_month + 1):
-                r = start_data_row + day - 1
-                row_range = f"$B{r}:${last_col_let}{r}"
-                
-                # NOTE: We don't need to filter here because the source cells (Fine/Coarse style cols) are already 0 if date invalid
-                f_prod = f'=SUMIFS({row_range},{range_cat},"{gauge_filter}",{range_metric},"Acv")'
-                self.set_cell_value(summary_sheet.cell(r, start_col), f_prod)
-                f_wmin = f'=SUMIFS({row_range},{range_cat},"{gauge_filter}",{range_metric},"W.Min")'
-                self.set_cell_value(summary_sheet.cell(r, start_col+1), f_wmin)
-                f_pmin = f'=SUMIFS({row_range},{range_cat},"{gauge_filter}",{range_metric},"Prod.Min")'
-                self.set_cell_value(summary_sheet.cell(r, start_col+2), f_pmin)
-                
-                c_p = get_column_letter(start_col+2)
-                c_w = get_column_letter(start_col+1)
-                target = self.set_cell_value(summary_sheet.cell(r, start_col+3), f"=IFERROR({c_p}{r}/{c_w}{r},0)")
-                target.number_format = '0%'
-
-            tr = end_data_row + 1
-            for i in range(3):
-                c = get_column_letter(start_col + i)
-                self.set_cell_value(summary_sheet.cell(tr, start_col + i), f"=SUM({c}{start_data_row}:{c}{end_data_row})")
-            
-            c_p = get_column_letter(start_col+2)
-            c_w = get_column_letter(start_col+1)
-            target = self.set_cell_value(summary_sheet.cell(tr, start_col+3), f"=IFERROR({c_p}{tr}/{c_w}{tr},0)")
-            target.number_format = '0%'
-            return start_col + 4
-
-        next_col = write_summary_block(sum_start_col, "Fine Gauge", "Fine")
-        next_col = write_summary_block(next_col, "Coarse Gauge", "Coarse")
-        
-        gt_col = next_col
-        self.set_cell_value(summary_sheet.cell(4, gt_col), "Total")
-        gt_headers = ["Total Production", "W.Min", "Prod.Min", "DAILY MAN POWER", "Average Minutes", "Eff%"]
-        for i, h in enumerate(gt_headers): 
-            self.set_cell_value(summary_sheet.cell(6, gt_col + i), h)
-            
-        fine_start = sum_start_col
-        coarse_start = sum_start_col + 4
-        
-        for day in range(1, days_in_month + 1):
-            r = start_data_row + day - 1
-            
-            # --- V44 FINAL FIX: Validated Total Summary Formula Injection ---
-            if day in valid_days:
-                c_f = get_column_letter(fine_start)
-                c_c = get_column_letter(coarse_start)
-                self.set_cell_value(summary_sheet.cell(r, gt_col), f"={c_f}{r}+{c_c}{r}")
-                
-                c_f = get_column_letter(fine_start+1) 
-                c_c = get_column_letter(coarse_start+1)
-                self.set_cell_value(summary_sheet.cell(r, gt_col+1), f"={c_f}{r}+{c_c}{r}")
-                
-                c_f = get_column_letter(fine_start+2)
-                c_c = get_column_letter(coarse_start+2)
-                self.set_cell_value(summary_sheet.cell(r, gt_col+2), f"={c_f}{r}+{c_c}{r}")
-                
-                c_w = get_column_letter(gt_col+1)
-                c_mp = get_column_letter(gt_col+3)
-                self.set_cell_value(summary_sheet.cell(r, gt_col+4), f"=IFERROR({c_w}{r}/{c_mp}{r},0)")
-                
-                c_p = get_column_letter(gt_col+2)
-                target = self.set_cell_value(summary_sheet.cell(r, gt_col+5), f"=IFERROR({c_p}{r}/{c_w}{r},0)")
-                target.number_format = '0%'
-            else:
-                # --- CLEANUP: Clear calculated columns for invalid/ghost dates ---
-                # Exclude Man Power (gt_col+3) in case it is manual input
-                self.set_cell_value(summary_sheet.cell(r, gt_col), 0)
-                self.set_cell_value(summary_sheet.cell(r, gt_col+1), 0)
-                self.set_cell_value(summary_sheet.cell(r, gt_col+2), 0)
-                self.set_cell_value(summary_sheet.cell(r, gt_col+4), 0)
-                self.set_cell_value(summary_sheet.cell(r, gt_col+5), 0)
-
-        tr = end_data_row + 1
-        for i in range(4):
-            c = get_column_letter(gt_col + i)
-            self.set_cell_value(summary_sheet.cell(tr, gt_col + i), f"=SUM({c}{start_data_row}:{c}{end_data_row})")
-        
-        c_w = get_column_letter(gt_col+1); c_mp = get_column_letter(gt_col+3); c_p = get_column_letter(gt_col+2)
-        self.set_cell_value(summary_sheet.cell(tr, gt_col+4), f"=IFERROR({c_w}{tr}/{c_mp}{tr},0)")
-        
-        target = self.set_cell_value(summary_sheet.cell(tr, gt_col+5), f"=IFERROR({c_p}{tr}/{c_w}{tr},0)")
-        target.number_format = '0%'
-
-        # 6. Chart (KP4:KY25)
-        eff_col_idx = gt_col + 5
-        date_col_idx = 1
-        if len(summary_sheet._charts) > 0: del summary_sheet._charts[:]
-        chart = BarChart(); chart.type = "col"; chart.style = 10; chart.title = "Total Efficiency %"; chart.y_axis.title = "Efficiency %"; chart.x_axis.title = "Date"; chart.legend = None
-        data = Reference(summary_sheet, min_col=eff_col_idx, min_row=start_data_row-1, max_row=end_data_row)
-        cats = Reference(summary_sheet, min_col=date_col_idx, min_row=start_data_row, max_row=end_data_row)
-        chart.add_data(data, titles_from_data=True); chart.set_categories(cats)
-        chart.height = 13; chart.width = 20
-        summary_sheet.add_chart(chart, "KP4")
-        wb.save(filepath)
-
-    # ... Helper Methods ...
-    def force_fill_headers(self, ws, entry):
-        fill_map = {"style": entry['style'], "customer": entry['buyer'], "gauge": entry['gg'], "orderqty": entry['order_qty'], "consumtionqty": entry['con_qty']}
-        for r in range(1, 65):
-            for c in range(1, 15):
-                cell = ws.cell(r, c)
-                if not cell.value: continue
-                val = self.clean_text_strict(cell.value)
-                if val in fill_map:
-                    end_col = c
-                    for merged_range in ws.merged_cells.ranges:
-                        if cell.coordinate in merged_range: end_col = merged_range.max_col; break
-                    target_cell = ws.cell(r, end_col + 1)
-                    final_target = target_cell
-                    for merged_range in ws.merged_cells.ranges:
-                        if target_cell.coordinate in merged_range: final_target = ws.cell(merged_range.min_row, merged_range.min_col); break
-                    self.set_cell_value(final_target, fill_map[val])
-
-    def find_table_header(self, ws):
-        for r in range(10, 40):
-            row_vals = [self.clean_text_strict(ws.cell(r, c).value) for c in range(1, 20)]
-            if ("output" in row_vals or "production" in row_vals) and ("date" in row_vals or any("date" in x for x in row_vals)): return r
-        return None
-
-    def map_table_columns(self, ws, r):
-        m = {}
-        for c in range(1, 20):
-            v = str(ws.cell(r, c).value).lower().strip()
-            if "day" in v and "days" not in v: m['Day'] = c
-            elif "date" in v: m['Date'] = c
-            elif "output" in v: m['Output'] = c
-            elif "op" in v and ("no" in v or "m/c" in v): m['MC'] = c
-            elif "avg" in v and "prod" in v: m['AvgProd'] = c
-            elif "total" in v and ("work" in v or "min" in v): m['Min'] = c
-            elif "eff" in v: m['Eff'] = c
-            elif "time" in v: m['Time'] = c
-        return m
-
-    def update_total_summary(self, wb, ws_style, style_name, header_row, col_map):
-        if "TOTAL SUMMARY" not in wb.sheetnames: return
-        ws_sum = wb["TOTAL SUMMARY"]
-        addr_map = {}
-        total_row = None
-        for r in range(header_row + 1, 100):
-            val = ws_style.cell(r, 1).value
-            if val and ("total" in str(val).lower()): total_row = r; break
-        
-        for r in range(1, 70):
-            for c in range(1, 15):
-                val = ws_style.cell(r, c).value
-                if not val: continue
-                v = self.clean_text_strict(val)
-                if "customer" in v or "style" in v or "gauge" in v or "orderqty" in v or "linkingqty" in v or "smv" in v:
-                    end_col = c
-                    # V44 FIX: Replaced 'ws' with 'ws_style'
-                    for merged_range in ws_style.merged_cells.ranges:
-                        if ws_style.cell(r, c).coordinate in merged_range: end_col = merged_range.max_col; break
-                    target_c = end_col + 1
-                    target_cell = ws_style.cell(r, target_c)
-                    final_target = target_cell
-                    for merged_range in ws_style.merged_cells.ranges:
-                        if target_cell.coordinate in merged_range: final_target = ws_style.cell(merged_range.min_row, merged_range.min_col); break
-                    if "customer" in v: addr_map['Buyer'] = final_target.coordinate
-                    elif "style" in v: addr_map['Style'] = final_target.coordinate
-                    elif "gauge" in v: addr_map['GG'] = final_target.coordinate
-                    elif "smv" in v: addr_map['SMV'] = final_target.coordinate
-                    elif "orderqty" in v: addr_map['OrderQty'] = final_target.coordinate
-                    elif "linkingqty" in v: addr_map['LinkQty'] = final_target.coordinate
-
-        target_r = None; start_row = 5; last_sno = 0
-        for r in range(start_row, 500):
-            s_val = ws_sum.cell(r, 3).value; s_no = ws_sum.cell(r, 1).value
-            if isinstance(s_no, int): last_sno = s_no
-            if s_val and isinstance(s_val, str) and style_name in s_val: target_r = r; break
-            if not s_val: target_r = r; break
-        if not target_r: return
-
-        if ws_sum.cell(target_r, 1).value is None: self.set_cell_value(ws_sum.cell(target_r, 1), last_sno + 1)
-        if 'Buyer' in addr_map: self.set_cell_value(ws_sum.cell(target_r, 2), ws_style[addr_map['Buyer']].value)
-        self.set_cell_value(ws_sum.cell(target_r, 3), style_name)
-        if 'GG' in addr_map: self.set_cell_value(ws_sum.cell(target_r, 4), ws_style[addr_map['GG']].value)
-        quoted_style = f"'{style_name}'"
-        if 'OrderQty' in addr_map: self.set_cell_value(ws_sum.cell(target_r, 5), f"={quoted_style}!{addr_map['OrderQty']}")
-        if 'LinkQty' in addr_map: self.set_cell_value(ws_sum.cell(target_r, 6), f"={quoted_style}!{addr_map['LinkQty']}")
-        self.set_cell_value(ws_sum.cell(target_r, 7), f"=E{target_r}-F{target_r}")
-        if 'SMV' in addr_map: self.set_cell_value(ws_sum.cell(target_r, 8), f"={quoted_style}!{addr_map['SMV']}")
-        if total_row:
-            col_out = get_column_letter(col_map['Output']); col_wmin = get_column_letter(col_map['Min']) if 'Min' in col_map else 'F'; col_eff = get_column_letter(col_map['Eff']) if 'Eff' in col_map else 'G'
-            self.set_cell_value(ws_sum.cell(target_r, 9), f"={quoted_style}!{col_out}{total_row}")
-            self.set_cell_value(ws_sum.cell(target_r, 10), f"={quoted_style}!{col_wmin}{total_row}")
-            self.set_cell_value(ws_sum.cell(target_r, 11), f"=H{target_r}*I{target_r}")
-            col_date = get_column_letter(col_map['Date']); s_row = header_row + 1; e_row = total_row - 1
-            self.set_cell_value(ws_sum.cell(target_r, 12), f"=COUNTA({quoted_style}!{col_date}{s_row}:{col_date}{e_row})")
-            target = self.set_cell_value(ws_sum.cell(target_r, 13), f"={quoted_style}!{col_eff}{total_row}")
-            target.number_format = '0%'
-
-    def update_footer_formulas(self, ws, header_row, col_map):
-        total_row = None
-        for r in range(header_row + 1, 100):
-            val = ws.cell(r, 1).value
-            if val and ("total" in str(val).lower()): total_row = r; break
-        if total_row:
-            start = header_row + 1; end = total_row - 1
-            c_op = get_column_letter(col_map['MC']) if 'MC' in col_map else None
-            c_out = get_column_letter(col_map['Output'])
-            c_avg = get_column_letter(col_map['AvgProd']) if 'AvgProd' in col_map else None
-            c_min = get_column_letter(col_map['Min']) if 'Min' in col_map else None
-            c_eff = get_column_letter(col_map['Eff']) if 'Eff' in col_map else None
-            if c_op: self.set_cell_value(ws.cell(total_row, col_map['MC']), f"=SUM({c_op}{start}:{c_op}{end})")
-            self.set_cell_value(ws.cell(total_row, col_map['Output']), f"=SUM({c_out}{start}:{c_out}{end})")
-            if c_avg and c_op: self.set_cell_value(ws.cell(total_row, col_map['AvgProd']), f"={c_out}{total_row}/{c_op}{total_row}")
-            if c_min: self.set_cell_value(ws.cell(total_row, col_map['Min']), f"=SUM({c_min}{start}:{c_min}{end})")
-            if c_eff and c_min:
-                f_footer_eff = f"={c_out}{total_row}*$K$11/{c_min}{total_row}"
-                target = self.set_cell_value(ws.cell(total_row, col_map['Eff']), f_footer_eff)
-                target.number_format = '0%'
-
-    def add_efficiency_chart(self, ws, header_row, col_map):
-        if len(ws._charts) > 0: del ws._charts[:]
-        eff_col = col_map['Eff']; day_col = col_map['Day']; data_start = header_row + 1; data_end = header_row + 32 
-        values = Reference(ws, min_col=eff_col, min_row=header_row, max_row=data_end); cats = Reference(ws, min_col=day_col, min_row=data_start, max_row=data_end)
-        chart = LineChart(); chart.title = "Efficiency (%)"; chart.style = 13; chart.y_axis.title = "Efficiency"; chart.x_axis.title = "Day"; chart.legend = None 
-        chart.add_data(values, titles_from_data=True); chart.set_categories(cats)
-        s1 = chart.series[0]; s1.marker.symbol = "circle"; s1.dLbls = DataLabelList(); s1.dLbls.showVal = True; s1.dLbls.numFmt = '0%'
-        chart.height = 10; chart.width = 18; ws.add_chart(chart, "J16")
+            result = self.apply_changeset(mas_file, profile=profile, values_export=values_export, partial_save=partial_save)
+            self.ui_queue.put(("done", (result, None)))
+        except Exception as e:
+            if not isinstance(e, (RunCancelled, PreviewOutdated)): traceback.print_exc()
+            self.ui_queue.put(("done", (None, e)))
+
+    def cancel_process(self):
+        if self.worker and self.worker.is_alive():
+            self.log("Cancel requested: stopping after the current style...")
+            self.cancel_btn.config(state="disabled")
+            self.cancel()
+
+    def on_run_finished(self, result, error):
+        self.start_btn.config(state="normal")
+        self.cancel_btn.config(state="disabled")
+        self.rollover_btn.config(state="normal")
+        if isinstance(error, RunCancelled):
+            self.log(f"--- CANCELLED: {error} ---")
+            messagebox.showinfo("Cancelled", str(error))
+        elif error is not None:
+            self.log(f"CRITICAL ERROR: {str(error)}")
+            messagebox.showerror("Error", str(error))
+        elif result['status'] == 'no_data':
+            messagebox.showwarning("No Data", "No data found where 'Today' > 0.")
+        elif result['status'] == 'up_to_date':
+            messagebox.showinfo("Success", "Master is already up to date.")
+        elif result['status'] == 'nothing_to_archive':
+            messagebox.showinfo("Archive", "No closed months to archive.")
+        elif result['status'] == 'dry_run':
+            summary = "\n".join(line.strip() for line in result['changes'][:15])
+            if messagebox.askyesno("Preview", f"{summary}\n\nFull diff: {result['report']}\n\nApply these changes to the master now?"):
+                self.apply_preview_process(result['master'])
+        elif 'archives' in result:
+            messagebox.showinfo("Archive", f"Archived {sum(len(v) for v in result['archived'].values())} sheets into {len(result['archives'])} workbook(s).")
+        else:
+            messagebox.showinfo("Success", f"Done! Updated {result['updated']} sheets and All Summaries.")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = GarmentsAutomationApp(root)
     root.mainloop()
\ No newline at end of file
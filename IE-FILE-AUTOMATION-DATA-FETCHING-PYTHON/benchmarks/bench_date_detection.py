@@ -0,0 +1,76 @@
+"""Microbenchmark: supervisor-row date detection, legacy strptime loop vs DateDetector.
+
+    python benchmarks/bench_date_detection.py [--sheets 300] [--repeat 3]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ie_engine import DateDetector
+
+def legacy_find_date_in_row(row):
+    # Verbatim copy of the pre-DateDetector implementation (IE-9 / V44)
+    date_pattern = re.compile(r'(\d{1,2})[-./](\d{1,2})[-./](\d{2,4})')
+    for cell in row:
+        if not cell: continue
+        if isinstance(cell, datetime): return cell
+        s_val = str(cell).strip()
+        match = date_pattern.search(s_val)
+        if match:
+            try:
+                d_str = f"{match.group(1)}/{match.group(2)}/{match.group(3)}"
+                for fmt in ["%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y"]:
+                    try: return datetime.strptime(d_str, fmt)
+                    except: continue
+            except: pass
+    return None
+
+def make_rows(sheets, styles=25, seed=7):
+    # Shape of a daily linking report: title, date line, header, style rows, total
+    random.seed(seed)
+    rows = []
+    header = ("SL", "Buyer", "Style No", "GG", "Order Qty", "Con Qty", "M/C", "SMV", "Working Min", "Aver Min", "Today")
+    for d in range(sheets):
+        day = d % 28 + 1
+        rows.append(("Sonia & Sweaters Ltd - Daily Linking Report",) + (None,) * 10)
+        rows.append((None, f"Date: {day:02d}.10.2025") + (None,) * 9)
+        rows.append(header)
+        for s in range(styles):
+            rows.append((s + 1, f"BUY{s % 4}", f"ST-{100 + s}", 12, 1000 + s, 400 + s, random.randint(5, 20),
+                         round(random.uniform(5, 30), 2), 600, 480, random.randint(0, 300)))
+        rows.append(("Total",) + (None,) * 9 + (sum(range(styles)),))
+    return rows
+
+def time_rows_per_sec(fn, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for row in rows: fn(row)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(rows) / best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sheets", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.sheets)
+    detector = DateDetector()
+    mismatches = sum(1 for row in rows if legacy_find_date_in_row(row) != detector.find_in_row(row))
+
+    before = time_rows_per_sec(legacy_find_date_in_row, rows, args.repeat)
+    after = time_rows_per_sec(detector.find_in_row, rows, args.repeat)
+    print(f"rows: {len(rows)}  (mismatches: {mismatches})")
+    print(f"legacy find_date_in_row : {before:12,.0f} rows/s")
+    print(f"DateDetector.find_in_row: {after:12,.0f} rows/s")
+    print(f"speed-up                : {after / before:12.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark suite: time and peak memory of every IE engine stage on a synthetic workload.
+
+    python benchmarks/bench_pipeline.py [--styles 25] [--days 30] [--sheets N] [--files 1]
+                                        [--existing-styles 0] [--merged 6] [--repeat 3]
+                                        [--no-memory] [--json results.json]
+
+Each repeat starts from a fresh copy of the generated master, so every run does
+the same amount of work. Wall time is the best of the repeats, peak memory the
+largest tracemalloc peak seen for the stage (tracemalloc slows the stages down;
+compare runs made with the same flags only).
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ie_engine import IEAutomationEngine, EntryStore, MasterWorkbookSession
+from workload import make_workload
+
+STAGES = ("read_supervisor_file", "EntryStore", "load master", "update_master_file",
+          "populate_bottom_summary_table", "update_date_wise_summary", "save")
+
+class StageRecorder:
+    """Wall time and tracemalloc peak per stage over several repeats."""
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.wall = {}
+        self.peak = {}
+
+    def measure(self, name, fn, *args):
+        if self.memory: tracemalloc.reset_peak()
+        start = time.perf_counter()
+        value = fn(*args)
+        elapsed = time.perf_counter() - start
+        self.wall[name] = min(self.wall.get(name, elapsed), elapsed)
+        if self.memory: self.peak[name] = max(self.peak.get(name, 0), tracemalloc.get_traced_memory()[1])
+        return value
+
+def run_once(engine, supervisor_paths, master_path, recorder):
+    # Same stage order as IEAutomationEngine.run(), minus the ledger (every repeat is a full update)
+    def read_all():
+        per_file = [engine.read_supervisor_file(p) for p in supervisor_paths]
+        return per_file[0] if len(per_file) == 1 else engine.merge_supervisor_entries(per_file)
+    entries = recorder.measure("read_supervisor_file", read_all)
+    store = recorder.measure("EntryStore", EntryStore, entries)
+    session = recorder.measure("load master", MasterWorkbookSession, master_path)
+    recorder.measure("update_master_file", engine.update_master_file, session, entries)
+    recorder.measure("populate_bottom_summary_table", engine.populate_bottom_summary_table, session, store)
+    recorder.measure("update_date_wise_summary", engine.update_date_wise_summary, session, store.valid_dates())
+    recorder.measure("save", session.save)
+    return len(entries)
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--styles", type=int, default=25)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--sheets", type=int, default=None, help="Sheets per supervisor file (default: one per day)")
+    parser.add_argument("--files", type=int, default=1)
+    parser.add_argument("--existing-styles", type=int, default=0)
+    parser.add_argument("--merged", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (faster, timings closer to production)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON (for comparing releases)")
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    recorder = StageRecorder(memory=not args.no_memory)
+    engine = IEAutomationEngine(log_callback=lambda msg: None)
+    work_dir = tempfile.mkdtemp(prefix="ie-bench-")
+    try:
+        supervisor_paths, template = make_workload(os.path.join(work_dir, "in"), args.styles, args.days, args.sheets,
+                                                   args.files, args.existing_styles, args.merged)
+        if recorder.memory: tracemalloc.start()
+        for i in range(args.repeat):
+            master = os.path.join(work_dir, f"master_{i}.xlsx")
+            shutil.copyfile(template, master)
+            entries = run_once(engine, supervisor_paths, master, recorder)
+        if recorder.memory: tracemalloc.stop()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"workload: {args.styles} styles x {args.days} days, {args.files} file(s), {entries} entries, "
+          f"{args.existing_styles} existing style sheets, best of {args.repeat}")
+    print(f"{'stage':32} {'wall (s)':>10} {'peak (MB)':>10}")
+    for name in STAGES:
+        peak = f"{recorder.peak[name] / 2**20:10.1f}" if name in recorder.peak else f"{'-':>10}"
+        print(f"{name:32} {recorder.wall[name]:10.3f} {peak}")
+    print(f"{'total':32} {sum(recorder.wall.values()):10.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"workload": {k: v for k, v in vars(args).items() if k != "json"}, "entries": entries,
+                       "stages": [{"stage": name, "wall_s": recorder.wall[name], "peak_bytes": recorder.peak.get(name)}
+                                  for name in STAGES]}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Synthetic workloads for the IE engine: supervisor daily reports and FORMATE-based masters.
+
+    python benchmarks/workload.py OUT_DIR [--styles 25] [--days 30] [--sheets 30] [--files 1]
+                                          [--existing-styles 0] [--merged 6] [--seed 1]
+
+Everything is generated from a seed, so two runs with the same arguments give
+the same cell content for the benchmark suite to compare against.
+"""
+import argparse
+import calendar
+import os
+import random
+from datetime import datetime
+
+import openpyxl
+
+SUPERVISOR_HEADER = ("SL", "Buyer", "Style No", "GG", "Order Qty", "Con Qty", "M/C", "SMV", "Working Min", "Aver Min", "Today")
+DAILY_HEADER = ("Day", "Date", "Op No", "Output", "Avg Prod", "Total Min", "Eff%", "Time")
+GAUGES = (3, 5, 7, 12, 14)
+
+def style_name(i):
+    # Every fourth style carries the " REQ" suffix the engine strips
+    return f"ST-{100 + i}" + (" REQ" if i % 4 == 0 else "")
+
+def make_supervisor_workbook(path, styles=25, days=30, sheets=None, month=10, year=2025, seed=1, zero_every=7, first_style=0):
+    """Daily linking report: one title/date/header/style-rows/total block per day.
+
+    With fewer sheets than days the day blocks are stacked on the sheets round-robin;
+    every zero_every-th style reports Today = 0 and is skipped by the engine.
+    """
+    rnd = random.Random(seed)
+    sheets = sheets or days
+    days = min(days, calendar.monthrange(year, month)[1])
+    wb = openpyxl.Workbook(); wb.remove(wb.active)
+    sheet_list = [wb.create_sheet(f"{i + 1:02d}") for i in range(sheets)]
+    next_row = {ws.title: 1 for ws in sheet_list}
+    for d in range(1, days + 1):
+        ws = sheet_list[(d - 1) % sheets]
+        r = next_row[ws.title]
+        ws.cell(r, 1, "Sonia & Sweaters Ltd - Daily Linking Report")
+        ws.cell(r + 1, 1, f"Date: {d:02d}.{month:02d}.{year}")
+        for c, h in enumerate(SUPERVISOR_HEADER, 1): ws.cell(r + 3, c, h)
+        r += 4
+        for s in range(first_style, first_style + styles):
+            today = 0 if zero_every and s % zero_every == zero_every - 1 else rnd.randint(20, 300)
+            values = (s - first_style + 1, f"BUY{s % 5}", style_name(s), GAUGES[s % len(GAUGES)], 1000 + 10 * s, 500 + 5 * s,
+                      rnd.randint(5, 20), round(rnd.uniform(5, 30), 2), 600, 480, today)
+            for c, v in enumerate(values, 1): ws.cell(r, c, v)
+            r += 1
+        ws.cell(r, 1, "Total")
+        next_row[ws.title] = r + 3
+    wb.save(path)
+    return path
+
+def add_formate_sheet(wb, month, year, merged_regions):
+    fmt = wb.active; fmt.title = "FORMATE"
+    fmt.cell(1, 1, "Sonia & Sweaters Ltd - Linking Graph")
+    for r, label in enumerate(("Customer", "Style", "Gauge", "Order Qty", "Consumtion Qty", "Linking Qty"), 4):
+        fmt.cell(r, 1, label)
+        fmt.merge_cells(start_row=r, start_column=1, end_row=r, end_column=2)
+        fmt.merge_cells(start_row=r, start_column=3, end_row=r, end_column=5)
+    fmt.cell(11, 7, "Gauge"); fmt.cell(11, 10, "SMV")
+    for c, h in enumerate(DAILY_HEADER, 1): fmt.cell(16, c, h)
+    for day in range(1, calendar.monthrange(year, month)[1] + 1): fmt.cell(16 + day, 1, day)
+    fmt.cell(48, 1, "Total")
+    # Decorative merges (title banner across rows 1-2, note boxes below the footer)
+    for i in range(merged_regions):
+        row, col = (1, 1 + 4 * i) if i < 6 else (50 + 2 * (i - 6), 1)
+        fmt.merge_cells(start_row=row, start_column=col, end_row=row + 1, end_column=col + 3)
+    return fmt
+
+def make_master_workbook(path, month=10, year=2025, existing_styles=0, merged_regions=6, seed=1):
+    """FORMATE master with TOTAL SUMMARY and Date Wise Summary sheets.
+
+    existing_styles pre-creates that many style sheets (FORMATE copies with header
+    values and a TOTAL SUMMARY row), so the update path meets sheets it must find.
+    """
+    rnd = random.Random(seed)
+    wb = openpyxl.Workbook()
+    fmt = add_formate_sheet(wb, month, year, merged_regions)
+
+    ts = wb.create_sheet("TOTAL SUMMARY")
+    for c, h in enumerate(("SL", "Buyer", "Style", "GG", "Order Qty", "Linking Qty", "Balance", "SMV",
+                           "Output", "W.Min", "Prod.Min", "Days", "Eff%"), 1): ts.cell(4, c, h)
+    ts.cell(33, 3, "Style Wise Summary")
+    for c, h in enumerate(("SL", "Buyer", "Style", "GG", "Order Qty", "Con Qty", "SMV", "Output", "W.Min", "Prod.Min", "Days", "Eff%"), 1): ts.cell(34, c, h)
+    wb.create_sheet(f"Date Wise Summary {datetime(year, month, 1).strftime('%b').upper()}-{year}").merge_cells("B2:D3")
+
+    for s in range(existing_styles):
+        ws = wb.copy_worksheet(fmt); ws.title = style_name(s).replace(" REQ", "")
+        for r, v in ((4, f"BUY{s % 5}"), (5, ws.title), (6, GAUGES[s % len(GAUGES)]), (7, 1000 + 10 * s), (8, 500 + 5 * s)): ws.cell(r, 3, v)
+        ws["H11"] = GAUGES[s % len(GAUGES)]; ws["K11"] = round(rnd.uniform(5, 30), 2)
+        ts.cell(5 + s, 1, s + 1); ts.cell(5 + s, 3, ws.title)
+    wb.save(path)
+    return path
+
+def make_workload(out_dir, styles=25, days=30, sheets=None, files=1, existing_styles=0, merged_regions=6, month=10, year=2025, seed=1):
+    """Writes master.xlsx and files supervisor workbooks into out_dir; returns (supervisor_paths, master_path).
+
+    Supervisor files split the styles between them, the way separate floors report.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    master = make_master_workbook(os.path.join(out_dir, "master.xlsx"), month, year, existing_styles, merged_regions, seed)
+    per_file = max(1, styles // files)
+    paths = []
+    for f in range(files):
+        path = os.path.join(out_dir, f"supervisor_{f + 1:02d}.xlsx")
+        count = per_file if f < files - 1 else styles - per_file * (files - 1)
+        paths.append(make_supervisor_workbook(path, count, days, sheets, month, year, seed + f, first_style=per_file * f))
+    return paths, master
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--styles", type=int, default=25)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--sheets", type=int, default=None, help="Sheets per supervisor file (default: one per day)")
+    parser.add_argument("--files", type=int, default=1, help="Number of supervisor files")
+    parser.add_argument("--existing-styles", type=int, default=0, help="Style sheets already in the master")
+    parser.add_argument("--merged", type=int, default=6, help="Extra merged regions on FORMATE")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    paths, master = make_workload(args.out_dir, args.styles, args.days, args.sheets, args.files,
+                                  args.existing_styles, args.merged, seed=args.seed)
+    print(f"master     : {master}")
+    for p in paths: print(f"supervisor : {p}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Batch mode: updates the masters of several production blocks in parallel.
+
+    python ie_batch.py factory.json [--workers 4] [--report factory.report.json] [--json]
+                       [--full] [--partial-save] [--month-first] [--two-digit-years]
+
+The manifest lists the (supervisor files, master) pairs, paths relative to the
+manifest's folder, supervisor entries may be glob patterns:
+
+    {"blocks": [
+        {"master": "Block-01.xlsx", "supervisor": ["reports/B01/*.xlsx"]},
+        {"master": "Block-02.xlsx", "supervisor": ["reports/B02-line1.xlsx", "reports/B02-line2.xlsx"]}
+    ]}
+
+Each master is one job, run by IEAutomationEngine.run() in its own worker
+process (which reads its supervisor files one after the other), so the whole
+factory takes about as long as its slowest block. Entries naming the same
+master are merged into one job (one writer per master), and a master that
+ie_watch.py is watching is skipped instead of written twice; a lock left by a
+process that died is taken over. With
+--history-db the workers hand their entries back and this process is the
+history store's only writer. The run ends with one report over all blocks, also
+written as JSON with --report.
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from ie_engine import (IEAutomationEngine, DateDetector, MasterLockedError, acquire_master_lock, release_master_lock,
+                       EXIT_OK, EXIT_ERROR, EXIT_MISSING_FILE)
+from ie_history import HistoryStore, default_history_path
+
+class ManifestError(Exception):
+    """The manifest cannot be read or lists no usable block."""
+
+def load_manifest(path):
+    """[(block name, master, [supervisor paths])] in manifest order, one item per master."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ManifestError(f"{path}: {e}") from None
+    blocks = data.get("blocks") if isinstance(data, dict) else data
+    if not isinstance(blocks, list) or not blocks: raise ManifestError(f"{path}: no blocks listed")
+
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = {}  # normalised master path -> (block name, master, supervisor paths)
+    for i, block in enumerate(blocks, 1):
+        if not isinstance(block, dict) or not block.get("master"): raise ManifestError(f"{path}: block {i} has no master")
+        sources = block.get("supervisor") or []
+        if isinstance(sources, str): sources = [sources]
+        master = os.path.join(base, block["master"])
+        supervisors = jobs.setdefault(os.path.normcase(os.path.realpath(master)), (block_name(master, base), master, []))[2]
+        for source in sources:
+            source = os.path.join(base, source)
+            # A pattern that matches nothing stays as it is and is reported as a missing file
+            matches = sorted(glob.glob(source)) if glob.has_magic(source) else [source]
+            supervisors.extend(p for p in (matches or [source]) if p not in supervisors)
+    return list(jobs.values())
+
+class BlockEngine(IEAutomationEngine):
+    """Engine of one batch worker: keeps its history entries for the parent process instead of writing them."""
+    def __init__(self, *args, **kwargs):
+        IEAutomationEngine.__init__(self, *args, **kwargs)
+        self.history = None
+
+    def record_history(self, entries, supervisor_paths):
+        self.history = self.history_batch(entries, supervisor_paths)
+        return 0
+
+def block_name(master, base):
+    # The master's path below the manifest folder, so B01/master and B02/master stay apart
+    try:
+        name = os.path.relpath(master, base)
+    except ValueError:  # another drive on Windows
+        name = os.path.abspath(master)
+    return os.path.splitext(name)[0].replace(os.sep, "/")
+
+def run_block(name, master, supervisors, options):
+    # Process-pool entry point: module level so it pickles by reference. Never raises:
+    # a failed block is reported, the other blocks carry on
+    summary = {"block": name, "master": master, "supervisor_files": supervisors, "status": "error",
+               "entries": 0, "pending": 0, "updated": 0, "seconds": 0.0}
+    missing = [p for p in supervisors + [master] if not os.path.isfile(p)]
+    if missing or not supervisors:
+        summary.update(status="missing_file", error="File not found: " + (", ".join(missing) or "no supervisor files"))
+        return summary
+
+    # The watch daemon's lock: a watched master already has its writer
+    try:
+        acquire_master_lock(master, "ie_batch.py")
+    except MasterLockedError as e:
+        summary.update(status="locked", error=str(e))
+        return summary
+
+    stream = sys.stderr if options.get("log_stderr") else sys.stdout  # --json keeps stdout for the report
+    # Serial reads: this worker is already one of --workers processes, a pool per block would multiply them
+    engine = BlockEngine(log_callback=lambda msg: print(f"{datetime.now().strftime('%H:%M:%S')} - [{name}] {msg}", file=stream, flush=True),
+                         date_detector=DateDetector(**options["date_config"]), history_path=options["history_db"],
+                         parallel_reads=False)
+    start = time.perf_counter()
+    try:
+        result = engine.run(supervisors, master, incremental=not options["full"], partial_save=options["partial_save"])
+        summary.update({k: result[k] for k in ("status", "entries", "pending", "updated")})
+        summary["history"] = engine.history
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        summary["seconds"] = round(time.perf_counter() - start, 2)
+        release_master_lock(master)
+    return summary
+
+def record_history(store, summary, log):
+    # Parent side of the history store: blocks finish one at a time, so there is a single writer
+    batch = summary.pop("history", None)
+    if store is None or batch is None: return
+    try:
+        summary["history_added"] = store.append(*batch)
+        log(f"History: {summary['history_added']} new of {len(batch[0])} entries from {summary['block']}")
+    except sqlite3.Error as e:
+        summary["history_error"] = str(e)
+        log(f"WARNING: History of {summary['block']} not stored ({e}).")
+
+def run_batch(jobs, options, workers=None, log=print):
+    """Runs every (block name, master, supervisors) job, in parallel where possible; returns their summaries in job order."""
+    workers = max(1, min(len(jobs), workers or os.cpu_count() or 1))
+    summaries = {}
+    store = HistoryStore(options["history_db"]) if options.get("history_db") else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_block, name, master, supervisors, options): master for name, master, supervisors in jobs}
+            for future in as_completed(futures):
+                summary = summaries[futures[future]] = future.result()
+                log(f"Batch: {summary['block']} {summary['status']} in {summary['seconds']:.1f}s")
+                record_history(store, summary, log)
+    except Exception as pool_e:
+        # Pool can't start (frozen build, locked-down PC): run the blocks one by one instead
+        log(f"Parallel run unavailable ({pool_e}); updating blocks one by one...")
+        for name, master, supervisors in jobs:
+            if master in summaries: continue
+            summaries[master] = run_block(name, master, supervisors, options)
+            record_history(store, summaries[master], log)
+    finally:
+        if store: store.close()
+    return [summaries[master] for _, master, _ in jobs]
+
+def report_lines(summaries, wall_seconds):
+    width = max([32] + [len(s["block"]) for s in summaries])
+    lines = [f"{'Block':<{width}} {'Status':<13} {'Entries':>8} {'New':>6} {'Updated':>8} {'Time':>8}"]
+    for s in summaries:
+        lines.append(f"{s['block']:<{width}} {s['status']:<13} {s['entries']:>8} {s['pending']:>6} {s['updated']:>8} {s['seconds']:>7.1f}s")
+        if s.get("error"): lines.append(f"    {s['error']}")
+    busy = sum(s["seconds"] for s in summaries)
+    lines.append(f"{len(summaries)} block(s), {sum(s['updated'] for s in summaries)} updated, "
+                 f"{sum(s['status'] in ('error', 'missing_file', 'locked') for s in summaries)} failed: "
+                 f"{wall_seconds:.1f}s wall time for {busy:.1f}s of block runs.")
+    return lines
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Update the IE masters of several blocks in parallel from a manifest.")
+    parser.add_argument("manifest", help="JSON manifest of (supervisor files, master) pairs")
+    parser.add_argument("--workers", type=int, default=None, help="Blocks updated at once (default: one per CPU)")
+    parser.add_argument("--report", metavar="JSON", help="Also write the aggregated run report to this file")
+    parser.add_argument("--full", action="store_true", help="Ignore the ingestion ledgers and re-apply every row")
+    parser.add_argument("--partial-save", action="store_true",
+                        help="Patch only the changed rows into each master when possible (full save otherwise)")
+    parser.add_argument("--month-first", action="store_true", help="Supervisor dates are MM/DD/YYYY instead of DD/MM/YYYY")
+    parser.add_argument("--two-digit-years", action="store_true", help="Accept DD/MM/YY report dates (20YY)")
+    parser.add_argument("--history-db", nargs="?", const=default_history_path(), default=None, metavar="SQLITE",
+                        help="Also append the entries to the supervisor history store queried by ie_history.py (default $IE_HISTORY_DB or ~/.ie_history.sqlite)")
+    parser.add_argument("--json", action="store_true", help="Print the aggregated report as JSON instead of a table")
+    return parser
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.workers is not None and args.workers < 1: parser.error("--workers must be at least 1")
+    try:
+        jobs = load_manifest(args.manifest)
+    except ManifestError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return EXIT_MISSING_FILE
+
+    history_db = os.environ.get("IE_HISTORY_DB", "") if args.history_db is None else args.history_db  # same opt-in as ie_engine.py
+    options = {"full": args.full, "partial_save": args.partial_save, "history_db": history_db, "log_stderr": args.json,
+               "date_config": DateDetector(day_first=not args.month_first, two_digit_years=args.two_digit_years).config()}
+    start = time.perf_counter()
+    summaries = run_batch(jobs, options, args.workers, log=lambda msg: print(msg, file=sys.stderr if args.json else sys.stdout, flush=True))
+    wall_seconds = time.perf_counter() - start
+
+    report = {"manifest": os.path.abspath(args.manifest), "finished": datetime.now().isoformat(timespec="seconds"),
+              "wall_seconds": round(wall_seconds, 2), "blocks": summaries}
+    if args.report:
+        tmp_path = args.report + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f: json.dump(report, f, indent=1)
+        os.replace(tmp_path, args.report)
+    if args.json: print(json.dumps(report, indent=1))
+    else:
+        for line in report_lines(summaries, wall_seconds): print(line)
+    return EXIT_ERROR if any(s["status"] in ("error", "missing_file", "locked") for s in summaries) else EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2463 @@
+"""IE automation engine: supervisor report extraction and master workbook update.
+
+Importable without Tk. GarmentsAutomationApp (IE-9.py) is a thin GUI on top of
+IEAutomationEngine, and the same engine runs headless from the command line:
+
+    python ie_engine.py --supervisor day1.xlsx day2.xlsx --master Block-01.xlsx [--json]
+    python ie_engine.py --supervisor day1.xlsx --master Block-01.xlsx --dry-run   # preview the change set
+    python ie_engine.py --master Block-01.xlsx --apply                  # save the previewed change set
+    python ie_engine.py --master Block-01.xlsx --rollover [YYYY-MM]     # archive closed months
+    python ie_engine.py --master Block-01.xlsx --archived STYLE         # where a style was archived
+
+With --history-db (or $IE_HISTORY_DB set) a run also appends the extracted
+entries to the supervisor history store (ie_history.py, which has the query
+CLI). ie_watch.py runs the same update
+automatically for reports saved into a folder, and ie_batch.py updates the
+masters of several blocks in parallel from a manifest.
+"""
+import openpyxl
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter, coordinate_to_tuple
+from openpyxl.utils.units import cm_to_EMU
+from openpyxl.cell.cell import MergedCell
+from openpyxl.formula.tokenizer import Tokenizer, Token
+from openpyxl.formula.translate import Translator
+from openpyxl.chart import BarChart, LineChart, Reference
+from openpyxl.chart.label import DataLabelList
+from datetime import datetime
+import re
+import os
+import sys
+import calendar
+import warnings
+import traceback
+import tempfile
+import time
+import weakref
+import json
+import hashlib
+import sqlite3
+import socket
+import argparse
+import threading
+from bisect import bisect_right, insort
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from copy import copy
+from urllib.request import pathname2url
+
+from ie_formulas import materialise_values
+from ie_xlsxpatch import patch_package, PatchUnsupported
+from ie_history import HistoryStore, default_history_path, content_hash
+
+try:
+    import pandas as pd
+except ImportError:  # optional: EntryStore falls back to plain Python loops
+    pd = None
+
+try:
+    import resource
+except ImportError:  # Windows: peak_rss_mb() asks psapi instead
+    resource = None
+
+# Suppress warnings
+warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
+
+# Supervisors tag requisition lots as 'XYZ-REQ'; the master keeps one sheet per base style
+REQ_SUFFIX = re.compile(r'[\s\-_]*REQ$', re.IGNORECASE)
+
+def clean_style_name(raw_style):
+    return REQ_SUFFIX.sub('', str(raw_style).strip()).strip()
+
+class PreviewOutdated(Exception):
+    """The master or a supervisor file changed after the dry run; the preview must be made again."""
+
+class RunCancelled(Exception):
+    """Raised between styles/stages once cancel() was requested; the master is left untouched."""
+
+# ==========================================
+# DATE DETECTION (Supervisor Rows)
+# ==========================================
+DATE_PATTERN = re.compile(r'(\d{1,2})[-./](\d{1,2})[-./](\d{2,4})')
+
+class DateDetector:
+    """Finds the report date in a supervisor row.
+
+    datetime cells are returned as-is and numbers are skipped (they can never
+    match the pattern). Text cells go through one precompiled regex, and the
+    parse result is memoised per distinct string, because daily reports repeat
+    the same few date labels on every sheet.
+
+    Defaults match the original parser: day-first and 4-digit years only.
+    Set day_first=False for month-first reports, and two_digit_years=True to
+    read '05/10/25' as 2025.
+    """
+    def __init__(self, day_first=True, two_digit_years=False, cache_size=4096):
+        self.day_first = day_first
+        self.two_digit_years = two_digit_years
+        self.parse_text = lru_cache(maxsize=cache_size)(self._parse_text)
+
+    def config(self):
+        return {"day_first": self.day_first, "two_digit_years": self.two_digit_years}
+
+    def _parse_text(self, s_val):
+        match = DATE_PATTERN.search(s_val)
+        if not match: return None
+        first, second, year = match.groups()
+        day, month = (first, second) if self.day_first else (second, first)
+        if len(year) == 4: y = int(year)
+        elif len(year) == 2 and self.two_digit_years: y = 2000 + int(year)
+        else: return None
+        try: return datetime(y, int(month), int(day))
+        except ValueError: return None
+
+    def find_in_row(self, row):
+        for cell in row:
+            if not cell: continue
+            if isinstance(cell, datetime): return cell
+            if isinstance(cell, (int, float)): continue
+            found = self.parse_text(str(cell).strip())
+            if found: return found
+        return None
+
+# ==========================================
+# COLUMNAR ENTRY STORE
+# ==========================================
+class EntryStore:
+    """Columnar copy of the extracted supervisor entries.
+
+    With pandas installed the entries become one DataFrame with categorical
+    style/buyer columns. The REQ cleanup then runs once per distinct style,
+    and per-style totals, working days and validation counts are groupby and
+    mask operations. Without pandas the same results come from plain loops.
+    Rows are kept date-sorted (stable), the order update_master_file writes
+    them in. The row dicts are kept as well, because the sheet writer consumes them
+    one by one.
+    """
+    TEXT_COLUMNS = ("gg", "order_qty", "con_qty")
+    NUMERIC_COLUMNS = ("output", "mc", "aver_min", "smv")
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.frame = self._build_frame(entries) if pd is not None and entries else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def _build_frame(cls, entries):
+        cols = {
+            "date": pd.to_datetime([e['date'] for e in entries]),
+            "style": pd.Series([str(e['style']) for e in entries], dtype="category"),
+            "buyer": pd.Series([e['buyer'] for e in entries], dtype=object).astype("category"),
+        }
+        # Mixed int/str/None cells must stay exactly as read, so no numeric coercion here
+        for c in cls.TEXT_COLUMNS: cols[c] = pd.Series([e[c] for e in entries], dtype=object)
+        for c in cls.NUMERIC_COLUMNS: cols[c] = pd.Series([e[c] for e in entries], dtype="float64")
+        frame = pd.DataFrame(cols)
+        # Categorical map(): the REQ regex runs once per distinct raw style
+        frame["style"] = frame["style"].map(clean_style_name).astype("category")
+        frame["day"] = frame["date"].dt.normalize()
+        frame["wmin"] = frame["mc"] * frame["aver_min"]
+        # Stable date sort: 'first row per style' means the earliest day, as the sheet writer sees it
+        return frame.sort_values("date", kind="stable", ignore_index=True)
+
+    def valid_dates(self):
+        if self.frame is None: return {e['date'].date() for e in self.entries if isinstance(e['date'], datetime)}
+        return {d.date() for d in self.frame["day"].unique()}
+
+    def summary_by_style(self):
+        """Per cleaned style, sorted: first row's header fields, total output, total W.min, working days."""
+        if self.frame is None: return self._summary_by_style_loops()
+        f = self.frame
+        first = f.drop_duplicates("style", keep="first").set_index("style")
+        grouped = f.groupby("style", observed=True)
+        totals = grouped[["output", "wmin"]].sum()
+        days = grouped["day"].nunique()
+        summary = []
+        for s_name in sorted(str(s) for s in totals.index):
+            row = first.loc[s_name]
+            summary.append({
+                'buyer': None if pd.isna(row["buyer"]) else row["buyer"],
+                'style': s_name,
+                'gg': row["gg"],
+                'order_qty': row["order_qty"],
+                'con_qty': row["con_qty"],
+                'smv': float(row["smv"]),
+                'total_output': float(totals.at[s_name, "output"]),
+                'total_wmin': float(totals.at[s_name, "wmin"]),
+                'working_days': int(days.at[s_name]),
+            })
+        return summary
+
+    def _summary_by_style_loops(self):
+        style_map = {}
+        for entry in sorted(self.entries, key=lambda x: x['date']):
+            s_name = clean_style_name(entry['style'])
+            if s_name not in style_map:
+                style_map[s_name] = {
+                    'buyer': entry['buyer'],
+                    'style': s_name,
+                    'gg': entry['gg'],
+                    'order_qty': entry['order_qty'],
+                    'con_qty': entry['con_qty'],
+                    'smv': entry['smv'],
+                    'total_output': 0,
+                    'total_wmin': 0,
+                    'dates': set()
+                }
+            style_map[s_name]['total_output'] += entry['output']
+            style_map[s_name]['total_wmin'] += entry['mc'] * entry['aver_min']
+            style_map[s_name]['dates'].add(entry['date'].date())
+        summary = []
+        for s_name in sorted(style_map):
+            d = style_map[s_name]
+            d['working_days'] = len(d.pop('dates'))
+            summary.append(d)
+        return summary
+
+    def validate(self):
+        """Counts of suspicious rows as {check: count}; checks with no hits are left out."""
+        if self.frame is None:
+            seen = set()
+            checks = {"duplicate (date, style)": 0, "zero M/C": 0, "zero avg minutes": 0, "zero SMV": 0}
+            for e in self.entries:
+                key = (e['date'].date(), clean_style_name(e['style']))
+                if key in seen: checks["duplicate (date, style)"] += 1
+                seen.add(key)
+                if not e['mc']: checks["zero M/C"] += 1
+                if not e['aver_min']: checks["zero avg minutes"] += 1
+                if not e['smv']: checks["zero SMV"] += 1
+        else:
+            f = self.frame
+            checks = {
+                "duplicate (date, style)": int(f.duplicated(["day", "style"]).sum()),
+                "zero M/C": int((f["mc"] == 0).sum()),
+                "zero avg minutes": int((f["aver_min"] == 0).sum()),
+                "zero SMV": int((f["smv"] == 0).sum()),
+            }
+        return {k: v for k, v in checks.items() if v}
+
+class StageTimer:
+    """Collects wall-clock timings for the named stages of one run (and profiles them if given a RunProfiler)."""
+    def __init__(self, profiler=None):
+        self.timings = []
+        self.profiler = profiler
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            with (self.profiler.section("stage", name) if self.profiler else nullcontext()):
+                yield
+        finally:
+            self.timings.append((name, time.perf_counter() - start))
+
+    def total(self):
+        return sum(secs for _, secs in self.timings)
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it cannot be read."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (2**20 if sys.platform == "darwin" else 2**10)  # bytes on macOS, KB elsewhere
+    try:
+        import ctypes
+        from ctypes import wintypes
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+                       [(name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                        "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+        counters = ProcessMemoryCounters(); counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / 2**20
+    except Exception:
+        pass
+    return None
+
+class RunProfiler:
+    """Opt-in instrumentation for one run: wall time, CPU time, cells written,
+    rows scanned and peak RSS per stage and per style sheet.
+
+    Sections nest (a style section runs inside the 'Update Master Sheets' stage);
+    counters go to every open section. Work done in the supervisor process pool
+    shows up as wall time only, its CPU and rows belong to the child processes.
+    """
+    COUNTERS = ("cells_written", "rows_scanned")
+
+    def __init__(self):
+        self.sections = []  # finished sections, in completion order
+        self._open = []
+        self.started = datetime.now()
+
+    @staticmethod
+    def trace_for(master_path):
+        return os.path.splitext(master_path)[0] + ".trace.json"
+
+    @contextmanager
+    def section(self, kind, name):
+        record = {"kind": kind, "name": name, **{c: 0 for c in self.COUNTERS}}
+        wall, cpu = time.perf_counter(), time.process_time()
+        self._open.append(record)
+        try:
+            yield record
+        finally:
+            self._open.remove(record)
+            record["wall_s"] = round(time.perf_counter() - wall, 4)
+            record["cpu_s"] = round(time.process_time() - cpu, 4)
+            rss = peak_rss_mb()
+            record["peak_rss_mb"] = round(rss, 1) if rss is not None else None
+            self.sections.append(record)
+
+    def add(self, counter, amount=1):
+        for record in self._open: record[counter] += amount
+
+    def counting(self, rows, counter="rows_scanned"):
+        # Pass-through generator that counts the rows it hands on
+        for row in rows:
+            self.add(counter)
+            yield row
+
+    def summary_lines(self, top_styles=10):
+        head = f"   {'Section':<30} {'Wall':>8} {'CPU':>8} {'Cells':>8} {'Rows':>8} {'PeakRSS':>8}"
+        def line(r):
+            rss = f"{r['peak_rss_mb']:7.0f}M" if r['peak_rss_mb'] is not None else f"{'-':>8}"
+            return f"   {r['name'][:30]:<30} {r['wall_s']:7.2f}s {r['cpu_s']:7.2f}s {r['cells_written']:8d} {r['rows_scanned']:8d} {rss}"
+        lines = ["Profile (stages):", head] + [line(r) for r in self.sections if r["kind"] == "stage"]
+        styles = sorted((r for r in self.sections if r["kind"] == "style"), key=lambda r: r["wall_s"], reverse=True)
+        if styles:
+            lines += [f"Profile (slowest {min(top_styles, len(styles))} of {len(styles)} style sheets):", head]
+            lines += [line(r) for r in styles[:top_styles]]
+        return lines
+
+    def write_trace(self, path, **meta):
+        trace = {"started": self.started.isoformat(timespec="seconds"), **meta, "sections": self.sections}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, indent=1, default=str)
+        os.replace(tmp_path, path)
+
+class MasterWorkbookSession:
+    """One loaded master workbook shared by every stage of a run.
+
+    The file is read once on construction and written once by save(). The save goes
+    to a temp file next to the target and is swapped in with os.replace, so a crash
+    mid-save never leaves a truncated master behind.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.wb = openpyxl.load_workbook(filepath)
+
+    @staticmethod
+    def values_export_for(master_path):
+        return os.path.splitext(master_path)[0] + ".values.xlsx"
+
+    def save(self, path=None):
+        path = path or self.filepath
+        folder = os.path.dirname(os.path.abspath(path))
+        ext = os.path.splitext(path)[1] or ".xlsx"
+        fd, tmp_path = tempfile.mkstemp(prefix="~ie_", suffix=ext, dir=folder)
+        os.close(fd)
+        try:
+            self.wb.save(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+            raise
+
+class MergedCellIndex:
+    """Row-bucketed interval index over the merged ranges of one worksheet.
+
+    Each row keeps its merged ranges sorted by start column, so resolving a
+    coordinate to its merge is a dict hit plus a bisect instead of a scan of
+    ws.merged_cells.ranges. Merges in one row never overlap, so the range that
+    starts at or before the column is the only candidate.
+    """
+    def __init__(self, ws):
+        self.ws = ws
+        self.rebuild()
+
+    def rebuild(self):
+        buckets = {}
+        for merged_range in self.ws.merged_cells.ranges:
+            for r in range(merged_range.min_row, merged_range.max_row + 1):
+                buckets.setdefault(r, []).append(merged_range)
+        self._rows = {}
+        for r, ranges in buckets.items():
+            ranges.sort(key=lambda m: m.min_col)
+            self._rows[r] = ([m.min_col for m in ranges], ranges)
+        self._signature = self.signature(self.ws)
+
+    @staticmethod
+    def signature(ws):
+        # An unmerge plus a merge elsewhere keeps the count, not the set of bounds
+        return frozenset((m.min_row, m.min_col, m.max_row, m.max_col) for m in ws.merged_cells.ranges)
+
+    def is_stale(self):
+        return self._signature != self.signature(self.ws)
+
+    def find(self, row, col):
+        bucket = self._rows.get(row)
+        if not bucket: return None
+        starts, ranges = bucket
+        i = bisect_right(starts, col) - 1
+        if i >= 0 and ranges[i].max_col >= col: return ranges[i]
+        return None
+
+    def anchors_in(self, min_row, max_row, min_col, max_col):
+        # {(row, col): (anchor_row, anchor_col)} for every covered cell of the rectangle
+        anchors = {}
+        for r in range(min_row, max_row + 1):
+            bucket = self._rows.get(r)
+            if not bucket: continue
+            for m in bucket[1]:
+                if m.max_col < min_col or m.min_col > max_col: continue
+                for c in range(max(m.min_col, min_col), min(m.max_col, max_col) + 1):
+                    anchors[(r, c)] = (m.min_row, m.min_col)
+        return anchors
+
+# One index per worksheet, dropped together with the workbook
+_MERGE_INDEXES = weakref.WeakKeyDictionary()
+
+def merge_index_for(ws):
+    index = _MERGE_INDEXES.get(ws)
+    if index is None:
+        index = _MERGE_INDEXES[ws] = MergedCellIndex(ws)
+    elif index.is_stale():
+        index.rebuild()
+    return index
+
+def invalidate_merge_index(ws):
+    _MERGE_INDEXES.pop(ws, None)
+
+class StyleDateIndex:
+    """Date -> row lookup for the daily table of one style sheet.
+
+    Mirrors the old top-down scan of the Date column: rows are indexed until the
+    first free row (empty Date) or the 'Total' footer, and a lookup returns the
+    first row whose Date matches, else that stop row. Text dates are matched
+    by substring like before ('05-Oct' in '05-Oct-25'), so every 6-char slice
+    of a text date is indexed.
+    """
+    def __init__(self, ws, header_row, date_col, limit=1000):
+        self.ws = ws
+        self.header_row = header_row
+        self.date_col = date_col
+        self.limit = limit
+        self.by_date = {}
+        self.by_label = {}
+        self.text_rows = []
+        self.stop_row = None
+        self.stop_is_total = False
+        self.rows_scanned = 0
+        self._scan(header_row + 1)
+
+    def _index_value(self, r, value):
+        if isinstance(value, datetime):
+            self.by_date.setdefault(value.date(), r)
+        elif isinstance(value, str):
+            self.text_rows.append((r, value))
+            for i in range(len(value) - 5):
+                self.by_label.setdefault(value[i:i+6], r)
+
+    def _scan(self, start):
+        self.stop_row = None; self.stop_is_total = False
+        for r in range(start, self.limit):
+            self.rows_scanned += 1
+            value = self.ws.cell(r, self.date_col).value
+            self._index_value(r, value)
+            if "total" in str(self.ws.cell(r, 1).value).lower():
+                self.stop_row = r; self.stop_is_total = True; return
+            if value is None:
+                self.stop_row = r; return
+
+    def lookup(self, when):
+        """Returns (row, action) with action 'match', 'insert' (at the Total row) or 'fill'."""
+        label = when.strftime("%d-%b")
+        if len(label) == 6:
+            by_text = self.by_label.get(label)
+        else:
+            by_text = next((r for r, v in self.text_rows if label in v), None)
+        hits = [r for r in (self.by_date.get(when.date()), by_text) if r is not None]
+        if hits: return min(hits), 'match'
+        if self.stop_row is None: return None, None
+        return self.stop_row, ('insert' if self.stop_is_total else 'fill')
+
+    def rows_inserted(self, idx, amount=1):
+        shift = lambda r: r + amount if r >= idx else r
+        self.by_date = {k: shift(r) for k, r in self.by_date.items()}
+        self.by_label = {k: shift(r) for k, r in self.by_label.items()}
+        self.text_rows = [(shift(r), v) for r, v in self.text_rows]
+        if self.stop_row is not None: self.stop_row = shift(self.stop_row)
+
+    def row_filled(self, r):
+        # Date was just written into a free row: index it and, if it was the stop row, move on
+        self._index_value(r, self.ws.cell(r, self.date_col).value)
+        if r == self.stop_row and self.ws.cell(r, self.date_col).value is not None:
+            self._scan(r + 1)
+
+class SummaryRowIndex:
+    """Style -> row lookup for the TOTAL SUMMARY top table (names in column C from row 5).
+
+    Built once per run instead of scanning rows 5..500 for every style. Names match
+    exactly (trimmed, case-insensitive), so 'ST-10' no longer lands on the 'ST-100'
+    row the old substring test found first. As before, only rows above the first
+    blank name count, and that blank row is where the next new style goes.
+    """
+    def __init__(self, ws, start_row=5, limit=500):
+        self.ws = ws
+        self.limit = limit
+        self.rows = {}       # name key -> first row
+        self.sno_rows = []   # rows with an integer S/No, ascending
+        self.snos = {}       # row -> S/No
+        self.free_row = None
+        self.rows_scanned = 0
+        self._scan(start_row)
+
+    @staticmethod
+    def key(name):
+        return str(name).strip().casefold()
+
+    def _note_sno(self, r, s_no):
+        if not isinstance(s_no, int): return
+        if r not in self.snos: insort(self.sno_rows, r)
+        self.snos[r] = s_no
+
+    def _scan(self, start):
+        self.free_row = None
+        for r in range(start, self.limit):
+            self.rows_scanned += 1
+            self._note_sno(r, self.ws.cell(r, 1).value)
+            s_val = self.ws.cell(r, 3).value
+            if not s_val:
+                self.free_row = r; return
+            if isinstance(s_val, str): self.rows.setdefault(self.key(s_val), r)
+
+    def last_sno(self, r):
+        # Last integer S/No at or above row r (0 if none), what the old scan had seen on arrival
+        i = bisect_right(self.sno_rows, r)
+        return self.snos[self.sno_rows[i - 1]] if i else 0
+
+    def lookup(self, style_name):
+        """Returns the style's row, else the first free row, else None."""
+        return self.rows.get(self.key(style_name), self.free_row)
+
+    def assigned(self, r, style_name):
+        # Row r now holds style_name (and maybe a new S/No): index it, move the free row on
+        self._note_sno(r, self.ws.cell(r, 1).value)
+        self.rows.setdefault(self.key(style_name), r)
+        if r == self.free_row: self._scan(r + 1)
+
+class TemplateLayoutCache:
+    """FORMATE layouts keyed by template fingerprint, kept in a JSON sidecar next to the master.
+
+    A layout holds everything the updater used to rediscover on every copy: the
+    header label -> value cell targets, the table header row and column map, the
+    TOTAL SUMMARY source cells and the SMV/Gauge anchors.
+    """
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self.layouts = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("version") == self.VERSION: self.layouts = stored.get("layouts", {})
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def sidecar_for(master_path):
+        return os.path.splitext(master_path)[0] + ".layout.json"
+
+    @classmethod
+    def fingerprint(cls, ws, max_row=70, max_col=19):
+        h = hashlib.sha1(f"v{cls.VERSION}".encode())
+        for row in ws.iter_rows(min_row=1, max_row=max_row, max_col=max_col, values_only=True):
+            h.update(repr(row).encode())
+        for merged_range in sorted(str(m) for m in ws.merged_cells.ranges):
+            h.update(merged_range.encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        return self.layouts.get(key)
+
+    def put(self, key, layout):
+        self.layouts[key] = layout
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "layouts": self.layouts}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+def file_stamp(path):
+    # Cheap "has this file changed" check: any save changes the size or the mtime
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""): digest.update(chunk)
+    return digest.hexdigest()
+
+# ==========================================
+# MASTER LOCK (One Writer: ie_watch.py or a batch worker)
+# ==========================================
+class MasterLockedError(Exception):
+    """Another live process (ie_watch.py or an ie_batch.py worker) is writing the master."""
+
+LOCK_STALE_AFTER = 3600  # seconds without a refresh before a lock from another computer counts as abandoned
+
+def master_lock_path(master_path):
+    return os.path.splitext(master_path)[0] + ".watch.lock"
+
+def pid_alive(pid):
+    if os.name == "nt":
+        # os.kill(pid, 0) would terminate the process on Windows: ask for its exit code instead
+        import ctypes
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle: return ctypes.get_last_error() == 5  # access denied: it exists
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try: os.kill(pid, 0)
+    except ProcessLookupError: return False
+    except PermissionError: return True
+    return True
+
+def read_master_lock(lock_path):
+    """The lock's {"pid", "host", "owner", "since"} (older locks hold a bare pid), or None if unreadable."""
+    try:
+        with open(lock_path, encoding="utf-8") as f: text = f.read().strip()
+    except OSError:
+        return None
+    try:
+        info = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(info, int): return {"pid": info, "host": socket.gethostname(), "owner": "ie_watch.py"}
+    return info if isinstance(info, dict) and isinstance(info.get("pid"), int) else None
+
+def lock_is_stale(lock_path, info):
+    try: age = time.time() - os.stat(lock_path).st_mtime
+    except OSError: return False  # released meanwhile: not ours to remove, just try again
+    if info is None: return age > 60  # still empty while its creator writes it, or garbage
+    if info.get("host") == socket.gethostname(): return not pid_alive(info["pid"])
+    # Another computer's process (the master is on a share): holders refresh the lock while they work
+    return age > LOCK_STALE_AFTER
+
+def acquire_master_lock(master_path, owner):
+    """Creates <master>.watch.lock for this process, taking over a lock whose process is gone.
+    Raises MasterLockedError while a live process holds it. Returns the lock path."""
+    lock_path = master_lock_path(master_path)
+    for _ in range(2):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            info = read_master_lock(lock_path)
+            if not lock_is_stale(lock_path, info):
+                holder = f"{info.get('owner', 'another process')} (pid {info['pid']} on {info.get('host', '?')})" if info else "another process"
+                raise MasterLockedError(f"{lock_path} is held by {holder}: that process is writing this master.") from None
+            try: os.remove(lock_path)
+            except FileNotFoundError: pass
+            continue
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "host": socket.gethostname(), "owner": owner,
+                       "since": datetime.now().isoformat(timespec="seconds")}, f)
+        return lock_path
+    raise MasterLockedError(f"{lock_path} was taken by another process while its stale lock was cleared.")
+
+def refresh_master_lock(master_path):
+    # Long-running holders touch the lock, so other computers can tell it from an abandoned one
+    try: os.utime(master_lock_path(master_path))
+    except OSError: pass
+
+def release_master_lock(master_path):
+    lock_path = master_lock_path(master_path)
+    info = read_master_lock(lock_path)
+    if info is not None and (info["pid"] != os.getpid() or info.get("host") != socket.gethostname()): return  # taken over meanwhile
+    try: os.remove(lock_path)
+    except OSError: pass
+
+class IngestionLedger:
+    """Applied (date, style, content-hash) records for one master, in a SQLite sidecar.
+
+    The ledger also remembers the master's size/mtime right after our own save.
+    If the master was edited, restored or replaced since then, the records are
+    no longer trustworthy and the ledger resets itself to force a full apply.
+    """
+    def __init__(self, master_path, read_only=False):
+        self.master_path = master_path
+        self.path = os.path.splitext(master_path)[0] + ".ledger.sqlite"
+        if read_only:
+            # Opened as it is, or not at all: a missing ledger reads as empty and is not created
+            uri = f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True) if os.path.exists(self.path) else None
+            return
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS applied (day TEXT, style TEXT, content_hash TEXT, applied_at TEXT, PRIMARY KEY (day, style))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def is_in_sync(self):
+        if self.conn is None: return False
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'master_stamp'").fetchone()
+        return row is not None and row[0] == file_stamp(self.master_path)
+
+    def reset(self):
+        self.conn.execute("DELETE FROM applied")
+        self.conn.execute("DELETE FROM meta")
+        self.conn.commit()
+
+    def applied_hashes(self):
+        if self.conn is None: return {}
+        return {(day, style): h for day, style, h in self.conn.execute("SELECT day, style, content_hash FROM applied")}
+
+    def record(self, records):
+        # records: {(day, style): content_hash}; call only after the master was saved
+        now = datetime.now().isoformat(timespec="seconds")
+        self.conn.executemany("INSERT OR REPLACE INTO applied VALUES (?, ?, ?, ?)",
+                              [(day, style, h, now) for (day, style), h in records.items()])
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('master_stamp', ?)", (file_stamp(self.master_path),))
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is not None: self.conn.close()
+
+class ArchiveIndex:
+    """Style -> archived months, kept in a JSON sidecar next to the master.
+
+    Written by the monthly roll-over, so a style's archived months can still be found
+    after its sheet moved out of the master into <master>.archive-YYYY-MM.xlsx.
+    """
+    VERSION = 1
+
+    def __init__(self, master_path):
+        self.path = self.sidecar_for(master_path)
+        self.styles = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION: self.styles = data.get("styles", {})
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def sidecar_for(master_path):
+        return os.path.splitext(master_path)[0] + ".archive.json"
+
+    def add(self, style, month, archive_path, first_day, last_day, days):
+        entries = self.styles.setdefault(SummaryRowIndex.key(style), [])
+        entries[:] = [e for e in entries if e["month"] != month]
+        entries.append({"style": style, "month": month, "archive": os.path.basename(archive_path),
+                        "first_day": first_day.isoformat(), "last_day": last_day.isoformat(), "days": days})
+        entries.sort(key=lambda e: e["month"])
+
+    def find(self, style):
+        return list(self.styles.get(SummaryRowIndex.key(style), []))
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "styles": self.styles}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+class ChangeSet:
+    """What an in-memory master update changed, cell by cell.
+
+    Built right after the master is loaded: it snapshots every cell (value and
+    format), and compare() lines the old rows up with the new ones through the
+    rows inserted since (insert_rows() records them). New style sheets are
+    compared with FORMATE, the sheet they were copied from. The report covers
+    values only; patch_cells() also counts format changes, for the partial save.
+    """
+    VERSION = 1
+
+    def __init__(self, wb):
+        self.wb = wb
+        self.states = {ws: self.cell_states(ws) for ws in wb.worksheets}
+        self.before = {ws: {k: v for k, (v, _) in states.items() if v is not None} for ws, states in self.states.items()}
+        self.inserts_seen = {ws: len(_ROW_INSERTS.get(ws, ())) for ws in wb.worksheets}
+        self.layout = self.sheet_layout(wb)
+        self.style_count = len(wb._cell_styles)  # cellXfs of the file; patched cells may only use these
+        self.template = next((cells for ws, cells in self.before.items() if ws.title == "FORMATE"), {})
+        self.sheets = []
+
+    @staticmethod
+    def cell_states(ws):
+        # Blank cells in the default format (_style None or all zeros) are the same as no cell at all
+        return {(c.row, c.column): (c.value, tuple(c._style or ())) for c in ws._cells.values()
+                if c.value is not None or (c._style is not None and any(c._style))}
+
+    @staticmethod
+    def cell_values(ws):
+        return {(c.row, c.column): c.value for c in ws._cells.values() if c.value is not None}
+
+    @staticmethod
+    def sheet_layout(wb):
+        # Everything besides cells that a partial save would have to leave as it is in the file
+        return [(ws, ws.title, [id(c) for c in ws._charts], len(ws._images), sorted(str(r) for r in ws.merged_cells.ranges))
+                for ws in wb.worksheets]
+
+    def patch_cells(self):
+        """Changed (row, column) cells per worksheet, for patch_package(). Raises
+        PatchUnsupported if the update changed more than cell contents and formats."""
+        for old, new in zip(self.layout, self.sheet_layout(self.wb)):
+            if old[:2] != new[:2]: raise PatchUnsupported("sheets were added, removed or renamed")
+            if old[2:4] != new[2:4]: raise PatchUnsupported(f"{new[1]}: charts or images replaced")
+            if old[4] != new[4]: raise PatchUnsupported(f"{new[1]}: merged cells changed")
+        if len(self.layout) != len(self.wb.worksheets): raise PatchUnsupported("sheets were added")
+        cells = {}
+        for ws, before in self.states.items():
+            if len(_ROW_INSERTS.get(ws, ())) != self.inserts_seen[ws]: raise PatchUnsupported(f"{ws.title}: rows inserted")
+            after = self.cell_states(ws)
+            changed = {key for key in before.keys() | after.keys() if before.get(key) != after.get(key)}
+            if changed: cells[ws] = changed
+        return cells
+
+    @staticmethod
+    def jsonable(value):
+        return value if value is None or isinstance(value, (int, float, str, bool)) else str(value)
+
+    @staticmethod
+    def sidecar_for(master_path, ext=".json"):
+        return os.path.splitext(master_path)[0] + ".changeset" + ext
+
+    @classmethod
+    def discard(cls, master_path):
+        for ext in (".json", ".txt"):
+            try: os.remove(cls.sidecar_for(master_path, ext))
+            except OSError: pass
+
+    def compare(self):
+        self.sheets = []
+        for ws in self.wb.worksheets:
+            new = ws not in self.before
+            old = self.template if new else self.before[ws]
+            inserts = _ROW_INSERTS.get(ws, [])[self.inserts_seen.get(ws, 0):]
+            for idx, amount in inserts:
+                old = {(r + amount if r >= idx else r, c): v for (r, c), v in old.items()}
+            after = self.cell_values(ws)
+            cells = [[f"{get_column_letter(c)}{r}", self.jsonable(old.get((r, c))), self.jsonable(after.get((r, c)))]
+                     for r, c in sorted(old.keys() | after.keys()) if old.get((r, c)) != after.get((r, c))]
+            if new or inserts or cells:
+                self.sheets.append({"sheet": ws.title, "new": new, "rows_inserted": [list(i) for i in inserts], "cells": cells})
+        return self.sheets
+
+    def digest(self):
+        return hashlib.sha1(json.dumps(self.sheets, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def row_ranges(rows):
+        spans = []
+        for r in sorted(set(rows)):
+            if spans and r == spans[-1][1] + 1: spans[-1][1] = r
+            else: spans.append([r, r])
+        return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in spans)
+
+    def inserted_rows(self, sheet):
+        return self.row_ranges(idx + k for idx, amount in sheet["rows_inserted"] for k in range(amount))
+
+    @staticmethod
+    def is_formula(value):
+        return isinstance(value, str) and value.startswith("=")
+
+    def sheet_line(self, sheet):
+        counts = {"filled": 0, "changed": 0, "formula(s) rewritten": 0, "cleared": 0}
+        for _, old, new in sheet["cells"]:
+            kind = ("filled" if old is None else "cleared" if new is None
+                    else "formula(s) rewritten" if self.is_formula(old) and self.is_formula(new) else "changed")
+            counts[kind] += 1
+        parts = [f"rows {self.row_ranges(coordinate_to_tuple(coord)[0] for coord, _, _ in sheet['cells'])}"] if sheet["cells"] else []
+        if sheet["rows_inserted"]: parts.append(f"+{sum(a for _, a in sheet['rows_inserted'])} row(s) inserted at "
+                                                + self.inserted_rows(sheet))
+        parts.append(", ".join(f"{n} {kind}" for kind, n in counts.items() if n) or "no cell changes")
+        return f"   {('+ ' if sheet['new'] else '') + sheet['sheet']:<28} " + " | ".join(parts)
+
+    def summary_lines(self):
+        new = [s["sheet"] for s in self.sheets if s["new"]]
+        lines = [f"   New style sheets ({len(new)}): {', '.join(new)}"] if new else []
+        lines += [self.sheet_line(s) for s in self.sheets]
+        lines.append(f"   Total: {len(self.sheets)} sheet(s), {sum(len(s['cells']) for s in self.sheets)} cell(s) changed")
+        return lines
+
+    def diff_lines(self):
+        def shown(value): return "(empty)" if value is None else repr(value) if isinstance(value, str) and not self.is_formula(value) else str(value)
+        lines = []
+        for sheet in self.sheets:
+            lines.append(f"{'+++ new sheet ' if sheet['new'] else '--- '}{sheet['sheet']}")
+            if sheet["rows_inserted"]: lines.append(f"    rows inserted at {self.inserted_rows(sheet)}")
+            lines += [f"    {coord:<8} {shown(old)}  ->  {shown(new)}" for coord, old, new in sheet["cells"]]
+        return lines
+
+    def save(self, master_path, **meta):
+        """Writes <master>.changeset.json (what apply_changeset() checks) and the .txt diff report."""
+        path, report = self.sidecar_for(master_path), self.sidecar_for(master_path, ".txt")
+        preview = {"version": self.VERSION, "created": datetime.now().isoformat(timespec="seconds"),
+                   "master": os.path.basename(master_path), "master_stamp": file_stamp(master_path),
+                   **meta, "digest": self.digest(), "sheets": self.sheets}
+        for target, write in ((path, lambda f: json.dump(preview, f, indent=1)),
+                              (report, lambda f: f.write("\n".join(self.summary_lines() + [""] + self.diff_lines()) + "\n"))):
+            with open(target + ".tmp", "w", encoding="utf-8") as f: write(f)
+            os.replace(target + ".tmp", target)
+        return path, report
+
+def shift_local_refs(formula, rows):
+    # Moves same-sheet references by `rows`; 'Sheet'!A1 references point elsewhere and stay put
+    tok = Tokenizer(formula)
+    for t in tok.items:
+        if t.type == Token.OPERAND and t.subtype == Token.RANGE and "!" not in t.value:
+            t.value = Translator.translate_range(t.value, rows, 0)
+    return tok.render()
+
+BLOCK_SKIP = object()  # write_block(): leave this cell of the block untouched
+
+@lru_cache(maxsize=1024)
+def interned_font(name, size, bold, italic, color="000000"):
+    # Fonts are immutable once assigned to a cell, so every write with the same
+    # attributes can share one instance instead of allocating (and validating) a new one
+    return Font(name=name, size=size, bold=bold, italic=italic, color=color)
+
+def chart_signature(chart):
+    # Everything a rebuild can change: chart kind, series ranges, anchor cell and size.
+    # Works for charts built this run (anchor is still "J16") and ones loaded from the file.
+    def ref(source): return source.f if source is not None else None
+    series = tuple((ref(s.val.numRef) if s.val else None,
+                    ref(s.cat.numRef or s.cat.strRef) if s.cat else None,
+                    ref(s.tx.strRef) if s.tx else None) for s in chart.series)
+    anchor = chart.anchor
+    if isinstance(anchor, str):
+        row, col = coordinate_to_tuple(anchor)
+        return type(chart).__name__, series, (col - 1, row - 1), (cm_to_EMU(chart.width), cm_to_EMU(chart.height))
+    ext = getattr(anchor, "ext", None)
+    return type(chart).__name__, series, (anchor._from.col, anchor._from.row), (ext.width, ext.height) if ext else None
+
+# Rows inserted into each worksheet, in order, so a ChangeSet can line old rows up with new ones
+_ROW_INSERTS = weakref.WeakKeyDictionary()
+
+def insert_rows(ws, idx, amount=1):
+    # All row insertion goes through here so the merge index never goes stale
+    ws.insert_rows(idx, amount=amount)
+    invalidate_merge_index(ws)
+    _ROW_INSERTS.setdefault(ws, []).append((idx, amount))
+
+class IEAutomationEngine:
+    """Extraction + master update pipeline. Subclasses override log() and set_progress()."""
+    def __init__(self, log_callback=None, progress_callback=None, date_detector=None, history_path=None, parallel_reads=True):
+        self.log_callback = log_callback
+        self.progress_callback = progress_callback
+        self.cancel_event = threading.Event()
+        self.date_detector = date_detector or DateDetector()
+        self.profiler = None  # RunProfiler while a profiled run is in progress
+        # History store file; opt-in: None means $IE_HISTORY_DB if set, "" turns it off
+        self.history_path = os.environ.get("IE_HISTORY_DB", "") if history_path is None else history_path
+        # Several supervisor files are read in a process pool, unless the caller already is one (ie_batch.py workers)
+        self.parallel_reads = parallel_reads
+        self.dirty_charts = {}  # sheet title -> (ws, header_row, col_map) whose chart is rebuilt at the end of the update
+        self.file_scopes = {}   # supervisor path -> months and styles it covered, from the last read
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        # Only called at safe points: nothing has been saved yet, so stopping is clean
+        if self.cancel_event.is_set(): raise RunCancelled("Run cancelled by user; master file not modified.")
+
+    def log(self, msg):
+        if self.log_callback: self.log_callback(msg)
+        else: print(f"{datetime.now().strftime('%H:%M:%S')} - {msg}")
+
+    def set_progress(self, value):
+        if self.progress_callback: self.progress_callback(value)
+
+    def profile_section(self, kind, name):
+        return self.profiler.section(kind, name) if self.profiler else nullcontext()
+
+    def clean_text_strict(self, text):
+        if not text: return ""
+        return str(text).replace("\n", "").replace(".", "").replace(" ", "").strip().lower()
+
+    def clean_header_loose(self, text):
+        if not text: return ""
+        return str(text).replace("\n", " ").strip().lower()
+
+    def clean_style_name(self, raw_style):
+        return clean_style_name(raw_style)
+
+    def merge_anchor(self, ws, row, col):
+        # Top-left cell of the merge covering (row, col), or the cell itself
+        merged_range = merge_index_for(ws).find(row, col)
+        if merged_range: return ws.cell(merged_range.min_row, merged_range.min_col)
+        return ws.cell(row, col)
+
+    def merge_end_col(self, ws, row, col):
+        merged_range = merge_index_for(ws).find(row, col)
+        return merged_range.max_col if merged_range else col
+
+    def set_cell_value(self, cell, value):
+        # V44: Merged Cell Safe Write + Return Target
+        ws = cell.parent
+        target = cell
+        
+        # Check if cell is part of a merge (indexed lookup)
+        merged_range = merge_index_for(ws).find(cell.row, cell.column)
+        if merged_range:
+            # Redirect to the top-left cell of the merge
+            target = ws.cell(merged_range.min_row, merged_range.min_col)
+        
+        # Write value to the SAFE target
+        target.value = value
+        if self.profiler: self.profiler.add("cells_written")
+        
+        # Apply font
+        if target.font:
+            cur = target.font
+            target.font = interned_font(cur.name, cur.size, cur.bold, cur.italic)
+            
+        return target 
+
+    def write_block(self, ws, top, left, rows, number_formats=None):
+        """Bulk set_cell_value() for a 2-D block of values/formulas anchored at (top, left).
+
+        Merges are resolved once for the whole rectangle, fonts come from
+        interned_font() and cells that already hold the same value and font are
+        not touched. BLOCK_SKIP leaves a cell alone; number_formats maps (i, j) block
+        offsets to a number format. Returns the number of cells written.
+        """
+        if not rows: return 0
+        width = max(len(row) for row in rows)
+        anchors = merge_index_for(ws).anchors_in(top, top + len(rows) - 1, left, left + width - 1)
+        number_formats = number_formats or {}
+        written = 0
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                if value is BLOCK_SKIP: continue
+                r, c = anchors.get((top + i, left + j), (top + i, left + j))
+                target = ws.cell(r, c)
+                cur = target.font
+                font = interned_font(cur.name, cur.size, cur.bold, cur.italic)
+                if type(target.value) is not type(value) or target.value != value or not (cur is font or cur == font):
+                    target.value = value
+                    target.font = font
+                    written += 1
+                fmt = number_formats.get((i, j))
+                if fmt and target.number_format != fmt: target.number_format = fmt
+        if self.profiler: self.profiler.add("cells_written", written)
+        return written
+
+    # ==========================================
+    # PIPELINE (Shared By GUI And CLI)
+    # ==========================================
+    def run(self, supervisor_paths, master_path, incremental=True, profile=False, values_export=False,
+            dry_run=False, expect_changeset=None, partial_save=False):
+        """Runs the whole update and returns a result dict; errors propagate as exceptions.
+
+        result['status'] is 'ok', 'no_data' (nothing with Today > 0),
+        'up_to_date' (ledger says every row is already in the master) or 'dry_run'.
+        dry_run=True does the whole update in memory and writes the change set
+        (<master>.changeset.json/.txt) instead of saving; apply_changeset() saves it.
+        A dry run leaves every other sidecar (ledger, layout cache, history) untouched.
+        partial_save=True patches only the changed rows into the master file when
+        the update changed nothing but cells (see ie_xlsxpatch), else saves in full.
+        profile=True (or a file path) records per-stage/per-style counters, logs a
+        summary table and writes a JSON trace (default <master>.trace.json).
+        values_export=True (or a file path) also writes a copy of the saved master
+        with every formula replaced by its computed value (<master>.values.xlsx).
+        """
+        self.cancel_event.clear()
+        self.log("--- STARTED (DRY RUN: master will not be saved) ---" if dry_run else "--- STARTED ---")
+        if dry_run: ChangeSet.discard(master_path)
+        self.set_progress(5)
+        self.profiler = RunProfiler() if profile else None
+        timer = StageTimer(self.profiler)
+        result = {"status": "ok", "master": master_path, "supervisor_files": list(supervisor_paths),
+                  "entries": 0, "pending": 0, "updated": 0, "timings": timer.timings}
+        if self.profiler:
+            result["trace"] = profile if isinstance(profile, str) else RunProfiler.trace_for(master_path)
+        
+        self.log(f"Step 1: Reading {len(supervisor_paths)} Supervisor File(s)...")
+        with timer.stage("Read Supervisor File(s)"):
+            extracted_data = self.read_supervisor_files(supervisor_paths)
+        result["file_scopes"] = self.file_scopes
+        
+        if not extracted_data:
+            self.log("CRITICAL: No valid production data found.")
+            result["status"] = "no_data"
+            self.finish_profile(result)
+            return result
+        
+        # --- Columnar Store: dates, per-style totals and validation are computed column-wise ---
+        store = EntryStore(extracted_data)
+        # --- V44 BUG FIX: Extract Valid Dates (Unique Set) ---
+        valid_dates = store.valid_dates()
+        
+        self.log(f"Collected {len(extracted_data)} valid data entries.")
+        self.log(f"Valid Production Dates Found: {len(valid_dates)}")
+        for check, count in store.validate().items():
+            self.log(f"WARNING: {count} entries with {check}.")
+        result["entries"] = len(extracted_data)
+
+        # --- History Store: every extracted entry is kept across months and masters ---
+        if self.history_path and not dry_run:
+            with timer.stage("History Store"):
+                result["history_added"] = self.record_history(extracted_data, supervisor_paths)
+        self.set_progress(20)
+
+        # --- Incremental Ledger: only new or changed (date, style) rows go to the master ---
+        ledger = None
+        try:
+            ledger_records = self.ledger_records(extracted_data)
+            pending_data = extracted_data
+            if incremental:
+                # A dry run only reads the ledger: no sidecar is created, reset or recorded
+                ledger = IngestionLedger(master_path, read_only=dry_run)
+                in_sync = ledger.is_in_sync()
+                if not in_sync:
+                    self.log("Ledger: master is new or was changed outside the tool, applying everything.")
+                    if not dry_run: ledger.reset()
+                pending_data = self.pending_entries(extracted_data, ledger.applied_hashes() if in_sync else {})
+                self.log(f"Ledger: {len(pending_data)} new/changed of {len(extracted_data)} entries.")
+                if not pending_data:
+                    self.set_progress(100)
+                    self.log_stage_timings(timer)
+                    result["status"] = "up_to_date"
+                    self.finish_profile(result)
+                    self.log("--- COMPLETED: Master already up to date, nothing saved ---")
+                    return result
+            result["pending"] = len(pending_data)
+
+            # --- Single Session: master is loaded once and saved once for all steps ---
+            self.check_cancelled()
+            self.log("Loading Master File...")
+            with timer.stage("Load Master File"):
+                session = MasterWorkbookSession(master_path)
+                changes = ChangeSet(session.wb) if dry_run or expect_changeset or partial_save else None
+            self.set_progress(30)
+        
+            self.log("Step 2: Updating Master File Sheets...")
+            with timer.stage("Update Master Sheets"):
+                written_keys = self.update_master_file(session, pending_data, store_layout=not dry_run)
+                updated_count = len(written_keys)
+        
+            self.set_progress(55)
+
+            # --- V44 FEATURE: Populate TOTAL SUMMARY Bottom Table ---
+            self.check_cancelled()
+            self.log("Step 3: Populating TOTAL SUMMARY Bottom Table...")
+            with timer.stage("TOTAL SUMMARY Bottom Table"):
+                self.populate_bottom_summary_table(session, store)
+
+            self.set_progress(70)
+        
+            # --- V35: Update Date Wise Summary (With Ghost Date Fix) ---
+            self.check_cancelled()
+            self.log("Step 4: Generating Date Wise Summary (Strict Date Filtering)...")
+            with timer.stage("Date Wise Summary"):
+                self.update_date_wise_summary(session, valid_dates)
+        
+            self.set_progress(85)
+
+            # --- Change Set: dry runs stop here; applying a preview checks it is still the same update ---
+            if dry_run or expect_changeset:
+                with timer.stage("Change Set"):
+                    changes.compare()
+                if dry_run:
+                    result["changeset"], result["report"] = changes.save(
+                        master_path, incremental=incremental,
+                        supervisor_files=[{"path": os.path.abspath(p), "sha1": file_sha1(p)} for p in supervisor_paths])
+                    result.update(status="dry_run", updated=updated_count, changes=changes.summary_lines())
+                    self.log("Change set (nothing saved):")
+                    for line in result["changes"]: self.log(line)
+                    self.log(f"Diff report: {result['report']}")
+                    self.set_progress(100)
+                    self.log_stage_timings(timer)
+                    self.finish_profile(result)
+                    self.log("--- COMPLETED: Dry run, master not saved ---")
+                    return result
+                if changes.digest() != expect_changeset:
+                    raise PreviewOutdated("This update no longer matches the previewed change set; run the preview again.")
+
+            self.check_cancelled()
+            self.log("Step 5: Saving Master File...")
+            with timer.stage("Save Master File"):
+                if not (partial_save and self.save_partial(session, changes)): session.save()
+            if ledger:
+                # Only rows that reached the master: a failed or skipped style stays pending for the next run
+                written = set(written_keys)
+                ledger.record({key: h for key, h in ledger_records.items() if key in written})
+
+            # --- Values Export: formulas computed here, for data_only readers and dashboards ---
+            if values_export:
+                export_path = values_export if isinstance(values_export, str) else MasterWorkbookSession.values_export_for(master_path)
+                self.log("Step 6: Writing values-only export...")
+                with timer.stage("Values Export"):
+                    computed, unsupported = materialise_values(session.wb)
+                    session.save(export_path)
+                self.log(f"Values export: {computed} formulas computed, {unsupported} left for Excel -> {export_path}")
+                result["values_export"] = export_path
+        
+            self.set_progress(100)
+            result["updated"] = updated_count
+            self.log_stage_timings(timer)
+            self.finish_profile(result)
+            self.log(f"--- COMPLETED: Updated {updated_count} Sheets & Summaries ---")
+            return result
+        finally:
+            # However the run ends (up to date, dry run, cancelled, failed), the ledger is closed
+            if ledger: ledger.close()
+
+    def history_batch(self, entries, supervisor_paths):
+        # (entries with cleaned styles, source label) as HistoryStore.append() takes them
+        return ([{**e, 'style': self.clean_style_name(e['style'])} for e in entries],
+                ", ".join(os.path.basename(p) for p in supervisor_paths))
+
+    def record_history(self, entries, supervisor_paths):
+        # The history is a side record: a locked or unwritable store must not stop the master update
+        try:
+            with HistoryStore(self.history_path) as store:
+                added = store.append(*self.history_batch(entries, supervisor_paths))
+            self.log(f"History: {added} new of {len(entries)} entries -> {self.history_path}")
+            return added
+        except (sqlite3.Error, OSError) as e:
+            self.log(f"WARNING: History store not updated ({e}).")
+            return 0
+
+    def save_partial(self, session, changes):
+        # Patches the changed rows into the master file; False means it needs a full save
+        try:
+            rewritten, copied = patch_package(session.wb, session.filepath, session.filepath, changes.patch_cells(), changes.style_count)
+        except PatchUnsupported as e:
+            self.log(f"Partial save not possible ({e}); saving the whole workbook.")
+            return False
+        self.log(f"Partial save: {rewritten} part(s) rewritten, {copied} copied unchanged.")
+        return True
+
+    def apply_changeset(self, master_path, profile=False, values_export=False, partial_save=False):
+        """Saves the update a dry run previewed for master_path.
+
+        The run is repeated from the same supervisor files and only saved if the
+        master and those files are unchanged and the update matches the preview
+        cell for cell; otherwise PreviewOutdated is raised and nothing is saved.
+        """
+        try:
+            with open(ChangeSet.sidecar_for(master_path), encoding="utf-8") as f:
+                preview = json.load(f)
+        except (OSError, ValueError):
+            raise FileNotFoundError(f"No previewed change set for {os.path.basename(master_path)}; run a dry run first.") from None
+        if preview.get("version") != ChangeSet.VERSION: raise PreviewOutdated("Change set was written by another version; run the preview again.")
+
+        stale = [] if file_stamp(master_path) == preview["master_stamp"] else [os.path.basename(master_path)]
+        for sup in preview["supervisor_files"]:
+            try: same = file_sha1(sup["path"]) == sup["sha1"]
+            except OSError: same = False
+            if not same: stale.append(os.path.basename(sup["path"]))
+        if stale: raise PreviewOutdated(f"Changed since the preview: {', '.join(stale)}. Run the preview again.")
+
+        self.log(f"Applying previewed change set ({len(preview['sheets'])} sheet(s))...")
+        result = self.run([sup["path"] for sup in preview["supervisor_files"]], master_path, incremental=preview["incremental"],
+                          profile=profile, values_export=values_export, expect_changeset=preview["digest"],
+                          partial_save=partial_save)
+        ChangeSet.discard(master_path)
+        return result
+
+    def ledger_key(self, entry):
+        return (entry['date'].date().isoformat(), self.clean_style_name(entry['style']).lower())
+
+    def ledger_hash(self, entry):
+        return content_hash(entry)
+
+    def ledger_records(self, entries):
+        # Last entry per (date, style) is what ends up in the master
+        return {self.ledger_key(e): self.ledger_hash(e) for e in entries}
+
+    def pending_entries(self, entries, applied):
+        latest = self.ledger_records(entries)
+        changed = {key for key, h in latest.items() if applied.get(key) != h}
+        return [e for e in entries if self.ledger_key(e) in changed]
+
+    def log_stage_timings(self, timer):
+        self.log("Stage Timings:")
+        for name, secs in timer.timings:
+            self.log(f"   {name:<28} {secs:8.2f}s")
+        self.log(f"   {'TOTAL':<28} {timer.total():8.2f}s")
+
+    def finish_profile(self, result):
+        if not self.profiler: return
+        for line in self.profiler.summary_lines(): self.log(line)
+        meta = {k: v for k, v in result.items() if k not in ("timings", "trace")}
+        try:
+            self.profiler.write_trace(result["trace"], **meta)
+            self.log(f"Profile trace written to {result['trace']}")
+        except OSError as e:
+            self.log(f"WARNING: Could not write profile trace ({e}).")
+        self.profiler = None
+
+    # ==========================================
+    # LOGIC: READ SUPERVISOR
+    # ==========================================
+    def find_date_in_row(self, row):
+        return self.date_detector.find_in_row(row)
+
+    def is_supervisor_header(self, row_strict):
+        return "styleno" in row_strict and "today" in row_strict
+
+    def map_supervisor_columns(self, row_loose, row_strict):
+        col = {}
+        for idx, val in enumerate(row_loose):
+            v_strict = row_strict[idx]
+            if "style no" in val: col['style'] = idx
+            elif "today" in val: col['today'] = idx 
+            elif "buyer" in val: col['buyer'] = idx
+            elif "gg" == v_strict: col['gg'] = idx
+            elif "order" in val and "qty" in val: col['order_qty'] = idx
+            elif "con" in val and "qty" in val: col['con_qty'] = idx
+            elif val == "m/c" or val == "mc": col['mc'] = idx
+            elif "working" in val and "min" in val: col['min'] = idx
+            elif "smv" in val: col['smv'] = idx
+            elif "aver" in val and "min" in val: col['aver_min'] = idx
+        return col
+
+    def build_supervisor_entry(self, d_row, col, closest_date):
+        # Returns None for rows without a style or without 'Today' > 0
+        try:
+            s_name = d_row[col['style']]
+            prod = d_row[col['today']]
+            valid = False
+            if prod is not None:
+                try:
+                    if float(prod) > 0: valid = True
+                except: pass
+            
+            if valid and s_name:
+                mc_val = d_row[col['mc']] if 'mc' in col else 0
+                smv_val = d_row[col['smv']] if 'smv' in col else 0
+                aver_min = 0
+                if 'aver_min' in col: aver_min = d_row[col['aver_min']]
+                elif 'min' in col: aver_min = d_row[col['min']]
+                
+                try: mc = float(mc_val); out = float(prod); smv = float(smv_val); a_min = float(aver_min)
+                except: mc=0; out=0; smv=0; a_min=0
+
+                return {
+                    "date": closest_date,
+                    "style": str(s_name).strip(),
+                    "output": out,
+                    "buyer": d_row[col.get('buyer')] if 'buyer' in col else "",
+                    "gg": d_row[col.get('gg')] if 'gg' in col else "",
+                    "order_qty": d_row[col.get('order_qty')] if 'order_qty' in col else "",
+                    "con_qty": d_row[col.get('con_qty')] if 'con_qty' in col else "",
+                    "mc": mc, 
+                    "aver_min": a_min, 
+                    "smv": smv
+                }
+        except: pass
+        return None
+
+    def read_supervisor_file(self, filepath, streaming=True):
+        if streaming: return self.read_supervisor_file_streaming(filepath)
+        return self.read_supervisor_file_full(filepath)
+
+    def read_supervisor_file_full(self, filepath):
+        wb = openpyxl.load_workbook(filepath, data_only=True)
+        all_data = []
+        for sheet in wb.worksheets:
+            rows = list(sheet.iter_rows(values_only=True))
+            row_date_map = {}
+            for r_idx, row in enumerate(rows):
+                found_date = self.find_date_in_row(row)
+                if found_date: row_date_map[r_idx] = found_date
+            
+            for r_idx, row in enumerate(rows):
+                if not row: continue
+                row_strict = [self.clean_text_strict(c) for c in row]
+                if self.is_supervisor_header(row_strict):
+                    closest_date = None
+                    for search_back in range(r_idx, max(-1, r_idx-50), -1):
+                        if search_back in row_date_map:
+                            closest_date = row_date_map[search_back]
+                            break
+                    if not closest_date: closest_date = self.find_date_in_row(row)
+                    if not closest_date: continue
+
+                    row_loose = [self.clean_header_loose(c) for c in row]
+                    col = self.map_supervisor_columns(row_loose, row_strict)
+
+                    j = r_idx + 1
+                    while j < len(rows):
+                        d_row = rows[j]
+                        j += 1
+                        if not any(d_row): break
+                        if d_row[0] and "total" in str(d_row[0]).lower(): break
+                        if j-1 in row_date_map and j-1 > r_idx + 1: break 
+                        entry = self.build_supervisor_entry(d_row, col, closest_date)
+                        if entry: all_data.append(entry)
+        return all_data
+
+    # ==========================================
+    # MULTI-FILE READ (One Supervisor File Per Line/Floor)
+    # ==========================================
+    def read_supervisor_files(self, filepaths):
+        if len(filepaths) == 1:
+            entries = self.read_supervisor_file(filepaths[0])
+            self.file_scopes = {filepaths[0]: self.entry_scope(entries)}
+            return entries
+
+        per_file = {}
+        if self.parallel_reads:
+            try:
+                workers = min(len(filepaths), os.cpu_count() or 1)
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    configs = [self.date_detector.config()] * len(filepaths)
+                    for path, entries in pool.map(_read_supervisor_worker, filepaths, configs):
+                        per_file[path] = entries
+                        self.log(f"   Parsed {os.path.basename(path)}: {len(entries)} entries")
+            except Exception as pool_e:
+                # Pool can't start (frozen build, locked-down PC): parse one by one instead
+                self.log(f"Parallel read unavailable ({pool_e}); reading files one by one...")
+        for path in filepaths:
+            if path in per_file: continue
+            per_file[path] = self.read_supervisor_file(path)
+            self.log(f"   Parsed {os.path.basename(path)}: {len(per_file[path])} entries")
+
+        self.file_scopes = {p: self.entry_scope(per_file[p]) for p in filepaths}
+        return self.merge_supervisor_entries([per_file[p] for p in filepaths])
+
+    def entry_scope(self, entries):
+        # The months and styles one file covers; ie_watch.py keeps them per applied report
+        return {"months": sorted({e['date'].strftime("%Y-%m") for e in entries}),
+                "styles": sorted({self.clean_style_name(e['style']) for e in entries})}
+
+    def merge_supervisor_entries(self, entry_lists):
+        # Dedupe on (date, cleaned style); later files win, same as re-running the tool file by file
+        merged = {}
+        conflicts = 0
+        for entries in entry_lists:
+            for entry in entries:
+                key = (entry['date'].date(), self.clean_style_name(entry['style']).lower())
+                prev = merged.pop(key, None)
+                if prev is not None and prev['output'] != entry['output']: conflicts += 1
+                merged[key] = entry
+        total = sum(len(e) for e in entry_lists)
+        if total != len(merged):
+            self.log(f"Merged {total} entries into {len(merged)} unique (date, style) rows ({conflicts} with differing output, last file kept).")
+        return list(merged.values())
+
+    # ==========================================
+    # STREAMING READ (Read-Only, Row-by-Row State Machine)
+    # ==========================================
+    def read_supervisor_file_streaming(self, filepath):
+        """Same entries as read_supervisor_file_full, parsed in one forward pass.
+
+        Rows come straight from a read_only workbook and are never materialised,
+        so memory stays flat however many daily sheets the book has. Each header
+        row opens a table block; following rows are fed to every open block until
+        that block hits a blank row, a 'Total' row or a new date row. Blocks are
+        flushed in the order they opened, which keeps the output order identical
+        to the full parser even when tables overlap.
+        """
+        wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
+        all_data = []
+        try:
+            for sheet in wb.worksheets:
+                # Stored dimensions are often wrong in exported reports; read true row widths
+                sheet.reset_dimensions()
+                rows = sheet.iter_rows(values_only=True)
+                if self.profiler: rows = self.profiler.counting(rows)
+                all_data.extend(self._stream_supervisor_sheet(rows))
+        finally:
+            wb.close()
+        return all_data
+
+    def _stream_supervisor_sheet(self, rows):
+        blocks = []  # table blocks in the order their header rows were seen
+        last_date_idx = None; last_date = None
+
+        for r_idx, row in enumerate(rows):
+            row_date = self.find_date_in_row(row)
+
+            # 1. Feed the row to every block opened above it
+            for block in blocks:
+                if not block['open']: continue
+                if not any(row) or (row[0] and "total" in str(row[0]).lower()) or (row_date and r_idx > block['header'] + 1):
+                    block['open'] = False
+                    continue
+                d_row = row
+                if len(d_row) < block['width']: d_row = tuple(d_row) + (None,) * (block['width'] - len(d_row))
+                entry = self.build_supervisor_entry(d_row, block['col'], block['date'])
+                if entry: block['entries'].append(entry)
+
+            if row_date: last_date_idx = r_idx; last_date = row_date
+
+            # 2. Does this row open a new table block?
+            if row:
+                row_strict = [self.clean_text_strict(c) for c in row]
+                if self.is_supervisor_header(row_strict) and last_date_idx is not None and r_idx - last_date_idx < 50:
+                    row_loose = [self.clean_header_loose(c) for c in row]
+                    col = self.map_supervisor_columns(row_loose, row_strict)
+                    width = max(col.values()) + 1 if col else 0
+                    blocks.append({'header': r_idx, 'col': col, 'date': last_date, 'width': width, 'entries': [], 'open': True})
+
+            # 3. Flush finished blocks from the front
+            while blocks and not blocks[0]['open']:
+                yield from blocks.pop(0)['entries']
+
+        for block in blocks:
+            yield from block['entries']
+
+    # ==========================================
+    # STEP 2: WRITE MASTER (V42: DYNAMIC ROWS & BUG FIX)
+    # ==========================================
+    def update_master_file(self, session, data, batched=True, store_layout=True):
+        # Returns the ledger keys of the rows actually written, one per row; store_layout=False
+        # (dry runs) leaves the layout.json cache as it is
+        wb = session.wb
+        if "FORMATE" not in wb.sheetnames:
+            self.log("ERROR: 'FORMATE' sheet missing!")
+            return []
+
+        data.sort(key=lambda x: x['date'])
+        self.dirty_charts = {}
+        try:
+            if batched: return self.update_master_batched(wb, data, self.get_template_layout(session, store_layout))
+            return self.update_master_per_entry(wb, data)
+        finally:
+            self.build_dirty_charts()
+
+    # ==========================================
+    # FORMATE LAYOUT CACHE
+    # ==========================================
+    def get_template_layout(self, session, store=True):
+        fmt = session.wb["FORMATE"]
+        key = TemplateLayoutCache.fingerprint(fmt)
+        cache = TemplateLayoutCache(TemplateLayoutCache.sidecar_for(session.filepath))
+        layout = cache.get(key)
+        if layout: return layout
+
+        layout = self.discover_template_layout(fmt)
+        if layout and store:
+            try: cache.put(key, layout)
+            except OSError as e: self.log(f"WARNING: Could not write layout cache ({e})")
+            self.log(f"FORMATE layout learned (header row {layout['header_row']}).")
+        return layout
+
+    def discover_template_layout(self, fmt):
+        header_row = self.find_table_header(fmt)
+        if not header_row: return None
+        return {
+            "fill_targets": self.find_fill_targets(fmt),
+            "header_row": header_row,
+            "header_texts": [self.clean_text_strict(fmt.cell(header_row, c).value) for c in range(1, 20)],
+            "col_map": self.map_table_columns(fmt, header_row),
+            "summary_cells": self.find_summary_cells(fmt),
+            "smv_cell": "K11",
+            "gauge_cell": "H11",
+        }
+
+    def layout_matches(self, ws, layout):
+        # Cheap spot-check that a style sheet still has the cached template shape
+        hr = layout['header_row']
+        if [self.clean_text_strict(ws.cell(hr, c).value) for c in range(1, 20)] != layout['header_texts']: return False
+        for key, label, _ in layout['fill_targets']:
+            if self.clean_text_strict(ws[label].value) != key: return False
+        for field, (label, _) in layout['summary_cells'].items():
+            if self.classify_summary_label(self.clean_text_strict(ws[label].value)) != field: return False
+        return True
+
+    def safe_sheet_name(self, clean_style):
+        return re.sub(r'[\\/*?:\[\]]', '_', clean_style)[:31]
+
+    def get_style_sheet(self, wb, clean_style):
+        # Returns (ws, safe_style, created); new sheets are fresh FORMATE copies
+        safe_style = self.safe_sheet_name(clean_style)
+        if safe_style in wb.sheetnames: 
+            return wb[safe_style], safe_style, False
+        ws = wb.copy_worksheet(wb["FORMATE"])
+        ws.title = safe_style
+        return ws, safe_style, True
+
+    def place_entry_row(self, ws, safe_style, date_index, col_map, entry):
+        # Finds (or makes) the day row for this entry and stamps Day/Date on a fresh row
+        target_row, action = date_index.lookup(entry['date'])
+        if action == 'insert':
+            self.log(f"Expanding rows for {safe_style}")
+            insert_rows(ws, target_row)
+            date_index.rows_inserted(target_row)
+        
+        if target_row:
+            if ws.cell(target_row, col_map['Date']).value is None:
+                last_day_val = 0
+                prev_day = ws.cell(target_row-1, col_map['Day']).value
+                if isinstance(prev_day, int): last_day_val = prev_day
+                self.set_cell_value(ws.cell(target_row, col_map['Day']), last_day_val + 1)
+                self.set_cell_value(ws.cell(target_row, col_map['Date']), entry['date'].strftime("%d-%b"))
+                date_index.row_filled(target_row)
+        return target_row
+
+    def write_entry_row(self, ws, row, col_map, entry):
+        self.set_cell_value(ws.cell(row, col_map['Output']), entry['output'])
+        if 'MC' in col_map: self.set_cell_value(ws.cell(row, col_map['MC']), entry['mc'])
+
+        c_op = get_column_letter(col_map['MC']) if 'MC' in col_map else 'C'
+        c_out = get_column_letter(col_map['Output'])
+        c_min = get_column_letter(col_map['Min']) if 'Min' in col_map else 'F'
+        aver_min = entry['aver_min']
+
+        if 'AvgProd' in col_map: self.set_cell_value(ws.cell(row, col_map['AvgProd']), f"={c_out}{row}/{c_op}{row}")
+        if 'Min' in col_map: self.set_cell_value(ws.cell(row, col_map['Min']), f"={c_op}{row}*{aver_min}")
+        if 'Eff' in col_map:
+            f_eff = f"={c_out}{row}*$K$11/{c_min}{row}"
+            target = self.set_cell_value(ws.cell(row, col_map['Eff']), f_eff)
+            target.number_format = '0%'
+        if 'Time' in col_map: self.set_cell_value(ws.cell(row, col_map['Time']), f"=({c_min}{row}/{c_op}{row})/60")
+
+    def update_master_per_entry(self, wb, data):
+        # Original engine: every sheet-level step runs once per entry
+        written_keys = []
+        date_indexes = {}  # safe_style -> StyleDateIndex, built once per sheet for this run
+        addr_maps = {}     # safe_style -> TOTAL SUMMARY source cells, found once per sheet for this run
+        summary_index = self.summary_row_index(wb)
+
+        for entry in data:
+            self.check_cancelled()
+            ws = None # Initialized
+            try:
+                clean_style = self.clean_style_name(entry['style'])
+                entry['style'] = clean_style
+                ws, safe_style, created = self.get_style_sheet(wb, clean_style)
+                if created: self.force_fill_headers(ws, entry)
+
+                self.force_fill_headers(ws, entry)
+                if entry['smv']: self.set_cell_value(ws['K11'], entry['smv'])
+
+                header_row_idx = self.find_table_header(ws)
+                if not header_row_idx: 
+                    continue
+
+                col_map = self.map_table_columns(ws, header_row_idx)
+                
+                # --- Dynamic Row Logic (Indexed Date -> Row Lookup) ---
+                date_index = date_indexes.get(safe_style)
+                if date_index is None or date_index.header_row != header_row_idx or date_index.date_col != col_map['Date']:
+                    date_index = date_indexes[safe_style] = StyleDateIndex(ws, header_row_idx, col_map['Date'])
+
+                target_row = self.place_entry_row(ws, safe_style, date_index, col_map, entry)
+                if target_row:
+                    self.write_entry_row(ws, target_row, col_map, entry)
+                    written_keys.append(self.ledger_key(entry))
+                    self.update_footer_formulas(ws, header_row_idx, col_map)
+                    self.mark_chart_dirty(ws, header_row_idx, col_map)
+                
+                # Update top summary (Existing feature)
+                if safe_style not in addr_maps:
+                    addr_maps[safe_style] = {field: target for field, (_, target) in self.find_summary_cells(ws).items()}
+                self.update_total_summary(wb, ws, safe_style, header_row_idx, col_map, addr_maps[safe_style], summary_index)
+
+            except Exception as inner_e:
+                self.log(f"Error processing style {entry['style']}: {str(inner_e)}")
+                # traceback.print_exc()
+                continue
+
+        return written_keys
+
+    def summary_row_index(self, wb):
+        # One TOTAL SUMMARY index per run, shared by every style sheet update
+        return SummaryRowIndex(wb["TOTAL SUMMARY"]) if "TOTAL SUMMARY" in wb.sheetnames else None
+
+    # ==========================================
+    # BATCHED WRITE (Group By Style Sheet)
+    # ==========================================
+    def update_master_batched(self, wb, data, layout=None):
+        # Same result as the per-entry engine, but header fill, table discovery, footer,
+        # chart and TOTAL SUMMARY link run once per style sheet instead of once per day.
+        groups = {}  # safe_style -> [entries], in order of first appearance (data is date-sorted)
+        for entry in data:
+            entry['style'] = self.clean_style_name(entry['style'])
+            safe_style = self.safe_sheet_name(entry['style'])
+            groups.setdefault(safe_style, []).append(entry)
+
+        written_keys = []
+        summary_index = self.summary_row_index(wb)
+        for safe_style, entries in groups.items():
+            self.check_cancelled()
+            try:
+                with self.profile_section("style", safe_style):
+                    # Last entry wins for header fields, exactly like repeated per-entry fills
+                    last = entries[-1]
+                    ws, safe_style, created = self.get_style_sheet(wb, last['style'])
+                    sheet_layout = layout if layout and (created or self.layout_matches(ws, layout)) else None
+
+                    smv = next((e['smv'] for e in reversed(entries) if e['smv']), None)
+                    if sheet_layout:
+                        self.force_fill_headers(ws, last, sheet_layout['fill_targets'])
+                        if smv: self.set_cell_value(ws[sheet_layout['smv_cell']], smv)
+                        header_row_idx = sheet_layout['header_row']
+                        col_map = dict(sheet_layout['col_map'])
+                        addr_map = {field: target for field, (_, target) in sheet_layout['summary_cells'].items()}
+                    else:
+                        self.force_fill_headers(ws, last)
+                        if smv: self.set_cell_value(ws['K11'], smv)
+                        header_row_idx = self.find_table_header(ws)
+                        if not header_row_idx: 
+                            continue
+                        col_map = self.map_table_columns(ws, header_row_idx)
+                        addr_map = None
+                    date_index = StyleDateIndex(ws, header_row_idx, col_map['Date'])
+
+                    written = []
+                    for entry in entries:
+                        try:
+                            target_row = self.place_entry_row(ws, safe_style, date_index, col_map, entry)
+                            if target_row:
+                                self.write_entry_row(ws, target_row, col_map, entry)
+                                written.append(self.ledger_key(entry))
+                        except Exception as row_e:
+                            self.log(f"Error processing style {entry['style']} ({entry['date']:%d-%b}): {str(row_e)}")
+                    if self.profiler: self.profiler.add("rows_scanned", date_index.rows_scanned)
+
+                    written_keys.extend(written)
+                    if written:
+                        self.update_footer_formulas(ws, header_row_idx, col_map)
+                        self.mark_chart_dirty(ws, header_row_idx, col_map)
+
+                    self.update_total_summary(wb, ws, safe_style, header_row_idx, col_map, addr_map, summary_index)
+
+            except Exception as inner_e:
+                self.log(f"Error processing style {safe_style}: {str(inner_e)}")
+                continue
+
+        return written_keys
+
+    # ==========================================
+    # V44 FEATURE: POPULATE BOTTOM TABLE (DYNAMIC)
+    # ==========================================
+    def populate_bottom_summary_table(self, session, data):
+        # 1. Aggregate Data by Style (columnar; accepts a plain entry list too)
+        store = data if isinstance(data, EntryStore) else EntryStore(data)
+        summary = store.summary_by_style()
+
+        wb = session.wb
+        if "TOTAL SUMMARY" not in wb.sheetnames:
+            self.log("WARNING: 'TOTAL SUMMARY' sheet not found. Skipping bottom table.")
+            return
+
+        ws = wb["TOTAL SUMMARY"]
+        start_row = 35  
+        end_template_row = 49
+        
+        num_styles = len(summary)
+        existing_capacity = end_template_row - start_row + 1
+        
+        # --- Dynamic Expansion Logic ---
+        if num_styles > existing_capacity:
+            rows_to_add = num_styles - existing_capacity
+            self.log(f"Expanding TOTAL SUMMARY table by {rows_to_add} rows...")
+            # Insert rows at the end of the template block
+            insert_rows(ws, end_template_row, amount=rows_to_add)
+            
+            # Copy Styles for new rows from the last valid template row
+            source_row_idx = end_template_row - 1
+            for i in range(rows_to_add):
+                target_row_idx = end_template_row + i
+                for col in range(1, 15): # Columns A to N
+                    source_cell = ws.cell(source_row_idx, col)
+                    target_cell = ws.cell(target_row_idx, col)
+                    # Safe copy of styles
+                    if source_cell.has_style:
+                        target_cell.font = copy(source_cell.font)
+                        target_cell.border = copy(source_cell.border)
+                        target_cell.fill = copy(source_cell.fill)
+                        target_cell.number_format = source_cell.number_format
+                        target_cell.alignment = copy(source_cell.alignment)
+
+        # 4. Write Aggregated Data
+        current_row = start_row
+        sl_counter = 1
+
+        for d in summary:
+            
+            # Col A: SL
+            self.set_cell_value(ws.cell(current_row, 1), sl_counter)
+            # Col B: Buyer
+            self.set_cell_value(ws.cell(current_row, 2), d['buyer'])
+            # Col C: Style
+            self.set_cell_value(ws.cell(current_row, 3), d['style'])
+            # Col D: GG
+            self.set_cell_value(ws.cell(current_row, 4), d['gg'])
+            # Col E: Order Qty
+            self.set_cell_value(ws.cell(current_row, 5), d['order_qty'])
+            # Col F: Linking Qty
+            self.set_cell_value(ws.cell(current_row, 6), d['con_qty'])
+            
+            # Col G: Balance = E - F
+            self.set_cell_value(ws.cell(current_row, 7), f"=E{current_row}-F{current_row}")
+            
+            # Col H: SMV
+            self.set_cell_value(ws.cell(current_row, 8), d['smv'])
+            
+            # Col I: Output
+            self.set_cell_value(ws.cell(current_row, 9), d['total_output'])
+            
+            # Col J: W.min
+            self.set_cell_value(ws.cell(current_row, 10), d['total_wmin'])
+            
+            # Col K: P.min = Output * SMV (Formula for consistency)
+            self.set_cell_value(ws.cell(current_row, 11), f"=I{current_row}*H{current_row}")
+            
+            # Col L: Working Day
+            self.set_cell_value(ws.cell(current_row, 12), d['working_days'])
+            
+            # Col M: Eff% = P.min / W.min
+            eff_formula = f"=IFERROR(K{current_row}/J{current_row}, 0)"
+            target = self.set_cell_value(ws.cell(current_row, 13), eff_formula)
+            target.number_format = '0%'
+            
+            current_row += 1
+            sl_counter += 1
+
+        self.log(f"Success: Populated TOTAL SUMMARY bottom table (Rows {start_row}-{current_row-1})")
+
+    # ==========================================
+    # V35: DATE WISE SUMMARY ENGINE (V44 FIX)
+    # ==========================================
+    NON_STYLE_SHEETS = ("FORMATE", "SUMMARY GRAPH", "TOTAL SUMMARY", "OVERALL SUMMARY", "SIDE +OTHERS SUMMARY", "BODY SUMMARY", "linking.Plan")
+
+    def style_sheet_names(self, wb):
+        return [s for s in wb.sheetnames if s not in self.NON_STYLE_SHEETS and not s.lower().startswith("date wise")]
+
+    def update_date_wise_summary(self, session, valid_dates=None):
+        if valid_dates is None: valid_dates = set()
+        
+        # Create a set of valid DAYS (integers 1-31) to handle month mismatches
+        # This ensures that if the sheet is named "DEC-2025" but data is "JAN-2026",
+        # we still populate the rows corresponding to the DAYS (1st, 2nd, etc.) present in data.
+        valid_days = {d.day for d in valid_dates}
+
+        wb = session.wb
+        
+        summary_sheet = None
+        sheet_name = ""
+        for s in wb.sheetnames:
+            if s.lower().startswith("date wise summary"):
+                summary_sheet = wb[s]
+                sheet_name = s
+                break
+        
+        if not summary_sheet: return
+
+        try:
+            parts = sheet_name.split(' ')
+            date_part = parts[-1] 
+            dt_obj = datetime.strptime(date_part, "%b-%Y")
+            # We use the sheet's month for iterating days, usually 30 or 31
+            month = dt_obj.month
+            year = dt_obj.year
+            days_in_month = calendar.monthrange(year, month)[1]
+        except:
+            now = datetime.now()
+            month = now.month
+            year = now.year
+            dt_obj = datetime(year, month, 1)
+            days_in_month = 31
+
+        styles = self.style_sheet_names(wb)
+
+        col_idx = 2
+        start_data_row = 7
+        end_data_row = start_data_row + days_in_month - 1
+        total_r = end_data_row + 1
+        days = range(1, days_in_month + 1)
+        written = 0
+
+        # Date labels (column A), only where missing
+        if styles:
+            labels = [[f"{day:02d}-{dt_obj.strftime('%b')}" if summary_sheet.cell(start_data_row + day - 1, 1).value is None else BLOCK_SKIP] for day in days]
+            written += self.write_block(summary_sheet, start_data_row, 1, labels)
+
+        # One 3-column block per style: rows 4 (name) .. pct_r (efficiency)
+        for style in styles:
+            ws_style = wb[style]
+            gauge_cell = ws_style['H11'].value 
+            try: gauge = float(gauge_cell)
+            except: gauge = 0
+            
+            category = "Fine" if gauge > 10 else "Coarse"
+            
+            # --- V44 FIX: Check Valid Days (Not Strict Dates) ---
+            quoted_style = f"'{style}'"
+            style_row_offset = 16 
+            acv_col, wmin_col, pmin_col = (get_column_letter(col_idx + i) for i in range(3))
+
+            block = [[style, BLOCK_SKIP, BLOCK_SKIP], [category] * 3, ["Acv", "W.Min", "Prod.Min"]]
+            for day in days:
+                r_sum = start_data_row + day - 1
+                r_style = style_row_offset + day
+                # FLEXIBLE CHECK: If day number exists in supervisor data, we populate.
+                # GHOST DATE FIX: If day is NOT in supervisor data, force 0
+                if day in valid_days:
+                    block.append([f"={quoted_style}!D{r_style}", f"={quoted_style}!F{r_style}", f"={acv_col}{r_sum}*{quoted_style}!K$11"])
+                else:
+                    block.append([0, 0, 0])
+            block.append([f"=SUM({c}{start_data_row}:{c}{end_data_row})" for c in (acv_col, wmin_col, pmin_col)])
+            block.append([f"={pmin_col}{total_r}/{wmin_col}{total_r}", BLOCK_SKIP, BLOCK_SKIP])
+            written += self.write_block(summary_sheet, 4, col_idx, block, {(len(block) - 1, 0): '0%'})
+            col_idx += 3
+
+        last_style_col_idx = col_idx - 1
+        last_col_let = get_column_letter(last_style_col_idx)
+        
+        sum_start_col = col_idx + 1
+        range_cat = f"$B$5:${last_col_let}$5"
+        range_metric = f"$B$6:${last_col_let}$6"
+        
+        def write_summary_block(start_col, title, gauge_filter):
+            c_w = get_column_letter(start_col+1); c_p = get_column_letter(start_col+2)
+            block = [[title] + [BLOCK_SKIP] * 3, [BLOCK_SKIP] * 4, ["Total Production", "W.Min", "Prod.Min", "Eff%"]]
+            formats = {}
+            for day in days:
+                r = start_data_row + day - 1
+                row_range = f"$B{r}:${last_col_let}{r}"
+                # NOTE: We don't need to filter here because the source cells (Fine/Coarse style cols) are already 0 if date invalid
+                block.append([f'=SUMIFS({row_range},{range_cat},"{gauge_filter}",{range_metric},"{metric}")' for metric in ("Acv", "W.Min", "Prod.Min")]
+                             + [f"=IFERROR({c_p}{r}/{c_w}{r},0)"])
+                formats[(len(block) - 1, 3)] = '0%'
+            block.append([f"=SUM({get_column_letter(start_col + i)}{start_data_row}:{get_column_letter(start_col + i)}{end_data_row})" for i in range(3)]
+                         + [f"=IFERROR({c_p}{total_r}/{c_w}{total_r},0)"])
+            formats[(len(block) - 1, 3)] = '0%'
+            return self.write_block(summary_sheet, 4, start_col, block, formats)
+
+        fine_start = sum_start_col
+        coarse_start = sum_start_col + 4
+        gt_col = coarse_start + 4
+        written += write_summary_block(fine_start, "Fine Gauge", "Fine")
+        written += write_summary_block(coarse_start, "Coarse Gauge", "Coarse")
+
+        c_w = get_column_letter(gt_col+1); c_mp = get_column_letter(gt_col+3); c_p = get_column_letter(gt_col+2)
+        block = [["Total"] + [BLOCK_SKIP] * 5, [BLOCK_SKIP] * 6, ["Total Production", "W.Min", "Prod.Min", "DAILY MAN POWER", "Average Minutes", "Eff%"]]
+        formats = {}
+        for day in days:
+            r = start_data_row + day - 1
+            # --- V44 FINAL FIX: Validated Total Summary Formula Injection ---
+            if day in valid_days:
+                block.append([f"={get_column_letter(fine_start + i)}{r}+{get_column_letter(coarse_start + i)}{r}" for i in range(3)]
+                             + [BLOCK_SKIP, f"=IFERROR({c_w}{r}/{c_mp}{r},0)", f"=IFERROR({c_p}{r}/{c_w}{r},0)"])
+                formats[(len(block) - 1, 5)] = '0%'
+            else:
+                # --- CLEANUP: Clear calculated columns for invalid/ghost dates ---
+                # Exclude Man Power (gt_col+3) in case it is manual input
+                block.append([0, 0, 0, BLOCK_SKIP, 0, 0])
+        block.append([f"=SUM({get_column_letter(gt_col + i)}{start_data_row}:{get_column_letter(gt_col + i)}{end_data_row})" for i in range(4)]
+                     + [f"=IFERROR({c_w}{total_r}/{c_mp}{total_r},0)", f"=IFERROR({c_p}{total_r}/{c_w}{total_r},0)"])
+        formats[(len(block) - 1, 5)] = '0%'
+        written += self.write_block(summary_sheet, 4, gt_col, block, formats)
+        self.log(f"Date Wise Summary: {written} cells changed")
+
+        # 6. Chart (KP4:KY25)
+        eff_col_idx = gt_col + 5
+        date_col_idx = 1
+        chart = BarChart(); chart.type = "col"; chart.style = 10; chart.title = "Total Efficiency %"; chart.y_axis.title = "Efficiency %"; chart.x_axis.title = "Date"; chart.legend = None
+        data = Reference(summary_sheet, min_col=eff_col_idx, min_row=start_data_row-1, max_row=end_data_row)
+        cats = Reference(summary_sheet, min_col=date_col_idx, min_row=start_data_row, max_row=end_data_row)
+        chart.add_data(data, titles_from_data=True); chart.set_categories(cats)
+        chart.height = 13; chart.width = 20
+        if not self.place_chart(summary_sheet, chart, "KP4"): self.log("Date Wise Summary: chart unchanged")
+
+    # ... Helper Methods ...
+    HEADER_FILL_KEYS = ("style", "customer", "gauge", "orderqty", "consumtionqty")
+
+    def find_fill_targets(self, ws):
+        # [label key, label cell, value cell] for every header label, in scan order
+        targets = []
+        for r in range(1, 65):
+            for c in range(1, 15):
+                cell = ws.cell(r, c)
+                if not cell.value: continue
+                val = self.clean_text_strict(cell.value)
+                if val in self.HEADER_FILL_KEYS:
+                    end_col = self.merge_end_col(ws, r, c)
+                    final_target = self.merge_anchor(ws, r, end_col + 1)
+                    targets.append([val, cell.coordinate, final_target.coordinate])
+        return targets
+
+    def force_fill_headers(self, ws, entry, fill_targets=None):
+        fill_map = {"style": entry['style'], "customer": entry['buyer'], "gauge": entry['gg'], "orderqty": entry['order_qty'], "consumtionqty": entry['con_qty']}
+        if fill_targets is None: fill_targets = self.find_fill_targets(ws)
+        for key, _, target in fill_targets:
+            self.set_cell_value(ws[target], fill_map[key])
+
+    def find_table_header(self, ws):
+        for r in range(10, 40):
+            row_vals = [self.clean_text_strict(ws.cell(r, c).value) for c in range(1, 20)]
+            if ("output" in row_vals or "production" in row_vals) and ("date" in row_vals or any("date" in x for x in row_vals)): return r
+        return None
+
+    def map_table_columns(self, ws, r):
+        m = {}
+        for c in range(1, 20):
+            v = str(ws.cell(r, c).value).lower().strip()
+            if "day" in v and "days" not in v: m['Day'] = c
+            elif "date" in v: m['Date'] = c
+            elif "output" in v: m['Output'] = c
+            elif "op" in v and ("no" in v or "m/c" in v): m['MC'] = c
+            elif "avg" in v and "prod" in v: m['AvgProd'] = c
+            elif "total" in v and ("work" in v or "min" in v): m['Min'] = c
+            elif "eff" in v: m['Eff'] = c
+            elif "time" in v: m['Time'] = c
+        return m
+
+    def classify_summary_label(self, v):
+        if "customer" in v: return 'Buyer'
+        elif "style" in v: return 'Style'
+        elif "gauge" in v: return 'GG'
+        elif "smv" in v: return 'SMV'
+        elif "orderqty" in v: return 'OrderQty'
+        elif "linkingqty" in v: return 'LinkQty'
+        return None
+
+    def find_summary_cells(self, ws_style):
+        # {field: [label cell, value cell]}; the last label of each kind wins
+        cells = {}
+        for r in range(1, 70):
+            for c in range(1, 15):
+                val = ws_style.cell(r, c).value
+                if not val: continue
+                field = self.classify_summary_label(self.clean_text_strict(val))
+                if field:
+                    # V44 FIX: Replaced 'ws' with 'ws_style'
+                    end_col = self.merge_end_col(ws_style, r, c)
+                    final_target = self.merge_anchor(ws_style, r, end_col + 1)
+                    cells[field] = [ws_style.cell(r, c).coordinate, final_target.coordinate]
+        return cells
+
+    def update_total_summary(self, wb, ws_style, style_name, header_row, col_map, addr_map=None, summary_index=None):
+        if "TOTAL SUMMARY" not in wb.sheetnames: return
+        ws_sum = wb["TOTAL SUMMARY"]
+        if summary_index is None: summary_index = SummaryRowIndex(ws_sum)
+        total_row = None
+        for r in range(header_row + 1, 100):
+            val = ws_style.cell(r, 1).value
+            if val and ("total" in str(val).lower()): total_row = r; break
+        
+        if addr_map is None:
+            addr_map = {field: target for field, (_, target) in self.find_summary_cells(ws_style).items()}
+
+        # --- Indexed Style -> Row Lookup (exact name match) ---
+        scanned = summary_index.rows_scanned
+        target_r = summary_index.lookup(style_name)
+        if not target_r: return
+
+        if ws_sum.cell(target_r, 1).value is None: self.set_cell_value(ws_sum.cell(target_r, 1), summary_index.last_sno(target_r) + 1)
+        if 'Buyer' in addr_map: self.set_cell_value(ws_sum.cell(target_r, 2), ws_style[addr_map['Buyer']].value)
+        self.set_cell_value(ws_sum.cell(target_r, 3), style_name)
+        if 'GG' in addr_map: self.set_cell_value(ws_sum.cell(target_r, 4), ws_style[addr_map['GG']].value)
+        quoted_style = f"'{style_name}'"
+        if 'OrderQty' in addr_map: self.set_cell_value(ws_sum.cell(target_r, 5), f"={quoted_style}!{addr_map['OrderQty']}")
+        if 'LinkQty' in addr_map: self.set_cell_value(ws_sum.cell(target_r, 6), f"={quoted_style}!{addr_map['LinkQty']}")
+        self.set_cell_value(ws_sum.cell(target_r, 7), f"=E{target_r}-F{target_r}")
+        if 'SMV' in addr_map: self.set_cell_value(ws_sum.cell(target_r, 8), f"={quoted_style}!{addr_map['SMV']}")
+        if total_row:
+            col_out = get_column_letter(col_map['Output']); col_wmin = get_column_letter(col_map['Min']) if 'Min' in col_map else 'F'; col_eff = get_column_letter(col_map['Eff']) if 'Eff' in col_map else 'G'
+            self.set_cell_value(ws_sum.cell(target_r, 9), f"={quoted_style}!{col_out}{total_row}")
+            self.set_cell_value(ws_sum.cell(target_r, 10), f"={quoted_style}!{col_wmin}{total_row}")
+            self.set_cell_value(ws_sum.cell(target_r, 11), f"=H{target_r}*I{target_r}")
+            col_date = get_column_letter(col_map['Date']); s_row = header_row + 1; e_row = total_row - 1
+            self.set_cell_value(ws_sum.cell(target_r, 12), f"=COUNTA({quoted_style}!{col_date}{s_row}:{col_date}{e_row})")
+            target = self.set_cell_value(ws_sum.cell(target_r, 13), f"={quoted_style}!{col_eff}{total_row}")
+            target.number_format = '0%'
+        summary_index.assigned(target_r, style_name)
+        if self.profiler: self.profiler.add("rows_scanned", summary_index.rows_scanned - scanned)
+
+    def update_footer_formulas(self, ws, header_row, col_map):
+        total_row = None
+        for r in range(header_row + 1, 100):
+            val = ws.cell(r, 1).value
+            if val and ("total" in str(val).lower()): total_row = r; break
+        if total_row:
+            start = header_row + 1; end = total_row - 1
+            c_op = get_column_letter(col_map['MC']) if 'MC' in col_map else None
+            c_out = get_column_letter(col_map['Output'])
+            c_avg = get_column_letter(col_map['AvgProd']) if 'AvgProd' in col_map else None
+            c_min = get_column_letter(col_map['Min']) if 'Min' in col_map else None
+            c_eff = get_column_letter(col_map['Eff']) if 'Eff' in col_map else None
+            if c_op: self.set_cell_value(ws.cell(total_row, col_map['MC']), f"=SUM({c_op}{start}:{c_op}{end})")
+            self.set_cell_value(ws.cell(total_row, col_map['Output']), f"=SUM({c_out}{start}:{c_out}{end})")
+            if c_avg and c_op: self.set_cell_value(ws.cell(total_row, col_map['AvgProd']), f"={c_out}{total_row}/{c_op}{total_row}")
+            if c_min: self.set_cell_value(ws.cell(total_row, col_map['Min']), f"=SUM({c_min}{start}:{c_min}{end})")
+            if c_eff and c_min:
+                f_footer_eff = f"={c_out}{total_row}*$K$11/{c_min}{total_row}"
+                target = self.set_cell_value(ws.cell(total_row, col_map['Eff']), f_footer_eff)
+                target.number_format = '0%'
+
+    # ==========================================
+    # DEFERRED CHARTS (Once Per Dirty Sheet)
+    # ==========================================
+    def mark_chart_dirty(self, ws, header_row, col_map):
+        # Rows were written: the sheet's chart is rebuilt once, after the last entry
+        if 'Eff' in col_map and 'Day' in col_map: self.dirty_charts[ws.title] = (ws, header_row, col_map)
+
+    def build_dirty_charts(self):
+        rebuilt = sum(self.add_efficiency_chart(*args) for args in self.dirty_charts.values())
+        if self.dirty_charts: self.log(f"Charts: {rebuilt} rebuilt, {len(self.dirty_charts) - rebuilt} unchanged")
+        self.dirty_charts = {}
+
+    def place_chart(self, ws, chart, anchor):
+        """Adds chart at anchor, replacing the sheet's charts, unless an identical one is
+        already there. Returns True if the sheet's chart was replaced."""
+        chart.anchor = anchor
+        if len(ws._charts) == 1 and chart_signature(ws._charts[0]) == chart_signature(chart):
+            ws._charts[0].style = chart.style  # the one chart property openpyxl drops when loading
+            return False
+        del ws._charts[:]
+        ws.add_chart(chart, anchor)
+        return True
+
+    def add_efficiency_chart(self, ws, header_row, col_map):
+        eff_col = col_map['Eff']; day_col = col_map['Day']; data_start = header_row + 1; data_end = header_row + 32 
+        values = Reference(ws, min_col=eff_col, min_row=header_row, max_row=data_end); cats = Reference(ws, min_col=day_col, min_row=data_start, max_row=data_end)
+        chart = LineChart(); chart.title = "Efficiency (%)"; chart.style = 13; chart.y_axis.title = "Efficiency"; chart.x_axis.title = "Day"; chart.legend = None 
+        chart.add_data(values, titles_from_data=True); chart.set_categories(cats)
+        s1 = chart.series[0]; s1.marker.symbol = "circle"; s1.dLbls = DataLabelList(); s1.dLbls.showVal = True; s1.dLbls.numFmt = '0%'
+        chart.height = 10; chart.width = 18
+        return self.place_chart(ws, chart, "J16")
+
+    # ==========================================
+    # MONTHLY ROLL-OVER (Archive Closed Months)
+    # ==========================================
+    SHEET_DAY = re.compile(r'(\d{1,2})-([A-Za-z]{3})')
+
+    def sheet_day_rows(self, ws, today=None):
+        """{row: date} of a style sheet's daily table. Day cells hold 'dd-Mon' text without
+        a year, so the year is the latest one that does not put the day after today."""
+        today = (today or datetime.now()).date()
+        header_row = self.find_table_header(ws)
+        if not header_row: return {}
+        col_date = self.map_table_columns(ws, header_row).get('Date')
+        if not col_date: return {}
+        days = {}
+        for r in range(header_row + 1, 1000):
+            if "total" in str(ws.cell(r, 1).value).lower(): break
+            value = ws.cell(r, col_date).value
+            if isinstance(value, datetime): days[r] = value.date(); continue
+            m = self.SHEET_DAY.search(str(value or ""))
+            if not m: continue
+            try:
+                month = datetime.strptime(m.group(2).title(), "%b").month
+                year = today.year if (month, int(m.group(1))) <= (today.month, today.day) else today.year - 1
+                days[r] = datetime(year, month, int(m.group(1))).date()
+            except ValueError:
+                continue
+        return days
+
+    def drop_daily_rows(self, ws, drop):
+        """Takes rows out of a style sheet's daily table: the rows below move up, with
+        their same-row formulas, and Day is renumbered from 1 like a fresh FORMATE copy.
+        The Total footer stays where it is, so its SUMs and TOTAL SUMMARY links hold."""
+        header_row = self.find_table_header(ws)
+        if not header_row: return 0
+        col_map = self.map_table_columns(ws, header_row)
+        total_row = next((r for r in range(header_row + 1, 1000) if "total" in str(ws.cell(r, 1).value).lower()), None)
+        if not total_row: return 0
+        last_col = max(col_map.values())
+        col_day = col_map.get('Day')
+        rows = [r for r in range(header_row + 1, total_row) if r not in drop
+                and any(ws.cell(r, c).value is not None for c in range(1, last_col + 1) if c != col_day)]
+        snapshot = [(src, [(ws.cell(src, c).value, ws.cell(src, c).number_format) for c in range(1, last_col + 1)]) for src in rows]
+        for r in range(header_row + 1, total_row):
+            for c in range(1, last_col + 1):
+                if not isinstance(ws.cell(r, c), MergedCell): ws.cell(r, c).value = None
+            if col_day: ws.cell(r, col_day).value = r - header_row
+        for i, (src, cells) in enumerate(snapshot):
+            dst = header_row + 1 + i
+            for c, (value, number_format) in enumerate(cells, 1):
+                cell = ws.cell(dst, c)
+                if isinstance(cell, MergedCell) or c == col_day: continue
+                if isinstance(value, str) and value.startswith("=") and dst != src: value = shift_local_refs(value, dst - src)
+                cell.value = value; cell.number_format = number_format
+        return len(rows)
+
+    @staticmethod
+    def summary_sheet_month(name):
+        # 'Date Wise Summary OCT-2025' -> '2025-10' (None if the name carries no month)
+        try: return datetime.strptime(name.split(' ')[-1].title(), "%b-%Y").strftime("%Y-%m")
+        except ValueError: return None
+
+    def compact_total_summary(self, ws, keep):
+        """Keeps the TOTAL SUMMARY top-table rows whose style is in keep, closed up from
+        row 5 and renumbered; same-row formulas (=E5-F5) move with their row."""
+        keep = {SummaryRowIndex.key(k) for k in keep}
+        end = SummaryRowIndex(ws).free_row or 500
+        rows = [r for r in range(5, end) if SummaryRowIndex.key(ws.cell(r, 3).value) in keep]
+        snapshot = [(src, [(ws.cell(src, c).value, ws.cell(src, c).number_format) for c in range(1, 14)]) for src in rows]
+        for i, (src, cells) in enumerate(snapshot):
+            dst = 5 + i
+            for c, (value, number_format) in enumerate(cells, 1):
+                cell = ws.cell(dst, c)
+                if isinstance(cell, MergedCell): continue
+                if c == 1 and isinstance(value, int): value = i + 1
+                elif isinstance(value, str) and value.startswith("=") and dst != src: value = shift_local_refs(value, dst - src)
+                cell.value = value; cell.number_format = number_format
+        for r in range(5 + len(rows), end):
+            for c in range(1, 14):
+                if not isinstance(ws.cell(r, c), MergedCell): ws.cell(r, c).value = None
+        return len(rows)
+
+    def clear_bottom_summary_table(self, ws_sum):
+        # The TOTAL SUMMARY bottom table describes the supervisor data of one run
+        for row in ws_sum.iter_rows(min_row=35, max_col=14):
+            for cell in row:
+                if not isinstance(cell, MergedCell): cell.value = None
+
+    def rebuild_date_wise_summary(self, session, ws, valid_dates, keep_man_power=True):
+        # Style columns shift once sheets leave; clear the old blocks and date labels
+        # (keeping manual DAILY MAN POWER figures of the same month) and let
+        # update_date_wise_summary lay them out again
+        last_row = 7 + 31 + 1
+        man_power = {}
+        for c in range(2, ws.max_column + 1):
+            if keep_man_power and str(ws.cell(6, c).value).strip().upper() == "DAILY MAN POWER":
+                man_power = {r: ws.cell(r, c).value for r in range(7, last_row) if not isinstance(ws.cell(r, c).value, str)}
+        total_label = next((ws.cell(r, 1).value for r in range(7, last_row + 1) if "total" in str(ws.cell(r, 1).value).lower()), None)
+        for r in range(4, last_row + 1):
+            for c in range(1 if r >= 7 else 2, ws.max_column + 1):
+                if not isinstance(ws.cell(r, c), MergedCell): ws.cell(r, c).value = None
+        month = self.summary_sheet_month(ws.title)
+        if total_label and month:
+            year, month = map(int, month.split("-"))
+            ws.cell(7 + calendar.monthrange(year, month)[1], 1).value = total_label
+        self.update_date_wise_summary(session, valid_dates)
+        for c in range(2, ws.max_column + 1):
+            if str(ws.cell(6, c).value).strip().upper() == "DAILY MAN POWER":
+                for r, value in man_power.items():
+                    if value is not None: self.set_cell_value(ws.cell(r, c), value)
+
+    def rollover(self, master_path, keep_month=None, today=None):
+        """Moves the style sheet days before keep_month ('YYYY-MM', default: the newest
+        month in the master) into <master>.archive-YYYY-MM.xlsx, one workbook per
+        closed month (the month of a sheet's last closed day), and leaves a slim
+        current-month master.
+
+        Each archive is a trimmed copy of the master: FORMATE, the month's style
+        sheets, their TOTAL SUMMARY rows and that month's Date Wise Summary. A sheet
+        that also has days in keep_month is split: the archive copy keeps the closed
+        rows and the master's copy keeps the rest, moved up to the first table row.
+        The master's TOTAL SUMMARY is closed up and its Date Wise Summary rebuilt.
+        ArchiveIndex records where every style went. Sheet days carry no year: they
+        are read relative to today, or to the end of keep_month when one is given.
+        """
+        self.log(f"--- ROLL-OVER: {os.path.basename(master_path)} ---")
+        if keep_month and today is None:
+            year, month = map(int, keep_month.split("-"))
+            today = datetime(year, month, calendar.monthrange(year, month)[1])
+        result = {"status": "ok", "master": master_path, "keep_month": None, "archived": {}, "split": [], "archives": [], "skipped": []}
+        session = MasterWorkbookSession(master_path)
+        wb = session.wb
+
+        activity = {}  # sheet -> {row: day}
+        for name in self.style_sheet_names(wb):
+            days = self.sheet_day_rows(wb[name], today)
+            if days: activity[name] = days
+        if not activity:
+            self.log("No dated style sheets found; nothing to archive.")
+            result["status"] = "nothing_to_archive"
+            return result
+        keep_month = keep_month or max(max(days.values()) for days in activity.values()).strftime("%Y-%m")
+        result["keep_month"] = keep_month
+        cutoff = datetime.strptime(keep_month, "%Y-%m").date()
+
+        groups = {}   # 'YYYY-MM' -> [sheet names]
+        closed = {}   # sheet -> sorted closed days
+        split = set() # sheets with days on both sides of the cutoff
+        for name, days in activity.items():
+            closed_days = sorted(d for d in days.values() if d < cutoff)
+            if not closed_days: continue
+            closed[name] = closed_days
+            groups.setdefault(closed_days[-1].strftime("%Y-%m"), []).append(name)
+            if len(closed_days) < len(days): split.add(name)
+        if not groups:
+            self.log(f"No style sheet has days before {keep_month}; nothing to archive.")
+            result["status"] = "nothing_to_archive"
+            return result
+
+        index = ArchiveIndex(master_path)
+        archived = []
+        for month, names in sorted(groups.items()):
+            archive_path = os.path.splitext(master_path)[0] + f".archive-{month}.xlsx"
+            if os.path.exists(archive_path):
+                self.log(f"WARNING: {os.path.basename(archive_path)} already exists; {len(names)} sheet(s) of {month} stay in the master.")
+                result["skipped"].append(month)
+                continue
+            self.log(f"Archiving {len(names)} style sheet(s) of {month} -> {os.path.basename(archive_path)}")
+            archive = MasterWorkbookSession(master_path)
+            keep_sheets = set(names) | {"FORMATE", "TOTAL SUMMARY"}
+            keep_sheets |= {n for n in archive.wb.sheetnames if n.lower().startswith("date wise") and self.summary_sheet_month(n) == month}
+            for ws in list(archive.wb.worksheets):
+                if ws.title not in keep_sheets: archive.wb.remove(ws)
+            for name in split & set(names):
+                # The archive's half of a split sheet: only the closed rows
+                self.drop_daily_rows(archive.wb[name], {r for r, d in activity[name].items() if d >= cutoff})
+            if "TOTAL SUMMARY" in archive.wb.sheetnames:
+                ws_sum = archive.wb["TOTAL SUMMARY"]
+                self.compact_total_summary(ws_sum, names)
+                self.clear_bottom_summary_table(ws_sum)
+            # The copied summary still has blocks for sheets that stayed in the master: lay it out again
+            summaries = [n for n in archive.wb.sheetnames if n.lower().startswith("date wise")]
+            if summaries:
+                valid_dates = {d for name in names for d in closed[name] if d.strftime("%Y-%m") == month}
+                self.rebuild_date_wise_summary(archive, archive.wb[summaries[0]], valid_dates)
+            archive.save(archive_path)
+            for name in names:
+                days = closed[name]
+                index.add(name, month, archive_path, days[0], days[-1], len(days))
+            result["archived"][month] = names
+            result["archives"].append(archive_path)
+            archived.extend(names)
+        if not archived: return result
+
+        # --- Slim master: drop archived sheets and closed rows, close up TOTAL SUMMARY, rebuild Date Wise Summary ---
+        removed = [name for name in archived if name not in split]
+        for name in removed: wb.remove(wb[name])
+        result["split"] = sorted(split & set(archived))
+        for name in result["split"]:
+            # Kept days move up to the first table row, where the Date Wise Summary expects day 1
+            self.drop_daily_rows(wb[name], {r for r, d in activity[name].items() if d < cutoff})
+        kept = self.style_sheet_names(wb)
+        if "TOTAL SUMMARY" in wb.sheetnames:
+            self.compact_total_summary(wb["TOTAL SUMMARY"], kept)
+            self.clear_bottom_summary_table(wb["TOTAL SUMMARY"])
+        summaries = [n for n in wb.sheetnames if n.lower().startswith("date wise")]
+        closed_summaries = [n for n in summaries if (self.summary_sheet_month(n) or keep_month) < keep_month]
+        renamed = False
+        if closed_summaries and len(closed_summaries) == len(summaries):
+            # Only closed-month summaries left: the newest becomes this month's
+            current = max(closed_summaries, key=lambda n: self.summary_sheet_month(n))
+            closed_summaries.remove(current)
+            wb[current].title = f"Date Wise Summary {cutoff.strftime('%b').upper()}-{cutoff.year}"
+            renamed = True
+        for name in closed_summaries: wb.remove(wb[name])
+        summaries = [n for n in wb.sheetnames if n.lower().startswith("date wise")]
+        if summaries:
+            valid_dates = {d for name in kept for d in activity.get(name, {}).values() if d >= cutoff}
+            # A renamed summary's DAILY MAN POWER figures belong to the closed month
+            self.rebuild_date_wise_summary(session, wb[summaries[0]], valid_dates, keep_man_power=not renamed)
+
+        for ws in wb.worksheets:
+            refs = sum(1 for row in ws.iter_rows() for cell in row
+                       if isinstance(cell.value, str) and cell.value.startswith("=") and any(f"'{n}'!" in cell.value for n in removed))
+            if refs: self.log(f"WARNING: {refs} formula(s) on '{ws.title}' still point at archived sheets.")
+
+        # Applied rows stay in the ledger, so re-running an old report does not bring
+        # archived styles back; a ledger that was in sync is re-stamped for the new file
+        ledger = IngestionLedger(master_path) if os.path.exists(os.path.splitext(master_path)[0] + ".ledger.sqlite") else None
+        in_sync = ledger is not None and ledger.is_in_sync()
+        session.save()
+        index.save()
+        if ledger:
+            if in_sync: ledger.record({})
+            ledger.close()
+        self.log(f"--- ROLL-OVER DONE: {len(archived)} sheet(s) archived ({len(result['split'])} split), {len(kept)} kept for {keep_month} ---")
+        return result
+
+    def archived_months(self, master_path, style):
+        """Archived months of a style ([] if it never left the master)."""
+        return ArchiveIndex(master_path).find(self.clean_style_name(style))
+
+def _read_supervisor_worker(filepath, date_config=None):
+    # Process-pool entry point: module level so it pickles by reference
+    engine = IEAutomationEngine(date_detector=DateDetector(**(date_config or {})))
+    return filepath, engine.read_supervisor_file(filepath)
+
+# ==========================================
+# COMMAND LINE (Headless / Scheduled Runs)
+# ==========================================
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2  # argparse
+EXIT_NO_DATA = 3
+EXIT_MISSING_FILE = 4
+
+def build_arg_parser():
+    # No prefix matching: the old --history STYLE would otherwise turn into --history-db STYLE
+    parser = argparse.ArgumentParser(description="Update an IE master workbook from supervisor daily reports.", allow_abbrev=False)
+    parser.add_argument("--supervisor", "-s", nargs="+", help="Supervisor report workbook(s)")
+    parser.add_argument("--master", "-m", required=True, help="Master workbook (with FORMATE sheet)")
+    parser.add_argument("--full", action="store_true", help="Ignore the ingestion ledger and re-apply every row")
+    parser.add_argument("--month-first", action="store_true", help="Supervisor dates are MM/DD/YYYY instead of DD/MM/YYYY")
+    parser.add_argument("--two-digit-years", action="store_true", help="Accept DD/MM/YY report dates (20YY)")
+    parser.add_argument("--json", action="store_true", help="Emit progress and the result as JSON lines on stdout")
+    parser.add_argument("--values", nargs="?", const=True, default=False, metavar="XLSX",
+                        help="Also write a values-only copy of the master (default <master>.values.xlsx)")
+    parser.add_argument("--profile", nargs="?", const=True, default=False, metavar="TRACE",
+                        help="Log a per-stage/per-style profile and write a JSON trace (default <master>.trace.json)")
+    parser.add_argument("--rollover", nargs="?", const=True, default=None, metavar="YYYY-MM",
+                        help="Archive style sheets of months before YYYY-MM (default: the newest month in the master)")
+    parser.add_argument("--archived", metavar="STYLE", help="List the months a style was archived in by --rollover")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Preview: update in memory, write <master>.changeset.json/.txt, save nothing")
+    parser.add_argument("--apply", action="store_true", help="Save the change set previewed by the last --dry-run")
+    parser.add_argument("--partial-save", action="store_true",
+                        help="Patch only the changed rows into the master file when possible (full save otherwise)")
+    parser.add_argument("--history-db", nargs="?", const=default_history_path(), default=None, metavar="SQLITE",
+                        help="Also append the entries to the supervisor history store queried by ie_history.py (default $IE_HISTORY_DB or ~/.ie_history.sqlite)")
+    return parser
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if not (args.supervisor or args.rollover or args.archived or args.apply):
+        parser.error("--supervisor is required (unless --rollover, --archived or --apply is given)")
+    if isinstance(args.rollover, str):
+        try: datetime.strptime(args.rollover, "%Y-%m")
+        except ValueError: parser.error("--rollover month must look like YYYY-MM")
+
+    def emit(event, **fields):
+        print(json.dumps({"event": event, "time": datetime.now().isoformat(timespec="seconds"), **fields}, default=str), flush=True)
+
+    detector = DateDetector(day_first=not args.month_first, two_digit_years=args.two_digit_years)
+    if args.json:
+        engine = IEAutomationEngine(log_callback=lambda msg: emit("log", message=msg),
+                                    progress_callback=lambda value: emit("progress", value=value),
+                                    date_detector=detector, history_path=args.history_db)
+    else:
+        engine = IEAutomationEngine(date_detector=detector, history_path=args.history_db)
+
+    if args.archived:
+        archived = engine.archived_months(args.master, args.archived)
+        if args.json: emit("result", status="ok", style=args.archived, archived=archived)
+        else:
+            for a in archived: print(f"{a['month']}  {a['style']:<20} {a['days']:>3} day(s) {a['first_day']} .. {a['last_day']}  {a['archive']}")
+            if not archived: print(f"{args.archived} was never archived.")
+        return EXIT_OK
+
+    missing = [p for p in (args.supervisor or []) + [args.master] if not os.path.isfile(p)]
+    if missing:
+        if args.json: emit("result", status="missing_file", files=missing)
+        else: print(f"ERROR: File not found: {', '.join(missing)}", file=sys.stderr)
+        return EXIT_MISSING_FILE
+
+    try:
+        if args.rollover:
+            keep_month = args.rollover if isinstance(args.rollover, str) else None
+            result = engine.rollover(args.master, keep_month)
+        elif args.apply:
+            result = engine.apply_changeset(args.master, profile=args.profile, values_export=args.values,
+                                            partial_save=args.partial_save)
+        else:
+            result = engine.run(args.supervisor, args.master, incremental=not args.full, profile=args.profile,
+                                values_export=args.values, dry_run=args.dry_run, partial_save=args.partial_save)
+    except Exception as e:
+        if args.json: emit("result", status="error", error=str(e), traceback=traceback.format_exc())
+        else:
+            traceback.print_exc()
+            print(f"CRITICAL ERROR: {e}", file=sys.stderr)
+        return EXIT_ERROR
+
+    if args.json: emit("result", **result)
+    return EXIT_NO_DATA if result["status"] == "no_data" else EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
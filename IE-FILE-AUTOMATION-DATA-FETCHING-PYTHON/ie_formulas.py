@@ -0,0 +1,391 @@
+"""Evaluator for the formula subset the IE engine writes into a master workbook.
+
+openpyxl saves formulas without cached results, so data_only readers see None
+until Excel recalculates the file. FormulaEvaluator computes what Excel would
+for the formulas this tool generates (and the simple ones templates carry):
+
+    arithmetic + - * / ^ %, & and comparisons, same-sheet and 'Sheet'!A1 refs,
+    SUM, SUMIFS, COUNTA, COUNT, AVERAGE, MIN, MAX, ROUND, ABS, IF, IFERROR
+
+Anything else raises Unsupported; materialise_values() leaves those cells (and
+every cell depending on them) as formulas for Excel to calculate.
+"""
+import re
+from datetime import datetime, date
+
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.datetime import to_excel
+
+class ExcelError:
+    """An Excel error value (#DIV/0! ...); propagates through arithmetic like in Excel."""
+    __slots__ = ("code",)
+
+    def __init__(self, code):
+        self.code = code
+
+    def __eq__(self, other):
+        return isinstance(other, ExcelError) and other.code == self.code
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __repr__(self):
+        return self.code
+
+DIV0, VALUE, REF = ExcelError("#DIV/0!"), ExcelError("#VALUE!"), ExcelError("#REF!")
+
+class Unsupported(Exception):
+    """Formula (or something it depends on) is outside the evaluated subset."""
+
+TOKEN = re.compile(r"""\s*(?:
+     (?P<string>"(?:[^"]|"")*")
+    |(?P<func>[A-Za-z_][\w.]*)(?=\s*\()
+    |(?P<ref>(?:(?:'(?:[^']|'')+'|[A-Za-z_][\w.]*)!)?\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?)
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<bool>TRUE|FALSE)\b
+    |(?P<error>\#(?:NULL!|DIV/0!|VALUE!|REF!|NAME\?|NUM!|N/A))
+    |(?P<op><>|<=|>=|[-+*/^&=<>%(),])
+    )""", re.X | re.I)
+CELL = re.compile(r"\$?([A-Za-z]{1,3})\$?(\d+)")
+
+def tokenize(text):
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = TOKEN.match(text, pos)
+        if not m or m.end() == pos: raise Unsupported(f"cannot parse {text[pos:pos + 20]!r}")
+        kind = m.lastgroup
+        tokens.append((kind, m.group(kind)))
+        pos = m.end()
+    return tokens
+
+def parse_ref(text):
+    # "'Sheet'!$A$1:B2" -> (sheet or None, r1, c1, r2, c2)
+    sheet = None
+    if "!" in text:
+        sheet, text = text.rsplit("!", 1)
+        if sheet.startswith("'"): sheet = sheet[1:-1].replace("''", "'")
+    cells = [CELL.fullmatch(part) for part in text.split(":")]
+    (c1, r1), (c2, r2) = (cells[0].groups(), cells[-1].groups())
+    r1, r2, c1, c2 = int(r1), int(r2), column_index_from_string(c1.upper()), column_index_from_string(c2.upper())
+    return sheet, min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2)
+
+class Parser:
+    """Recursive descent over the token list; produces nested tuples (AST)."""
+    COMPARE = ("=", "<>", "<", ">", "<=", ">=")
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+    def parse(self):
+        node = self.comparison()
+        if self.pos != len(self.tokens): raise Unsupported(f"unexpected {self.tokens[self.pos][1]!r}")
+        return node
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, text = self.peek()
+        if kind is None or (value is not None and text != value): raise Unsupported(f"expected {value!r}")
+        self.pos += 1
+        return kind, text
+
+    def binary(self, operators, operand):
+        node = operand()
+        while self.peek()[0] == "op" and self.peek()[1] in operators:
+            op = self.take()[1]
+            node = ("bin", op, node, operand())
+        return node
+
+    def comparison(self): return self.binary(self.COMPARE, self.concat)
+    def concat(self): return self.binary(("&",), self.additive)
+    def additive(self): return self.binary(("+", "-"), self.term)
+    def term(self): return self.binary(("*", "/"), self.power)
+    def power(self): return self.binary(("^",), self.unary)
+
+    def unary(self):
+        if self.peek() in (("op", "-"), ("op", "+")):
+            op = self.take()[1]
+            node = self.unary()
+            return ("neg", node) if op == "-" else node
+        node = self.primary()
+        while self.peek() == ("op", "%"):
+            self.take(); node = ("pct", node)
+        return node
+
+    def primary(self):
+        kind, text = self.take()
+        if kind == "number": return ("num", float(text) if any(ch in text for ch in ".eE") else int(text))
+        if kind == "string": return ("str", text[1:-1].replace('""', '"'))
+        if kind == "bool": return ("bool", text.upper() == "TRUE")
+        if kind == "error": return ("err", ExcelError(text.upper()))
+        if kind == "ref":
+            sheet, r1, c1, r2, c2 = parse_ref(text)
+            return ("cell", sheet, r1, c1) if (r1, c1) == (r2, c2) and ":" not in text else ("range", sheet, r1, c1, r2, c2)
+        if kind == "func":
+            self.take("(")
+            args = []
+            if self.peek() != ("op", ")"):
+                args.append(self.comparison())
+                while self.peek() == ("op", ","):
+                    self.take(); args.append(self.comparison())
+            self.take(")")
+            return ("call", text.upper(), args)
+        if (kind, text) == ("op", "("):
+            node = self.comparison()
+            self.take(")")
+            return node
+        raise Unsupported(f"unexpected {text!r}")
+
+# --- Coercions (Excel semantics for the cases this tool produces) ---
+def to_number(value):
+    if isinstance(value, ExcelError): return value
+    if value is None: return 0
+    if isinstance(value, bool): return int(value)
+    if isinstance(value, (int, float)): return value
+    if isinstance(value, (datetime, date)): return to_excel(value)
+    try: return float(str(value).strip())
+    except ValueError: return VALUE
+
+def to_text(value):
+    if value is None: return ""
+    if isinstance(value, bool): return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer(): return str(int(value))
+    return str(value)
+
+def compare(op, a, b):
+    if a is None: a = "" if isinstance(b, str) else 0
+    if b is None: b = "" if isinstance(a, str) else 0
+    if isinstance(a, (datetime, date)): a = to_excel(a)
+    if isinstance(b, (datetime, date)): b = to_excel(b)
+    a_text, b_text = isinstance(a, str), isinstance(b, str)
+    if a_text and b_text: a, b = a.lower(), b.lower()
+    elif a_text or b_text:  # Excel orders numbers < text
+        a, b = (1, 0) if a_text else (0, 1)
+    return {"=": a == b, "<>": a != b, "<": a < b, ">": a > b, "<=": a <= b, ">=": a >= b}[op]
+
+def criterion_matcher(criterion):
+    # SUMIFS criteria: 5, "Fine", ">0", "<>Coarse", "Fin*"
+    if isinstance(criterion, ExcelError): return lambda v: False
+    if not isinstance(criterion, str): return lambda v: not isinstance(v, str) and v is not None and compare("=", v, criterion)
+    m = re.match(r"(<=|>=|<>|<|>|=)?(.*)$", criterion, re.S)
+    op, operand = m.group(1) or "=", m.group(2)
+    number = to_number(operand) if operand.strip() else None
+    if isinstance(number, (int, float)):
+        return lambda v: isinstance(v, (int, float)) and not isinstance(v, bool) and compare(op, v, number)
+    if operand == "":
+        return (lambda v: v is None or v == "") if op == "=" else (lambda v: v is not None and v != "")
+    if op in ("=", "<>") and any(ch in operand for ch in "*?"):
+        pattern = re.compile("".join(".*" if ch == "*" else "." if ch == "?" else re.escape(ch) for ch in operand) + r"\Z", re.I | re.S)
+        if op == "=": return lambda v: isinstance(v, str) and bool(pattern.match(v))
+        return lambda v: not (isinstance(v, str) and pattern.match(v))
+    return lambda v: compare(op, v if v is not None else "", operand) if isinstance(v, str) or op == "<>" else False
+
+def numbers_in(values):
+    # SUM/AVERAGE/MIN/MAX over ranges: text, booleans and blanks are ignored, errors propagate
+    for v in values:
+        if isinstance(v, ExcelError): raise _ErrorResult(v)
+        if isinstance(v, (int, float)) and not isinstance(v, bool): yield v
+        elif isinstance(v, (datetime, date)): yield to_excel(v)
+
+class _ErrorResult(Exception):
+    def __init__(self, error):
+        self.error = error
+
+_PENDING = object()
+_UNSUPPORTED = object()
+
+class FormulaEvaluator:
+    """Computes cell values of an openpyxl workbook, memoised per cell.
+
+    Reads cells without creating them, so evaluating never changes the sheets.
+    Circular references evaluate to #REF!.
+    """
+    def __init__(self, wb):
+        self.wb = wb
+        self.values = {}  # (sheet, row, col) -> computed value
+        self.asts = {}    # formula text -> AST
+        self.sheets = {name.lower(): name for name in wb.sheetnames}  # sheet refs are case-insensitive
+
+    def value(self, sheet, row, col):
+        sheet = self.sheets.get(sheet.lower())
+        if sheet is None: return REF
+        key = (sheet, row, col)
+        if key in self.values:
+            cached = self.values[key]
+            if cached is _PENDING: return REF
+            if cached is _UNSUPPORTED: raise Unsupported(f"{sheet}!{row},{col} depends on an unsupported formula")
+            return cached
+        cell = self.wb[sheet]._cells.get((row, col))
+        raw = cell.value if cell is not None else None
+        if isinstance(raw, str) and raw.startswith("=") and len(raw) > 1:
+            self.values[key] = _PENDING
+            try:
+                result = self.evaluate(raw, sheet)
+            except (Unsupported, RecursionError):
+                self.values[key] = _UNSUPPORTED
+                raise Unsupported(f"{sheet}!{cell.coordinate}: {raw}")
+        elif raw is not None and not isinstance(raw, (str, int, float, bool, datetime, date)):
+            self.values[key] = _UNSUPPORTED  # array / data-table formulas
+            raise Unsupported(f"{sheet}!{cell.coordinate}: {type(raw).__name__}")
+        elif isinstance(raw, str) and cell.data_type == "e":
+            result = ExcelError(raw)
+        else:
+            result = raw
+        self.values[key] = result
+        return result
+
+    def evaluate(self, formula, sheet):
+        """Value of formula text ('=...') as if it sat on the given sheet."""
+        ast = self.asts.get(formula)
+        if ast is None: ast = self.asts[formula] = Parser(formula[1:]).parse()
+        try:
+            result = self.eval_node(ast, sheet)
+        except _ErrorResult as e:
+            return e.error
+        if isinstance(result, list): return VALUE  # bare range outside a function
+        if result is None: return 0  # =A1 on a blank cell shows 0
+        if isinstance(result, float) and result.is_integer() and abs(result) < 2**53: return int(result)
+        return result
+
+    def eval_node(self, node, sheet):
+        kind = node[0]
+        if kind in ("num", "str", "bool", "err"): return node[1]
+        if kind == "cell": return self.value(node[1] or sheet, node[2], node[3])
+        if kind == "range":
+            _, ref_sheet, r1, c1, r2, c2 = node
+            return [[self.value(ref_sheet or sheet, r, c) for c in range(c1, c2 + 1)] for r in range(r1, r2 + 1)]
+        if kind == "neg":
+            v = to_number(self.scalar(node[1], sheet))
+            return v if isinstance(v, ExcelError) else -v
+        if kind == "pct":
+            v = to_number(self.scalar(node[1], sheet))
+            return v if isinstance(v, ExcelError) else v / 100
+        if kind == "bin": return self.binary(node[1], self.scalar(node[2], sheet), self.scalar(node[3], sheet))
+        if kind == "call":
+            fn = FUNCTIONS.get(node[1])
+            if fn is None: raise Unsupported(f"function {node[1]}")
+            return fn(self, node[2], sheet)
+        raise Unsupported(kind)
+
+    def scalar(self, node, sheet):
+        v = self.eval_node(node, sheet)
+        if isinstance(v, list): return VALUE
+        return v
+
+    def binary(self, op, a, b):
+        if isinstance(a, ExcelError): return a
+        if isinstance(b, ExcelError): return b
+        if op == "&": return to_text(a) + to_text(b)
+        if op in Parser.COMPARE: return compare(op, a, b)
+        a, b = to_number(a), to_number(b)
+        if isinstance(a, ExcelError): return a
+        if isinstance(b, ExcelError): return b
+        if op == "+": return a + b
+        if op == "-": return a - b
+        if op == "*": return a * b
+        if op == "/": return DIV0 if b == 0 else a / b
+        if op == "^":
+            try: return a ** b
+            except (ZeroDivisionError, OverflowError): return DIV0
+        raise Unsupported(op)
+
+    def flat(self, nodes, sheet):
+        # Argument values with ranges flattened (for SUM/COUNTA/...)
+        for node in nodes:
+            v = self.eval_node(node, sheet)
+            if isinstance(v, list):
+                for row in v: yield from row
+            else:
+                yield v
+
+# --- Functions: fn(evaluator, arg_nodes, sheet) ---
+def fn_sum(ev, args, sheet):
+    return sum(numbers_in(ev.flat(args, sheet)))
+
+def fn_count(ev, args, sheet):
+    return sum(1 for v in ev.flat(args, sheet) if isinstance(v, (int, float, datetime, date)) and not isinstance(v, bool))
+
+def fn_counta(ev, args, sheet):
+    return sum(1 for v in ev.flat(args, sheet) if v is not None)
+
+def fn_average(ev, args, sheet):
+    values = list(numbers_in(ev.flat(args, sheet)))
+    return sum(values) / len(values) if values else DIV0
+
+def fn_min(ev, args, sheet):
+    return min(numbers_in(ev.flat(args, sheet)), default=0)
+
+def fn_max(ev, args, sheet):
+    return max(numbers_in(ev.flat(args, sheet)), default=0)
+
+def fn_round(ev, args, sheet):
+    if len(args) != 2: return VALUE
+    v, digits = (to_number(ev.scalar(a, sheet)) for a in args)
+    for x in (v, digits):
+        if isinstance(x, ExcelError): return x
+    scale = 10 ** int(digits)
+    scaled = abs(v) * scale
+    rounded = int(scaled + 0.5 + 1e-9) / scale  # Excel rounds half away from zero
+    return rounded if v >= 0 else -rounded
+
+def fn_abs(ev, args, sheet):
+    v = to_number(ev.scalar(args[0], sheet))
+    return v if isinstance(v, ExcelError) else abs(v)
+
+def fn_if(ev, args, sheet):
+    cond = ev.scalar(args[0], sheet)
+    if isinstance(cond, ExcelError): return cond
+    if isinstance(cond, str): return VALUE
+    if cond: return ev.scalar(args[1], sheet) if len(args) > 1 else True
+    return ev.scalar(args[2], sheet) if len(args) > 2 else False
+
+def fn_iferror(ev, args, sheet):
+    try:
+        v = ev.scalar(args[0], sheet)
+    except _ErrorResult as e:
+        v = e.error
+    return ev.scalar(args[1], sheet) if isinstance(v, ExcelError) else v
+
+def fn_sumifs(ev, args, sheet):
+    if len(args) < 3 or len(args) % 2 == 0: return VALUE
+    sum_range = ev.eval_node(args[0], sheet)
+    if not isinstance(sum_range, list): sum_range = [[sum_range]]
+    shape = (len(sum_range), len(sum_range[0]))
+    tests = []
+    for rng_node, crit_node in zip(args[1::2], args[2::2]):
+        rng = ev.eval_node(rng_node, sheet)
+        if not isinstance(rng, list): rng = [[rng]]
+        if (len(rng), len(rng[0])) != shape: return VALUE
+        tests.append((rng, criterion_matcher(ev.scalar(crit_node, sheet))))
+    total = 0
+    for i, row in enumerate(sum_range):
+        for j, v in enumerate(row):
+            if all(match(rng[i][j]) for rng, match in tests):
+                if isinstance(v, ExcelError): return v
+                if isinstance(v, (int, float)) and not isinstance(v, bool): total += v
+    return total
+
+FUNCTIONS = {"SUM": fn_sum, "SUMIFS": fn_sumifs, "COUNTA": fn_counta, "COUNT": fn_count, "AVERAGE": fn_average,
+             "MIN": fn_min, "MAX": fn_max, "ROUND": fn_round, "ABS": fn_abs, "IF": fn_if, "IFERROR": fn_iferror}
+
+def materialise_values(wb):
+    """Replaces every formula in wb by its computed value, in place.
+
+    Returns (computed, unsupported) cell counts; unsupported formulas stay as
+    formulas. All values are computed before any cell is overwritten.
+    """
+    evaluator = FormulaEvaluator(wb)
+    results, unsupported = [], 0
+    for ws in wb.worksheets:
+        for cell in list(ws._cells.values()):
+            if not (isinstance(cell.value, str) and cell.value.startswith("=") and len(cell.value) > 1): continue
+            try:
+                results.append((cell, evaluator.value(ws.title, cell.row, cell.column)))
+            except Unsupported:
+                unsupported += 1
+    for cell, value in results:
+        cell.value = value.code if isinstance(value, ExcelError) else value
+    return len(results), unsupported
@@ -0,0 +1,204 @@
+"""Append-only history of every supervisor entry the IE engine extracts.
+
+Masters only keep one month of formulas, so runs can also keep the raw daily
+figures in a local SQLite store (opt-in: ie_engine.py --history-db, the GUI
+option or $IE_HISTORY_DB; default file ~/.ie_history.sqlite), where cross-month
+questions are indexed queries instead of reopening masters:
+
+    python ie_history.py style ST-101 [--month 2025-10]     # daily output/efficiency of a style
+    python ie_history.py gauges [--month 2025-10]           # monthly efficiency by gauge
+    python ie_history.py top [--month 2025-10] [-n 10] [--bottom]
+    python ie_history.py import day1.xlsx day2.xlsx         # backfill from old supervisor reports
+
+Rows are never updated or deleted. Reading the same report twice adds nothing;
+a corrected figure for a (day, style) adds a new row, and queries use the
+figures of the most recent read per (day, style). Efficiency is the master's
+own formula summed over the period: sum(output * SMV) / sum(M/C * average minutes).
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+HASH_FIELDS = ("output", "mc", "aver_min", "smv", "buyer", "gg", "order_qty", "con_qty")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,
+    style TEXT NOT NULL,
+    style_key TEXT NOT NULL,
+    buyer TEXT,
+    gauge TEXT,
+    output REAL,
+    mc REAL,
+    aver_min REAL,
+    smv REAL,
+    order_qty TEXT,
+    con_qty TEXT,
+    content_hash TEXT NOT NULL,
+    source TEXT,
+    ingested_at TEXT NOT NULL,
+    UNIQUE (style_key, day, content_hash)
+);
+CREATE INDEX IF NOT EXISTS entries_day ON entries (day);
+CREATE INDEX IF NOT EXISTS entries_buyer ON entries (buyer);
+CREATE INDEX IF NOT EXISTS entries_gauge ON entries (gauge, day);
+CREATE TABLE IF NOT EXISTS current (
+    style_key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    entry_id INTEGER NOT NULL REFERENCES entries (id),
+    PRIMARY KEY (style_key, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS current_day ON current (day, style_key);
+"""
+# entries is the append-only log (its UNIQUE constraint doubles as the style index);
+# current points each (style, day) at the row of the most recent read, so queries
+# never have to work out which version is the newest
+
+LATEST = "current c JOIN entries e ON e.id = c.entry_id"  # filter on c.day / c.style_key to use current's indexes
+EFFICIENCY = "SUM(output * smv) / NULLIF(SUM(mc * aver_min), 0)"
+
+def default_history_path():
+    return os.environ.get("IE_HISTORY_DB") or os.path.join(os.path.expanduser("~"), ".ie_history.sqlite")
+
+def content_hash(entry):
+    # Shared with the engine's ingestion ledger: both must call the same figures "changed"
+    fields = [entry[k] for k in HASH_FIELDS]
+    return hashlib.sha1(json.dumps(fields, default=str).encode()).hexdigest()
+
+def gauge_text(gg):
+    # 12, 12.0 and "12" are the same gauge; anything else is kept as typed
+    if gg is None: return ""
+    if isinstance(gg, float) and gg.is_integer(): gg = int(gg)
+    return str(gg).strip()
+
+def month_range(month):
+    # 'YYYY-MM' -> [first day, first day of next month) as ISO strings, so day comparisons use the index
+    start = datetime.strptime(month, "%Y-%m")
+    end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return start.date().isoformat(), end.date().isoformat()
+
+class HistoryStore:
+    """The SQLite history file: append() from the engine, query methods for reports."""
+    def __init__(self, path=None):
+        self.path = path or default_history_path()
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def append(self, entries, source=""):
+        """Adds entries (engine dicts, style already cleaned); returns how many rows were new."""
+        now = datetime.now().isoformat(timespec="seconds")
+        rows = [(e['date'].date().isoformat(), e['style'], e['style'].casefold(), str(e['buyer'] or ""), gauge_text(e['gg']),
+                 e['output'], e['mc'], e['aver_min'], e['smv'], str(e['order_qty'] or ""), str(e['con_qty'] or ""),
+                 content_hash(e), source, now) for e in entries]
+        before = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        self.conn.executemany("INSERT OR IGNORE INTO entries (day, style, style_key, buyer, gauge, output, mc, aver_min, smv, "
+                              "order_qty, con_qty, content_hash, source, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        added = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - before
+        # Re-reading an older report makes its figures current again, like it does in the master
+        self.conn.executemany("INSERT OR REPLACE INTO current SELECT style_key, day, id FROM entries "
+                              "WHERE style_key = ? AND day = ? AND content_hash = ?", [(r[2], r[0], r[11]) for r in rows])
+        self.conn.commit()
+        return added
+
+    def _period(self, month):
+        return ("c.day >= ? AND c.day < ?", month_range(month)) if month else ("1 = 1", ())
+
+    def style_history(self, style, month=None):
+        """Day-by-day figures of one style (case-insensitive), oldest first."""
+        where, params = self._period(month)
+        rows = self.conn.execute(f"SELECT c.day, style, buyer, gauge, output, mc, aver_min, smv, {EFFICIENCY} AS efficiency "
+                                 f"FROM {LATEST} WHERE c.style_key = ? AND {where} GROUP BY c.day ORDER BY c.day",
+                                 (style.strip().casefold(), *params))
+        return [dict(r) for r in rows]
+
+    def gauge_efficiency(self, month=None):
+        """Output and efficiency per month and gauge."""
+        where, params = self._period(month)
+        rows = self.conn.execute(f"SELECT substr(c.day, 1, 7) AS month, gauge, COUNT(DISTINCT c.style_key) AS styles, "
+                                 f"COUNT(DISTINCT c.day) AS days, SUM(output) AS output, {EFFICIENCY} AS efficiency "
+                                 f"FROM {LATEST} WHERE {where} GROUP BY month, gauge ORDER BY month, gauge", params)
+        return [dict(r) for r in rows]
+
+    def ranked_styles(self, month=None, limit=10, bottom=False):
+        """Styles by efficiency over the period, best first (worst first with bottom=True)."""
+        where, params = self._period(month)
+        rows = self.conn.execute(f"SELECT style, buyer, gauge, COUNT(*) AS days, SUM(output) AS output, {EFFICIENCY} AS efficiency "
+                                 f"FROM {LATEST} WHERE {where} GROUP BY c.style_key HAVING efficiency IS NOT NULL "
+                                 f"ORDER BY efficiency {'ASC' if bottom else 'DESC'} LIMIT ?", (*params, limit))
+        return [dict(r) for r in rows]
+
+def backfill(store, paths, log=print):
+    # Old reports go through the engine's own extraction, so they land exactly like live runs
+    from ie_engine import IEAutomationEngine
+    engine = IEAutomationEngine(log_callback=lambda msg: None, history_path="")
+    for path in paths:
+        entries = engine.read_supervisor_file(path)
+        added = store.append([{**e, 'style': engine.clean_style_name(e['style'])} for e in entries], os.path.basename(path))
+        log(f"{os.path.basename(path)}: {added} new of {len(entries)} entries")
+
+def percent(value):
+    return f"{value * 100:6.1f}%" if value is not None else f"{'-':>7}"
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Query the IE supervisor history store.")
+    parser.add_argument("--db", help="History file (default $IE_HISTORY_DB or ~/.ie_history.sqlite)")
+    parser.add_argument("--json", action="store_true", help="Print the rows as JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+    style = commands.add_parser("style", help="Daily figures of one style")
+    style.add_argument("style")
+    style.add_argument("--month", metavar="YYYY-MM")
+    gauges = commands.add_parser("gauges", help="Monthly efficiency by gauge")
+    gauges.add_argument("--month", metavar="YYYY-MM")
+    top = commands.add_parser("top", help="Most (or least) efficient styles")
+    top.add_argument("--month", metavar="YYYY-MM")
+    top.add_argument("-n", type=int, default=10)
+    top.add_argument("--bottom", action="store_true")
+    backfill_cmd = commands.add_parser("import", help="Add old supervisor reports to the store")
+    backfill_cmd.add_argument("supervisor", nargs="+")
+    return parser
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "month", None):
+        try: month_range(args.month)
+        except ValueError: parser.error("--month must look like YYYY-MM")
+
+    with HistoryStore(args.db) as store:
+        if args.command == "import":
+            backfill(store, args.supervisor)
+            return 0
+        if args.command == "style":
+            rows = store.style_history(args.style, args.month)
+            line = lambda r: f"{r['day']}  {r['style']:<20} {r['gauge']:>5} {r['output']:8.0f} {r['mc']:5.0f} {percent(r['efficiency'])}"
+        elif args.command == "gauges":
+            rows = store.gauge_efficiency(args.month)
+            line = lambda r: f"{r['month']}  {r['gauge'] or '-':>5} {r['styles']:4d} style(s) {r['days']:3d} day(s) {r['output']:10.0f} {percent(r['efficiency'])}"
+        else:
+            rows = store.ranked_styles(args.month, args.n, args.bottom)
+            line = lambda r: f"{r['style']:<20} {r['buyer']:<10} {r['gauge']:>5} {r['days']:3d} day(s) {r['output']:10.0f} {percent(r['efficiency'])}"
+
+    if args.json: print(json.dumps(rows, indent=1))
+    elif rows:
+        for r in rows: print(line(r))
+    else: print("No history for that query.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""Watch-folder daemon: applies supervisor reports to one master as they arrive.
+
+    python ie_watch.py REPORTS_FOLDER --master Block-01.xlsx [--pattern "*.xlsx"]
+                       [--interval 5] [--settle 10] [--retry 60] [--once]
+
+The folder is polled (no extra packages needed, works on network shares). A
+report is picked up once its size and modification time have not changed for
+--settle seconds, and only if its content hash differs from the version last
+applied, so re-saved but unchanged files cost nothing. Ready reports are queued
+and a single writer thread applies them with IEAutomationEngine.run(), together
+with the reports already applied for the master's current month: the Date Wise
+and TOTAL SUMMARY tables are rebuilt from the reports of a run, and the
+incremental ledger still writes only new or changed rows to the style sheets.
+Reports of other months, or whose styles --rollover archived, are not read
+again. Applied hashes, months and styles are kept in <master>.watch.json, so a
+restarted watcher does not re-apply anything.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import openpyxl
+
+from ie_engine import (IEAutomationEngine, ArchiveIndex, DateDetector, MasterLockedError, acquire_master_lock, refresh_master_lock,
+                       release_master_lock, file_sha1, EXIT_OK, EXIT_ERROR)
+
+class FolderWatcher:
+    """Polls a folder for new or changed supervisor workbooks and applies them to one master.
+
+    scan() runs on the caller's thread and only reads; every engine run happens on
+    the writer thread, one batch at a time, so the master never has two writers.
+    """
+    VERSION = 1
+
+    def __init__(self, engine, folder, master_path, pattern="*.xlsx", interval=5, settle=10, retry=60):
+        self.engine = engine
+        self.folder = folder
+        self.master_path = master_path
+        self.pattern = pattern
+        self.interval = interval
+        self.settle = settle
+        self.retry = retry
+        self.state_path = os.path.splitext(master_path)[0] + ".watch.json"
+        self.applied = self.load_state()  # file name -> {"size", "mtime_ns", "sha1", "months", "styles"} of the version applied
+        self.seen = {}                    # file name -> ((size, mtime_ns), monotonic time that stamp was first seen)
+        self.queued = set()
+        self.retry_at = {}                # file name -> monotonic time a failed file may be tried again
+        self.queue = queue.Queue()
+        self.mutex = threading.Lock()
+        self.stop_event = threading.Event()
+
+    # --- State & Lock ---
+    def load_state(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.VERSION: return data.get("files", {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "master": os.path.basename(self.master_path), "files": self.applied},
+                      f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def acquire_lock(self):
+        # Shared with ie_batch.py: one writer per master, whichever tool it is
+        acquire_master_lock(self.master_path, "ie_watch.py")
+
+    def release_lock(self):
+        release_master_lock(self.master_path)
+
+    # --- Scanning ---
+    def is_report(self, name):
+        # Skips Excel owner files (~$x.xlsx), our own temp saves (~ie_*) and the master with its sidecars
+        master_stem = os.path.splitext(os.path.basename(self.master_path))[0]
+        if name.startswith("~") or name == os.path.basename(self.master_path) or name.startswith(master_stem + "."): return False
+        return fnmatch.fnmatch(name.lower(), self.pattern.lower())
+
+    def scan(self, now=None):
+        """Queues every report that has settled and changed since it was last applied; returns their names."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        try: names = sorted(os.listdir(self.folder))
+        except OSError as e:
+            self.engine.log(f"Watch: cannot list {self.folder} ({e}).")
+            return ready
+        for name in names:
+            if not self.is_report(name): continue
+            path = os.path.join(self.folder, name)
+            try: st = os.stat(path)
+            except OSError: continue
+            stamp = (st.st_size, st.st_mtime_ns)
+            with self.mutex:
+                applied = self.applied.get(name)
+                if applied and (applied["size"], applied["mtime_ns"]) == stamp: continue
+                if name in self.queued or now < self.retry_at.get(name, 0): continue
+            seen = self.seen.get(name)
+            if seen is None or seen[0] != stamp:
+                # (Re)start the settle clock; a file already older than --settle counts as settled
+                self.seen[name] = (stamp, now - max(0.0, time.time() - st.st_mtime))
+                seen = self.seen[name]
+            if now - seen[1] < self.settle: continue
+            try: digest = file_sha1(path)
+            except OSError: continue  # still open for writing (Excel locks it on Windows)
+            with self.mutex:
+                if applied and applied["sha1"] == digest:
+                    # Saved again without changes: remember the new stamp, nothing to apply
+                    self.applied[name] = dict(applied, size=stamp[0], mtime_ns=stamp[1])
+                    self.save_state()
+                    continue
+                self.queued.add(name)
+            self.queue.put((st.st_mtime_ns, name, stamp, digest))
+            ready.append(name)
+        return ready
+
+    # --- Single Writer ---
+    def summary_month(self):
+        # 'YYYY-MM' of the master's Date Wise Summary sheet (None if it has none)
+        try:
+            wb = openpyxl.load_workbook(self.master_path, read_only=True)
+        except Exception:
+            return None
+        try:
+            return next((IEAutomationEngine.summary_sheet_month(n) for n in wb.sheetnames if n.lower().startswith("date wise summary")), None)
+        finally:
+            wb.close()
+
+    def is_live(self, info, month, archive):
+        # Applied by a watcher that did not record scopes yet: still re-fed
+        if "months" not in info: return True
+        archived = {style: {e["month"] for e in archive.find(style)} for style in info["styles"]}
+        return any(m not in months for m in info["months"] if month is None or m == month for months in archived.values())
+
+    def run_reports(self, batch):
+        # The new reports plus the applied ones still in the folder that cover the master's
+        # current month (summaries only cover the days of the run); earlier months and
+        # styles moved out by --rollover are left alone
+        names = {name for _, name, _, _ in batch}
+        month, archive = self.summary_month(), ArchiveIndex(self.master_path)
+        with self.mutex:
+            earlier = [(info["mtime_ns"], name) for name, info in self.applied.items()
+                       if name not in names and os.path.isfile(os.path.join(self.folder, name)) and self.is_live(info, month, archive)]
+        # Oldest first: where two reports disagree on a (date, style), the newest one wins the merge
+        return [name for _, name in sorted(earlier + [(mtime_ns, name) for mtime_ns, name, _, _ in batch])]
+
+    def apply(self, batch):
+        batch.sort()
+        names = [name for _, name, _, _ in batch]
+        reports = self.run_reports(batch)
+        self.engine.log(f"Watch: applying {len(names)} report(s): {', '.join(names)}"
+                        + (f" (with {len(reports) - len(names)} applied before)" if len(reports) > len(names) else ""))
+        try:
+            result = self.engine.run([os.path.join(self.folder, n) for n in reports], self.master_path)
+        except Exception as e:
+            self.engine.log(f"Watch: run failed ({e}); retrying in {self.retry}s.")
+            with self.mutex:
+                for name in names: self.retry_at[name] = time.monotonic() + self.retry
+        else:
+            scopes = result.get("file_scopes", {})
+            with self.mutex:
+                for _, name, stamp, digest in batch:
+                    scope = scopes.get(os.path.join(self.folder, name), {})
+                    self.applied[name] = {"size": stamp[0], "mtime_ns": stamp[1], "sha1": digest, **scope}
+                    self.retry_at.pop(name, None)
+                self.save_state()
+            self.engine.log(f"Watch: {result['status']}, {result['updated']} row(s) written to {os.path.basename(self.master_path)}.")
+        finally:
+            with self.mutex: self.queued.difference_update(names)
+
+    def take_batch(self, first):
+        # Everything that became ready while the previous run was busy goes into one run
+        batch = [first]
+        while not self.queue.empty(): batch.append(self.queue.get_nowait())
+        return batch
+
+    def writer_loop(self):
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            try: first = self.queue.get(timeout=self.interval)
+            except queue.Empty: continue
+            self.apply(self.take_batch(first))
+
+    def run_forever(self):
+        self.acquire_lock()
+        writer = threading.Thread(target=self.writer_loop, name="ie-watch-writer", daemon=True)
+        writer.start()
+        self.engine.log(f"Watch: {self.folder} -> {self.master_path} (every {self.interval}s, settle {self.settle}s). Ctrl+C stops.")
+        try:
+            while not self.stop_event.is_set():
+                refresh_master_lock(self.master_path)
+                self.scan()
+                self.stop_event.wait(self.interval)
+        except KeyboardInterrupt:
+            self.engine.log("Watch: stopping after the current run...")
+        finally:
+            self.stop_event.set()
+            writer.join()
+            self.release_lock()
+
+    def run_once(self):
+        """One scan and apply, without waiting for files that are still settling."""
+        self.acquire_lock()
+        try:
+            ready = self.scan()
+            if ready: self.apply(self.take_batch(self.queue.get_nowait()))
+            return ready
+        finally:
+            self.release_lock()
+
+    def stop(self):
+        self.stop_event.set()
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Apply supervisor reports dropped into a folder to an IE master workbook.")
+    parser.add_argument("folder", help="Folder the supervisors save their daily reports to")
+    parser.add_argument("--master", "-m", required=True, help="Master workbook (with FORMATE sheet)")
+    parser.add_argument("--pattern", default="*.xlsx", help="Report file names to pick up (default *.xlsx)")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between folder scans")
+    parser.add_argument("--settle", type=float, default=10, help="Seconds a file must stay unchanged before it is read")
+    parser.add_argument("--retry", type=float, default=60, help="Seconds before a failed report is tried again")
+    parser.add_argument("--once", action="store_true", help="Apply what is ready now and exit")
+    parser.add_argument("--month-first", action="store_true", help="Supervisor dates are MM/DD/YYYY instead of DD/MM/YYYY")
+    parser.add_argument("--two-digit-years", action="store_true", help="Accept DD/MM/YY report dates (20YY)")
+    return parser
+
+def main(argv=None):
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.folder): parser.error(f"not a folder: {args.folder}")
+    if not os.path.isfile(args.master): parser.error(f"master not found: {args.master}")
+
+    engine = IEAutomationEngine(date_detector=DateDetector(day_first=not args.month_first, two_digit_years=args.two_digit_years))
+    watcher = FolderWatcher(engine, args.folder, args.master, args.pattern, args.interval, args.settle, args.retry)
+    try:
+        if args.once:
+            if not watcher.run_once(): engine.log("Watch: no new or changed reports.")
+        else:
+            watcher.run_forever()
+    except MasterLockedError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    return EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
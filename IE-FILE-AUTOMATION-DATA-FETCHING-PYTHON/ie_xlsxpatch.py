@@ -0,0 +1,256 @@
+"""Partial save: patch the changed cells of a loaded workbook into its original xlsx package.
+
+openpyxl serialises every sheet, chart and drawing on save, so one changed cell
+costs as much as rewriting the whole master. patch_package() instead copies
+every untouched part of the original file as the compressed bytes it already
+is (PackageWriter, nothing is inflated or deflated again), re-renders only the
+changed cells of the changed sheets (the other cells of their rows keep their
+original XML, rich text included), appends new strings to the shared string
+table (or writes them inline, as openpyxl does) and drops the calculation chain
+(Excel rebuilds it on load). Its cost follows the size of the change.
+
+Anything that cannot be expressed that way (new, removed or renamed sheets,
+inserted rows, replaced charts, changed merges, cell formats the file does not
+have yet, shared formulas) raises PatchUnsupported, and the caller saves in full.
+"""
+import io
+import os
+import posixpath
+import re
+import struct
+import tempfile
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from xml.sax.saxutils import escape
+
+from openpyxl.compat import safe_string
+from openpyxl.utils import column_index_from_string
+from openpyxl.utils.datetime import to_excel
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_DOC_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+SHEET_DATA = re.compile(r"<sheetData\s*/>|<sheetData>(.*?)</sheetData>", re.S)
+ROW = re.compile(r"<row\b([^>]*?)(?:/>|>(.*?)</row>)", re.S)
+ROW_NUMBER = re.compile(r'\br="(\d+)"')
+CELL = re.compile(r"<c\b([^>]*?)(?:/>|>(.*?)</c>)", re.S)
+CELL_REF = re.compile(r'\br="([A-Z]+)\d+"')
+SPANS = re.compile(r'\s+spans="[^"]*"')
+DIMENSION = re.compile(r'<dimension ref="[^"]*"\s*/>')
+
+class PatchUnsupported(Exception):
+    """The change needs a full openpyxl save."""
+
+class PackageParts:
+    """Where the workbook, its sheets, shared strings and calc chain live inside the zip."""
+    def __init__(self, zin):
+        root_rels = ET.fromstring(zin.read("_rels/.rels"))
+        self.workbook = next(self.resolve("", r.get("Target")) for r in root_rels if r.get("Type", "").endswith("/officeDocument"))
+        self.workbook_rels = posixpath.join(posixpath.dirname(self.workbook), "_rels", posixpath.basename(self.workbook) + ".rels")
+        base = posixpath.dirname(self.workbook)
+        rels = {r.get("Id"): (r.get("Type", ""), self.resolve(base, r.get("Target"))) for r in ET.fromstring(zin.read(self.workbook_rels))}
+        self.by_type = {kind.rsplit("/", 1)[-1]: part for kind, part in rels.values()}
+        book = ET.fromstring(zin.read(self.workbook))
+        self.sheets = {s.get("name"): rels[s.get(f"{{{NS_DOC_REL}}}id")][1] for s in book.iter(f"{{{NS_MAIN}}}sheet")}
+
+    @staticmethod
+    def resolve(base, target):
+        return target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base, target))
+
+class SharedStrings:
+    """The package's shared string table; new strings are appended, existing indices never move."""
+    def __init__(self, xml):
+        self.xml = xml
+        self.index = {}
+        self.count = 0
+        for _, el in ET.iterparse(io.BytesIO(xml)):
+            if el.tag != f"{{{NS_MAIN}}}si": continue
+            t = el.find(f"{{{NS_MAIN}}}t")
+            if t is not None and len(el) == 1: self.index.setdefault(t.text or "", self.count)  # plain text only, not rich runs
+            self.count += 1
+            el.clear()
+        self.added = []
+
+    def get(self, text):
+        idx = self.index.get(text)
+        if idx is None:
+            idx = self.index[text] = self.count + len(self.added)
+            self.added.append(text)
+        return idx
+
+    def render(self):
+        text = self.xml.decode("utf-8")
+        end = text.rfind("</sst>")
+        if end < 0: raise PatchUnsupported("empty shared string table")
+        items = "".join(f'<si><t xml:space="preserve">{escape(s)}</t></si>' for s in self.added)
+        head = re.sub(r'uniqueCount="\d+"', f'uniqueCount="{self.count + len(self.added)}"', text[:end], count=1)
+        head = re.sub(r'(<sst\b[^>]*?)\s+count="\d+"', r"\1", head, count=1)  # total reference count is optional; a wrong one is not
+        return (head + items + text[end:]).encode("utf-8")
+
+def cell_xml(cell, style_id, strings, epoch):
+    head = f'<c r="{cell.coordinate}"' + (f' s="{style_id}"' if style_id else "")
+    value, kind = cell._value, cell.data_type
+    if value is None or value == "": return head + "/>"
+    if kind == "f":
+        if not isinstance(value, str): raise PatchUnsupported(f"{cell.coordinate}: array or table formula")
+        return f"{head}><f>{escape(value[1:])}</f><v></v></c>"
+    if kind == "s":
+        if not isinstance(value, str): raise PatchUnsupported(f"{cell.coordinate}: rich text")
+        if strings is None: return f'{head} t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+        return f'{head} t="s"><v>{strings.get(value)}</v></c>'
+    if kind == "b": return f'{head} t="b"><v>{int(value)}</v></c>'
+    if kind == "e": return f'{head} t="e"><v>{escape(str(value))}</v></c>'
+    if kind == "d": value = to_excel(value, epoch)
+    return f"{head}><v>{safe_string(value)}</v></c>"  # same number text as an openpyxl save
+
+def patch_sheet(xml, ws, cells, style_count, strings):
+    """Re-renders `cells` ({(row, column)}) of ws into its original sheet XML; every other
+    cell, and every row without a changed cell, keeps its original bytes."""
+    text = xml.decode("utf-8")
+    if 't="shared"' in text: raise PatchUnsupported(f"{ws.title}: shared formulas")
+    data = SHEET_DATA.search(text)
+    if data is None: raise PatchUnsupported(f"{ws.title}: no sheetData")
+    original = {}
+    for match in ROW.finditer(data.group(1) or ""):
+        number = ROW_NUMBER.search(match.group(1))
+        if number is None: raise PatchUnsupported(f"{ws.title}: row without a number")
+        original[int(number.group(1))] = match
+
+    dirty = defaultdict(set)
+    for r, c in cells: dirty[r].add(c)
+    epoch = ws.parent.epoch
+    out = {r: m.group(0) for r, m in original.items()}
+    for r, columns in dirty.items():
+        row_cells = {}  # column -> cell XML
+        if r in original:
+            for match in CELL.finditer(original[r].group(2) or ""):
+                ref = CELL_REF.search(match.group(1))
+                if ref is None: raise PatchUnsupported(f"{ws.title}: cell without a reference in row {r}")
+                row_cells[column_index_from_string(ref.group(1))] = match.group(0)
+        for c in columns:
+            cell = ws._cells.get((r, c))
+            if cell is None:
+                row_cells.pop(c, None)
+                continue
+            style_id = cell.style_id
+            if style_id >= style_count: raise PatchUnsupported(f"{ws.title}!{cell.coordinate}: cell format not in the file yet")
+            row_cells[c] = cell_xml(cell, style_id, strings, epoch)
+        attrs = SPANS.sub("", original[r].group(1)) if r in original else f' r="{r}"'
+        if row_cells: out[r] = f"<row{attrs}>{''.join(row_cells[c] for c in sorted(row_cells))}</row>"
+        elif r in original: out[r] = f"<row{attrs}/>"
+    sheet_data = "<sheetData>" + "".join(out[r] for r in sorted(out)) + "</sheetData>"
+    text = text[:data.start()] + sheet_data + text[data.end():]
+    text = DIMENSION.sub(f'<dimension ref="{ws.calculate_dimension()}"/>', text, count=1)
+    return text.encode("utf-8")
+
+def drop_calc_chain(patched, zin, parts):
+    # Cached calculation order for the old formulas; without it Excel rebuilds the chain on load
+    chain = parts.by_type.get("calcChain")
+    if chain is None: return set()
+    types = zin.read("[Content_Types].xml").decode("utf-8")
+    patched["[Content_Types].xml"] = re.sub(rf'<Override[^>]*PartName="/{re.escape(chain)}"[^>]*/>', "", types).encode("utf-8")
+    rels = zin.read(parts.workbook_rels).decode("utf-8")
+    patched[parts.workbook_rels] = re.sub(r'<Relationship[^>]*Type="[^"]*/calcChain"[^>]*/>', "", rels).encode("utf-8")
+    book = patched.get(parts.workbook, zin.read(parts.workbook)).decode("utf-8")
+    if "<calcPr" in book and "fullCalcOnLoad" not in book:
+        patched[parts.workbook] = book.replace("<calcPr", '<calcPr fullCalcOnLoad="1"', 1).encode("utf-8")
+    return {chain}
+
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+ZIP32_LIMIT = 0xFFFFFFFF
+
+class PackageWriter:
+    """Writes the patched package: untouched members go across as the compressed bytes they
+    are in the source file, patched ones are deflated here. Only the documented ZipInfo
+    fields of the source are used; packages that would need zip64 raise PatchUnsupported."""
+    def __init__(self, fp):
+        self.fp = fp
+        self.central = []
+
+    def add(self, info, method, crc, compress_size, file_size, write_data):
+        name = info.filename.encode("utf-8")
+        flags = 0x800 if not info.filename.isascii() else 0  # UTF-8 name; sizes are in the local header, no data descriptor
+        if method == zipfile.ZIP_DEFLATED: flags |= info.flag_bits & 0x06  # compression level bits, informational
+        offset = self.fp.tell()
+        if max(offset, compress_size, file_size) > ZIP32_LIMIT: raise PatchUnsupported(f"{info.filename}: zip64 package")
+        year, month, day, hour, minute, second = info.date_time
+        dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+        dos_time = hour << 11 | minute << 5 | second // 2
+        self.fp.write(LOCAL_HEADER.pack(b"PK\x03\x04", 20, 0, flags, method, dos_time, dos_date, crc,
+                                        compress_size, file_size, len(name), 0) + name)
+        write_data()
+        self.central.append(CENTRAL_HEADER.pack(b"PK\x01\x02", 20, info.create_system, 20, 0, flags, method, dos_time, dos_date,
+                                                crc, compress_size, file_size, len(name), 0, 0, 0, info.internal_attr,
+                                                info.external_attr, offset) + name)
+
+    def copy(self, src, info):
+        # The member's compressed bytes, found through its local header in the source file
+        if info.flag_bits & 0x01: raise PatchUnsupported(f"{info.filename}: encrypted")
+        src.seek(info.header_offset)
+        header = src.read(LOCAL_HEADER.size)
+        if len(header) != LOCAL_HEADER.size or header[:4] != b"PK\x03\x04": raise PatchUnsupported(f"{info.filename}: unreadable zip entry")
+        name_len, extra_len = LOCAL_HEADER.unpack(header)[-2:]
+        src.seek(info.header_offset + LOCAL_HEADER.size + name_len + extra_len)
+        def write_data():
+            remaining = info.compress_size
+            while remaining:
+                chunk = src.read(min(remaining, 1 << 20))
+                if not chunk: raise PatchUnsupported(f"{info.filename}: truncated zip entry")
+                self.fp.write(chunk)
+                remaining -= len(chunk)
+        self.add(info, info.compress_type, info.CRC, info.compress_size, info.file_size, write_data)
+
+    def write(self, info, data):
+        deflate = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        payload = deflate.compress(data) + deflate.flush()
+        self.add(info, zipfile.ZIP_DEFLATED, zlib.crc32(data), len(payload), len(data), lambda: self.fp.write(payload))
+
+    def close(self):
+        start = self.fp.tell()
+        for entry in self.central: self.fp.write(entry)
+        size = self.fp.tell() - start
+        if len(self.central) > 0xFFFF or start + size > ZIP32_LIMIT: raise PatchUnsupported("zip64 package")
+        self.fp.write(END_RECORD.pack(b"PK\x05\x06", 0, 0, len(self.central), len(self.central), size, start, 0))
+
+def patch_package(wb, src_path, dest_path, dirty_cells, style_count):
+    """Writes dest_path as src_path with the cells in dirty_cells ({worksheet: {(row, column)}})
+    re-rendered from wb. style_count is len(wb._cell_styles) right after loading.
+    Returns (parts rewritten, parts copied); raises PatchUnsupported before writing anything."""
+    with zipfile.ZipFile(src_path) as zin:
+        parts = PackageParts(zin)
+        # Packages openpyxl wrote have no shared string table: their strings are inline, and so are ours
+        strings = SharedStrings(zin.read(parts.by_type["sharedStrings"])) if "sharedStrings" in parts.by_type else None
+        patched = {}
+        for ws, cells in dirty_cells.items():
+            if not cells: continue
+            part = parts.sheets.get(ws.title)
+            if part is None: raise PatchUnsupported(f"{ws.title}: not in the original file")
+            patched[part] = patch_sheet(zin.read(part), ws, cells, style_count, strings)
+        if strings and strings.added: patched[parts.by_type["sharedStrings"]] = strings.render()
+        dropped = drop_calc_chain(patched, zin, parts) if patched else set()
+
+        folder = os.path.dirname(os.path.abspath(dest_path))
+        fd, tmp_path = tempfile.mkstemp(prefix="~ie_", suffix=os.path.splitext(dest_path)[1] or ".xlsx", dir=folder)
+        os.close(fd)
+        copied = 0
+        try:
+            with open(src_path, "rb") as src, open(tmp_path, "wb") as dst:
+                out = PackageWriter(dst)
+                for info in zin.infolist():
+                    if info.filename in dropped: continue
+                    if info.filename in patched:
+                        out.write(info, patched[info.filename])
+                    else:
+                        out.copy(src, info)
+                        copied += 1
+                out.close()
+        except Exception:
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, dest_path)
+    return len(patched), copied
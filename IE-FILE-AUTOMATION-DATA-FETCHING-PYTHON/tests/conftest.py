@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The engine modules sit in the project folder; the synthetic workbooks come from the benchmark workload
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), "benchmarks"))
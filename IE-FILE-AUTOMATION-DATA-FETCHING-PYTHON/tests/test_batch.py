@@ -0,0 +1,83 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+import ie_engine
+from ie_batch import load_manifest, run_block
+from ie_engine import DateDetector, MasterLockedError, acquire_master_lock, master_lock_path, release_master_lock
+from workload import make_master_workbook, make_supervisor_workbook
+
+OPTIONS = {"full": False, "partial_save": False, "history_db": "", "date_config": DateDetector().config()}
+
+def write_manifest(folder, blocks):
+    path = folder / "factory.json"
+    path.write_text(json.dumps({"blocks": blocks}), encoding="utf-8")
+    return str(path)
+
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+def test_manifest_merges_entries_naming_the_same_master(tmp_path):
+    (tmp_path / "B01").mkdir()
+    (tmp_path / "B02").mkdir()
+    os.symlink("B01", tmp_path / "current")
+    manifest = write_manifest(tmp_path, [
+        {"master": "B01/master.xlsx", "supervisor": ["r1.xlsx"]},
+        {"master": "B02/master.xlsx", "supervisor": "r2.xlsx"},
+        {"master": "./B01/../B01/master.xlsx", "supervisor": ["r1.xlsx", "r3.xlsx"]},
+        {"master": "current/master.xlsx", "supervisor": ["r4.xlsx"]},
+    ])
+    jobs = load_manifest(manifest)
+    assert [(name, [os.path.basename(p) for p in sups]) for name, _, sups in jobs] == [
+        ("B01/master", ["r1.xlsx", "r3.xlsx", "r4.xlsx"]),
+        ("B02/master", ["r2.xlsx"]),
+    ]
+
+def make_block(tmp_path, files=1):
+    master = make_master_workbook(str(tmp_path / "master.xlsx"))
+    reports = [make_supervisor_workbook(str(tmp_path / f"r{i}.xlsx"), styles=2, days=2, seed=i + 1) for i in range(files)]
+    return master, reports
+
+def test_locked_master_is_skipped(tmp_path):
+    master, reports = make_block(tmp_path)
+    acquire_master_lock(master, "ie_watch.py")
+    try:
+        summary = run_block("master", master, reports, OPTIONS)
+    finally:
+        release_master_lock(master)
+    assert summary["status"] == "locked"
+    assert "ie_watch.py" in summary["error"]
+    assert not os.path.exists(master_lock_path(master))
+
+@pytest.mark.parametrize("content", ["json", "bare pid"])
+def test_stale_lock_is_taken_over(tmp_path, content):
+    master, reports = make_block(tmp_path)
+    pid = dead_pid()
+    with open(master_lock_path(master), "w") as f:
+        if content == "json": json.dump({"pid": pid, "host": socket.gethostname(), "owner": "ie_watch.py"}, f)
+        else: f.write(str(pid))  # what earlier versions wrote
+    summary = run_block("master", master, reports, OPTIONS)
+    assert summary["status"] == "ok"
+    assert not os.path.exists(master_lock_path(master))
+
+def test_live_lock_from_this_process_is_kept(tmp_path):
+    master, _ = make_block(tmp_path)
+    acquire_master_lock(master, "ie_batch.py")
+    with pytest.raises(MasterLockedError):
+        acquire_master_lock(master, "ie_watch.py")
+    release_master_lock(master)
+    assert not os.path.exists(master_lock_path(master))
+
+def test_block_worker_reads_supervisor_files_serially(tmp_path, monkeypatch, capsys):
+    master, reports = make_block(tmp_path, files=2)
+    def no_pool(*args, **kwargs): raise AssertionError("block workers must not start a process pool")
+    monkeypatch.setattr(ie_engine, "ProcessPoolExecutor", no_pool)
+    summary = run_block("master", master, reports, OPTIONS)
+    assert summary["status"] == "ok"
+    assert "Parallel read unavailable" not in capsys.readouterr().out
@@ -0,0 +1,75 @@
+import openpyxl
+
+from ie_formulas import DIV0, REF, FormulaEvaluator, materialise_values
+
+def summary_workbook():
+    # Shaped like a Date Wise Summary: gauge class in row 5, metric in row 6, one day in row 7
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Date Wise Summary OCT-2025"
+    for c, (gauge, metric, value) in enumerate((("Fine", "Acv", 10), ("Fine", "W.Min", 600), ("Coarse", "Acv", 7),
+                                                 ("Coarse", "W.Min", 480), ("Fine", "Acv", 5)), 2):
+        ws.cell(5, c, gauge); ws.cell(6, c, metric); ws.cell(7, c, value)
+    style = wb.create_sheet("ST-100")
+    style["D17"] = 120
+    style["K11"] = 12.5
+    return wb, ws
+
+def test_sumifs_with_several_criteria_pairs_on_absolute_ranges():
+    wb, ws = summary_workbook()
+    ws["H7"] = '=SUMIFS($B7:$F7,$B$5:$F$5,"Fine",$B$6:$F$6,"Acv")'
+    ws["I7"] = '=SUMIFS($B7:$F7,$B$5:$F$5,"<>Fine",$B$6:$F$6,"W.*")'
+    ws["J7"] = '=SUMIFS($B7:$F7,$B$5:$F$5,"Fine",$B$6:$F$6,"Prod.Min")'
+    ws["K7"] = '=SUMIFS($B7:$F7,$B$5:$F$5,"Fine",$B$6:$F$6)'  # unpaired criteria range
+    ev = FormulaEvaluator(wb)
+    assert ev.value(ws.title, 7, 8) == 15
+    assert ev.value(ws.title, 7, 9) == 480
+    assert ev.value(ws.title, 7, 10) == 0
+    assert ev.value(ws.title, 7, 11).code == "#VALUE!"
+
+def test_iferror_over_div0():
+    wb, ws = summary_workbook()
+    ws["H7"] = "=B7/Z7"                  # blank divisor
+    ws["I7"] = "=IFERROR(B7/Z7,0)"
+    ws["J7"] = "=IFERROR(H7*2,-1)"       # the error comes from another cell
+    ws["K7"] = "=IFERROR(C7/B7,0)"
+    ev = FormulaEvaluator(wb)
+    assert ev.value(ws.title, 7, 8) == DIV0
+    assert ev.value(ws.title, 7, 9) == 0
+    assert ev.value(ws.title, 7, 10) == -1
+    assert ev.value(ws.title, 7, 11) == 60
+
+def test_quoted_cross_sheet_references():
+    wb, ws = summary_workbook()
+    ws["H7"] = "='ST-100'!D17"
+    ws["I7"] = "=H7*'ST-100'!K$11"
+    ws["J7"] = "='st-100'!$D$17+1"       # sheet names are case-insensitive
+    ws["K7"] = "='ST-999'!D17"
+    ev = FormulaEvaluator(wb)
+    assert ev.value(ws.title, 7, 8) == 120
+    assert ev.value(ws.title, 7, 9) == 1500
+    assert ev.value(ws.title, 7, 10) == 121
+    assert ev.value(ws.title, 7, 11) == REF
+
+def test_circular_reference_is_ref_error():
+    wb, ws = summary_workbook()
+    ws["H7"] = "=I7+1"
+    ws["I7"] = "=H7*2"
+    ws["J7"] = "=B7+1"
+    computed, unsupported = materialise_values(wb)
+    assert (computed, unsupported) == (3, 0)
+    assert ws["H7"].value == ws["I7"].value == "#REF!"
+    assert ws["J7"].value == 11
+
+def test_unsupported_function_is_left_for_excel():
+    # openpyxl saves formulas without a cached result: an unsupported one stays a
+    # formula, and so does everything computed from it
+    wb, ws = summary_workbook()
+    ws["H7"] = "=VLOOKUP(B7,B7:F7,2,FALSE)"
+    ws["I7"] = "=H7+1"
+    ws["J7"] = "=SUM(B7:F7)"
+    computed, unsupported = materialise_values(wb)
+    assert (computed, unsupported) == (1, 2)
+    assert ws["H7"].value == "=VLOOKUP(B7,B7:F7,2,FALSE)"
+    assert ws["I7"].value == "=H7+1"
+    assert ws["J7"].value == 1102
@@ -0,0 +1,51 @@
+import os
+
+import openpyxl
+
+from ie_engine import IEAutomationEngine, IngestionLedger
+from workload import make_master_workbook, make_supervisor_workbook
+
+def make_run(tmp_path):
+    master = make_master_workbook(str(tmp_path / "master.xlsx"))
+    report = make_supervisor_workbook(str(tmp_path / "report.xlsx"), styles=3, days=4)
+    engine = IEAutomationEngine(log_callback=lambda msg: None, history_path="")
+    return engine, report, master
+
+def test_second_run_skips_applied_rows(tmp_path):
+    engine, report, master = make_run(tmp_path)
+    first = engine.run([report], master)
+    assert first["status"] == "ok"
+    assert first["pending"] == first["updated"] == first["entries"] == 12
+
+    stamp = os.stat(master).st_mtime_ns
+    second = engine.run([report], master)
+    assert second["status"] == "up_to_date"
+    assert second["pending"] == 0
+    assert os.stat(master).st_mtime_ns == stamp  # nothing saved
+
+def test_changed_row_is_applied_again(tmp_path):
+    engine, report, master = make_run(tmp_path)
+    engine.run([report], master)
+
+    wb = openpyxl.load_workbook(report)
+    wb["01"].cell(5, 11).value = 999  # 01-Oct, ST-100: Today
+    wb.save(report)
+    result = engine.run([report], master)
+    assert result["status"] == "ok"
+    assert result["pending"] == result["updated"] == 1
+
+    ws = openpyxl.load_workbook(master)["ST-100"]
+    assert ws["B17"].value == "01-Oct"
+    assert ws["D17"].value == 999
+
+def test_ledger_resets_when_master_changes_outside_the_tool(tmp_path):
+    engine, report, master = make_run(tmp_path)
+    engine.run([report], master)
+    ledger = IngestionLedger(master)
+    assert ledger.is_in_sync() and len(ledger.applied_hashes()) == 12
+    ledger.close()
+
+    openpyxl.load_workbook(master).save(master)  # edited and saved in Excel, say
+    result = engine.run([report], master)
+    assert result["status"] == "ok"
+    assert result["pending"] == result["entries"] == 12
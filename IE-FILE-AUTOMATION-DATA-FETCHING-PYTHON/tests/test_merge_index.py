@@ -0,0 +1,14 @@
+import openpyxl
+
+from ie_engine import merge_index_for
+
+def test_index_follows_an_unmerge_plus_a_merge_elsewhere():
+    ws = openpyxl.Workbook().active
+    ws.merge_cells("A1:B1")
+    assert merge_index_for(ws).find(1, 2).coord == "A1:B1"
+
+    ws.unmerge_cells("A1:B1")
+    ws.merge_cells("C3:D3")  # same number of ranges as before
+    index = merge_index_for(ws)
+    assert index.find(1, 2) is None
+    assert index.find(3, 4).coord == "C3:D3"
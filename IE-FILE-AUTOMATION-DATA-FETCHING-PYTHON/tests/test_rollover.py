@@ -0,0 +1,75 @@
+import re
+
+import openpyxl
+
+from ie_engine import ArchiveIndex, IEAutomationEngine
+from workload import make_master_workbook, make_supervisor_workbook
+
+SHEET_REF = re.compile(r"'([^']+)'!")
+
+def two_month_master(tmp_path, october_days=5):
+    # October: ST-100..ST-103; November: ST-102 and ST-103 carry on for three days
+    master = make_master_workbook(str(tmp_path / "master.xlsx"))
+    october = make_supervisor_workbook(str(tmp_path / "oct.xlsx"), styles=4, days=october_days, month=10)
+    november = make_supervisor_workbook(str(tmp_path / "nov.xlsx"), styles=2, days=3, month=11, first_style=2)
+    engine = IEAutomationEngine(log_callback=lambda msg: None, history_path="")
+    engine.run([october], master)
+    engine.run([november], master)
+    return engine, master
+
+def daily_rows(ws):
+    rows = []
+    for r in range(17, 100):
+        if ws.cell(r, 1).value == "Total": return rows, r
+        if ws.cell(r, 2).value: rows.append((r, ws.cell(r, 1).value, ws.cell(r, 2).value))
+
+def test_archive_summary_only_references_archived_sheets(tmp_path):
+    engine, master = two_month_master(tmp_path)
+    result = engine.rollover(master, "2025-11")
+    assert result["archived"] == {"2025-10": ["ST-100", "ST-101", "ST-102", "ST-103"]}
+    assert result["split"] == ["ST-102", "ST-103"]
+
+    wb = openpyxl.load_workbook(result["archives"][0])
+    summary = wb["Date Wise Summary OCT-2025"]
+    referenced = {m.group(1) for row in summary.iter_rows() for cell in row if isinstance(cell.value, str)
+                  for m in SHEET_REF.finditer(cell.value)}
+    assert referenced == {"ST-100", "ST-101", "ST-102", "ST-103"}
+    assert referenced <= set(wb.sheetnames)
+
+def test_sheets_with_days_in_both_months_are_split(tmp_path):
+    engine, master = two_month_master(tmp_path, october_days=31)  # the November days needed extra rows
+    result = engine.rollover(master, "2025-11")
+
+    archive = openpyxl.load_workbook(result["archives"][0])["ST-102"]
+    rows, total_row = daily_rows(archive)
+    assert [label for _, _, label in rows] == [f"{day:02d}-Oct" for day in range(1, 32)]
+    assert archive.cell(total_row, 4).value == f"=SUM(D17:D{total_row - 1})"
+    assert ArchiveIndex(master).find("ST-102")[0]["days"] == 31
+
+    wb = openpyxl.load_workbook(master)
+    assert "ST-100" not in wb.sheetnames
+    ws = wb["ST-102"]
+    rows, total_row = daily_rows(ws)
+    assert rows == [(17, 1, "01-Nov"), (18, 2, "02-Nov"), (19, 3, "03-Nov")]
+    assert ws["E17"].value == "=D17/C17"  # same-row formulas moved with their row
+    assert ws.cell(total_row, 4).value == f"=SUM(D17:D{total_row - 1})"
+    assert ws.cell(20, 1).value == 4 and ws.cell(20, 4).value is None
+
+def test_slim_master_summary_is_laid_out_for_the_kept_month(tmp_path):
+    engine, master = two_month_master(tmp_path)
+    engine.rollover(master, "2025-11")
+
+    wb = openpyxl.load_workbook(master)
+    assert [n for n in wb.sheetnames if n.startswith("Date Wise")] == ["Date Wise Summary NOV-2025"]
+    summary = wb["Date Wise Summary NOV-2025"]
+    assert [summary.cell(r, 1).value for r in range(7, 37)] == [f"{day:02d}-Nov" for day in range(1, 31)]
+    assert summary.cell(37, 1).value is None
+    assert [summary.cell(4, c).value for c in (2, 5)] == ["ST-102", "ST-103"]
+    assert summary["B7"].value == "='ST-102'!D17"
+    assert summary["B9"].value == "='ST-102'!D19"
+    assert summary["B10"].value == 0
+    assert summary["B37"].value == "=SUM(B7:B36)"
+
+    totals = wb["TOTAL SUMMARY"]
+    assert [totals.cell(r, 3).value for r in range(5, 8)] == ["ST-102", "ST-103", None]
+    assert all(cell.value is None for row in totals.iter_rows(min_row=35, max_col=14) for cell in row)
@@ -0,0 +1,27 @@
+import openpyxl
+
+from ie_engine import IEAutomationEngine, SummaryRowIndex
+from workload import make_master_workbook, make_supervisor_workbook
+
+def test_lookup_matches_whole_style_names():
+    ws = openpyxl.Workbook().active
+    for r, (s_no, style) in enumerate(((1, "ST-100"), (2, " st-10 "), (3, "ST-1000")), 5):
+        ws.cell(r, 1, s_no); ws.cell(r, 3, style)
+    index = SummaryRowIndex(ws)
+    assert index.lookup("ST-10") == 6
+    assert index.lookup("ST-100") == 5
+    assert index.lookup("ST-1") == index.free_row == 8
+
+def test_short_style_gets_its_own_total_summary_row(tmp_path):
+    master = make_master_workbook(str(tmp_path / "master.xlsx"))
+    report = make_supervisor_workbook(str(tmp_path / "report.xlsx"), styles=2, days=1)
+    wb = openpyxl.load_workbook(report)
+    wb["01"].cell(6, 3).value = "ST-10"  # the second style row, after ST-100
+    wb.save(report)
+    IEAutomationEngine(log_callback=lambda msg: None, history_path="").run([report], master)
+
+    ws = openpyxl.load_workbook(master)["TOTAL SUMMARY"]
+    rows = {ws.cell(r, 3).value: r for r in range(5, 8) if ws.cell(r, 3).value}
+    assert set(rows) == {"ST-100", "ST-10"}
+    assert ws.cell(rows["ST-10"], 9).value.startswith("='ST-10'!")
+    assert ws.cell(rows["ST-100"], 9).value.startswith("='ST-100'!")
@@ -0,0 +1,51 @@
+import os
+
+import openpyxl
+
+from ie_engine import IEAutomationEngine, file_sha1
+from ie_watch import FolderWatcher
+from workload import make_master_workbook, make_supervisor_workbook
+
+def watched_block(tmp_path):
+    # October's report applied, then November's, then the master rolled over to November
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    master = make_master_workbook(str(tmp_path / "master.xlsx"))
+    engine = IEAutomationEngine(log_callback=lambda msg: None, history_path="")
+    watcher = FolderWatcher(engine, str(reports), master, settle=0)
+    make_supervisor_workbook(str(reports / "oct.xlsx"), styles=4, days=5, month=10)
+    assert watcher.run_once() == ["oct.xlsx"]
+    make_supervisor_workbook(str(reports / "nov.xlsx"), styles=2, days=3, month=11, first_style=2)
+    assert watcher.run_once() == ["nov.xlsx"]
+    engine.rollover(master, "2025-11")
+    return watcher, reports, master
+
+def new_report(reports, name, **kwargs):
+    path = make_supervisor_workbook(str(reports / name), **kwargs)
+    st = os.stat(path)
+    return (st.st_mtime_ns, name, (st.st_size, st.st_mtime_ns), file_sha1(path))
+
+def test_applied_reports_record_their_months_and_styles(tmp_path):
+    watcher, _, _ = watched_block(tmp_path)
+    assert watcher.applied["oct.xlsx"]["months"] == ["2025-10"]
+    assert watcher.applied["oct.xlsx"]["styles"] == ["ST-100", "ST-101", "ST-102", "ST-103"]
+    assert watcher.applied["nov.xlsx"]["months"] == ["2025-11"]
+
+def test_only_reports_of_the_summary_month_are_read_again(tmp_path):
+    watcher, reports, _ = watched_block(tmp_path)
+    batch = [new_report(reports, "nov-b.xlsx", styles=1, days=4, month=11, first_style=4)]
+    assert watcher.run_reports(batch) == ["nov.xlsx", "nov-b.xlsx"]
+
+def test_reports_of_archived_styles_are_not_read_again(tmp_path):
+    watcher, reports, master = watched_block(tmp_path)
+    wb = openpyxl.load_workbook(master)
+    wb.remove(wb["Date Wise Summary NOV-2025"])  # no summary month to go by
+    wb.save(master)
+    batch = [new_report(reports, "nov-b.xlsx", styles=1, days=4, month=11, first_style=4)]
+    assert watcher.run_reports(batch) == ["nov.xlsx", "nov-b.xlsx"]
+
+def test_reports_applied_without_a_scope_are_still_read_again(tmp_path):
+    watcher, reports, _ = watched_block(tmp_path)
+    for key in ("months", "styles"): del watcher.applied["oct.xlsx"][key]
+    batch = [new_report(reports, "nov-b.xlsx", styles=1, days=4, month=11, first_style=4)]
+    assert watcher.run_reports(batch) == ["oct.xlsx", "nov.xlsx", "nov-b.xlsx"]
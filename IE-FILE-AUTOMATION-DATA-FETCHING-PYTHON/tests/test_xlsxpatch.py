@@ -0,0 +1,78 @@
+import io
+import struct
+import zipfile
+
+import openpyxl
+from openpyxl.cell.rich_text import CellRichText, TextBlock
+from openpyxl.cell.text import InlineFont
+
+from ie_engine import ChangeSet
+from ie_xlsxpatch import patch_package
+
+def test_partial_save_keeps_rich_text_and_untouched_parts(tmp_path):
+    src, dest = str(tmp_path / "master.xlsx"), str(tmp_path / "patched.xlsx")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "ST-100"
+    ws["A1"] = CellRichText(TextBlock(InlineFont(b=True), "Style"), " ST-100")
+    ws["B1"] = 10
+    for name in ("ST-101", "FORMATE"):
+        wb.create_sheet(name)["A1"] = name
+    wb.save(src)
+
+    wb = openpyxl.load_workbook(src)
+    changes = ChangeSet(wb)
+    wb["ST-100"]["B1"] = 25
+    rewritten, copied = patch_package(wb, src, dest, changes.patch_cells(), changes.style_count)
+    assert rewritten == 1
+
+    patched = openpyxl.load_workbook(dest, rich_text=True)["ST-100"]
+    assert patched["B1"].value == 25
+    rich = patched["A1"].value
+    assert isinstance(rich, CellRichText)
+    assert str(rich) == "Style ST-100"
+    assert rich[0].font.b
+
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dest) as zout:
+        assert zout.testzip() is None
+        changed = [n for n in zin.namelist() if zin.read(n) != zout.read(n)]
+        assert changed == ["xl/worksheets/sheet1.xml"]
+        assert copied == len(zin.namelist()) - 1
+
+def compressed(path, name):
+    # A member's compressed bytes as stored in the file: copied parts must not be deflated again
+    with zipfile.ZipFile(path) as z:
+        info = z.getinfo(name)
+        with open(path, "rb") as f:
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            return f.read(info.compress_size)
+
+class Unseekable(io.RawIOBase):
+    # zipfile writes a data descriptor after each member when it cannot seek back
+    def __init__(self, f): self.f = f
+    def writable(self): return True
+    def write(self, b): return self.f.write(b)
+
+def test_partial_save_copies_compressed_bytes_of_members_with_data_descriptors(tmp_path):
+    plain, src, dest = (str(tmp_path / n) for n in ("plain.xlsx", "master.xlsx", "patched.xlsx"))
+    wb = openpyxl.Workbook()
+    wb.active["A1"] = 1
+    wb.create_sheet("ST-101")["A1"] = "ST-101"
+    wb.save(plain)
+    with zipfile.ZipFile(plain) as zin, open(src, "wb") as raw:
+        with zipfile.ZipFile(Unseekable(raw), "w", zipfile.ZIP_DEFLATED) as zout:
+            # Level 1: deflating again at the default level would give other bytes
+            for info in zin.infolist(): zout.writestr(info.filename, zin.read(info), compresslevel=1)
+    assert all(info.flag_bits & 0x08 for info in zipfile.ZipFile(src).infolist())
+
+    wb = openpyxl.load_workbook(src)
+    changes = ChangeSet(wb)
+    wb.active["A1"] = 2
+    patch_package(wb, src, dest, changes.patch_cells(), changes.style_count)
+    with zipfile.ZipFile(dest) as zout: assert zout.testzip() is None
+    assert compressed(src, "xl/worksheets/sheet2.xml") == compressed(dest, "xl/worksheets/sheet2.xml")
+    patched = openpyxl.load_workbook(dest)
+    assert patched.active["A1"].value == 2
+    assert patched["ST-101"]["A1"].value == "ST-101"